@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+'''
+bench.py - a script to benchmark mrtparse.
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import os
+import sys
+import gc
+import json
+import time
+import struct
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+# Only the API of the first released versions is used, so that the same
+# script can measure an old version as a baseline
+import mrtparse
+from mrtparse import (
+    Reader, Base, RibEntries, BgpAttr, BgpMessage, MRT_T, TD_V2_ST,
+    BGP4MP_ST, BGP_MSG_T, AFI_T, SAFI_T, as_len, af_num, is_add_path
+)
+
+SAMPLES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'samples'
+)
+
+# Address length of AFI
+ADDR_LEN = {AFI_T['IPv4']: 4, AFI_T['IPv6']: 16}
+
+# Sample files of MRT format data
+SAMPLE_FILES = [
+    'bird-mrtdump_bgp', 'bird-mrtdump_rib', 'bird6-mrtdump_bgp',
+    'bird6-mrtdump_rib', 'bird6_bgp', 'bird_bgp', 'openbgpd_bgp',
+    'openbgpd_rib_table', 'openbgpd_rib_table-v2', 'quagga_bgp',
+    'quagga_rib',
+]
+
+def parse_args():
+    '''
+    Parse the command line arguments.
+    '''
+    p = argparse.ArgumentParser(
+        description='This script benchmarks the decoders of mrtparse.')
+    p.add_argument(
+        '-O', dest='output', default=None, metavar='file',
+        help='write the results to a specified JSON file')
+    p.add_argument(
+        '-b', dest='baseline', default=None, metavar='file',
+        help='compare the results with a baseline JSON file')
+    p.add_argument(
+        '-t', dest='threshold', default=0.1, type=float, metavar='ratio',
+        help='ratio of slowdown regarded as a regression (default: 0.1)')
+    p.add_argument(
+        '-s', dest='size', default=4, type=float, metavar='MB',
+        help='size of each replicated sample file (default: 4)')
+    p.add_argument(
+        '-r', dest='repeat', default=5, type=int, metavar='N',
+        help='number of repetitions, the best is taken (default: 5)')
+    p.add_argument(
+        '-n', dest='number', default=20000, type=int, metavar='N',
+        help='number of calls of each micro-benchmark (default: 20000)')
+    return p.parse_args()
+
+def replicate(name, size, tmpdir):
+    '''
+    Write a sample file replicated up to size bytes.
+    '''
+    with open(os.path.join(SAMPLES, name), 'rb') as f:
+        buf = f.read()
+    path = os.path.join(tmpdir, name)
+    with open(path, 'wb') as f:
+        f.write(buf * max(1, int(size // len(buf))))
+    return path
+
+def best(func, repeat):
+    '''
+    Return the best elapsed time, the noise and the result of func.
+    The noise is the ratio of the median elapsed time to the best minus 1.
+    '''
+    val = None
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        val = func()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[0], times[len(times) // 2] / times[0] - 1, val
+
+def bench_reader(paths, repeat):
+    '''
+    Measure records/sec and MB/sec of Reader for each file.
+    '''
+    results = {}
+    for path in paths:
+        size = os.path.getsize(path)
+        elapsed, noise, n = best(
+            lambda path=path: sum(1 for _ in Reader(path)), repeat
+        )
+        results[os.path.basename(path)] = {
+            'records': n,
+            'bytes': size,
+            'seconds': elapsed,
+            'noise': noise,
+            'records_per_sec': n / elapsed,
+            'mb_per_sec': size / elapsed / 1024 ** 2,
+        }
+    return results
+
+def raw_records(name):
+    '''
+    Yield (type, subtype, raw record) of a sample file.
+    '''
+    with open(os.path.join(SAMPLES, name), 'rb') as f:
+        while True:
+            hdr = f.read(12)
+            if len(hdr) < 12:
+                return
+            _, t, st, length = struct.unpack('>IHHI', hdr)
+            yield t, st, hdr + f.read(length)
+
+def find_record(name, t, subtypes):
+    '''
+    Return the raw record of a sample file with the type and subtypes.
+    '''
+    for rec_t, st, buf in raw_records(name):
+        if rec_t == t and st in subtypes:
+            return buf
+    raise ValueError('No record found in %s' % name)
+
+def find_update(name):
+    '''
+    Return the first UPDATE message of BGP4MP_MESSAGE_AS4 in a sample file.
+    '''
+    for t, st, buf in raw_records(name):
+        if t != MRT_T['BGP4MP'] or st != BGP4MP_ST['BGP4MP_MESSAGE_AS4']:
+            continue
+        # Peer AS, Local AS, Interface Index and AFI
+        p = 12 + 4 + 4 + 2 + 2
+        p += 2 * ADDR_LEN[struct.unpack('>H', buf[p-2:p])[0]]
+        if bytearray(buf[p+18:p+19])[0] == BGP_MSG_T['UPDATE']:
+            return buf[p:]
+    raise ValueError('No UPDATE found in %s' % name)
+
+def micro_cases():
+    '''
+    Return a dictionary of micro-benchmark functions.
+    Each function decodes the same buffer and takes no arguments.
+    '''
+    cases = {}
+
+    val = Base()
+    val.buf = b'\x01\x02\x03\x04'
+    def val_num():
+        val.p = 0
+        return val.val_num(4)
+    cases['val_num'] = val_num
+
+    addr4 = Base()
+    addr4.buf = b'\xc0\x00\x02\x00'
+    def val_addr_ipv4():
+        addr4.p = 0
+        return addr4.val_addr(AFI_T['IPv4'])
+    cases['val_addr_ipv4'] = val_addr_ipv4
+
+    addr6 = Base()
+    addr6.buf = b'\x20\x01\x0d\xb8' + b'\x00' * 11 + b'\x01'
+    def val_addr_ipv6():
+        addr6.p = 0
+        return addr6.val_addr(AFI_T['IPv6'])
+    cases['val_addr_ipv6'] = val_addr_ipv6
+
+    nlri = Base()
+    nlri.buf = b''.join(
+        b'\x18\xc0\x00' + bytes(bytearray([i])) for i in range(16)
+    )
+    def val_nlri():
+        is_add_path(False)
+        nlri.p = 0
+        return nlri.val_nlri(len(nlri.buf), AFI_T['IPv4'])
+    cases['val_nlri'] = val_nlri
+
+    # RIB entries and path attributes of a real dump
+    buf = find_record(
+        'openbgpd_rib_table-v2', MRT_T['TABLE_DUMP_V2'],
+        (TD_V2_ST['RIB_IPV4_UNICAST'],)
+    )
+    # Sequence Number, Prefix Length, Prefix and Entry Count
+    p = 12 + 4 + 1 + (bytearray(buf[16:17])[0] + 7) // 8
+    entries = buf[p+2:]
+    def rib_entries_unpack():
+        as_len(4)
+        af_num(AFI_T['IPv4'], SAFI_T['UNICAST'])
+        is_add_path(False)
+        return RibEntries(entries).unpack()
+    cases['RibEntries.unpack'] = rib_entries_unpack
+
+    attr = entries[8:]
+    def bgp_attr_unpack():
+        as_len(4)
+        af_num(AFI_T['IPv4'], SAFI_T['UNICAST'])
+        return BgpAttr(attr).unpack()
+    cases['BgpAttr.unpack'] = bgp_attr_unpack
+
+    # UPDATE message of BGP4MP_MESSAGE_AS4
+    msg = find_update('openbgpd_bgp')
+    def unpack_update():
+        as_len(4)
+        af_num(AFI_T['IPv4'], SAFI_T['UNICAST'])
+        is_add_path(False)
+        bgp = BgpMessage(msg)
+        bgp.p = 19
+        bgp.data['length'] = len(msg)
+        bgp.unpack_update()
+        return bgp.p
+    cases['BgpMessage.unpack_update'] = unpack_update
+
+    return cases
+
+def bench_micro(number, repeat):
+    '''
+    Measure calls/sec of each micro-benchmark.
+    '''
+    results = {}
+    for name, func in sorted(micro_cases().items()):
+        def loop(func=func):
+            for _ in range(number):
+                func()
+        elapsed, noise, _ = best(loop, repeat)
+        results[name] = {
+            'calls': number,
+            'seconds': elapsed,
+            'noise': noise,
+            'calls_per_sec': number / elapsed,
+            'usec_per_call': elapsed / number * 1000000,
+        }
+    return results
+
+def bench_memory(path):
+    '''
+    Measure the peak memory allocated while reading a file.
+    '''
+    gc.collect()
+    tracemalloc.start()
+    for _ in Reader(path):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'file': os.path.basename(path), 'peak_bytes': peak}
+
+def compare(results, baseline, threshold):
+    '''
+    Print the ratios of throughput to baseline and return the list of
+    regressions.
+    A slowdown is a regression only if it exceeds the threshold plus the
+    noise measured in both runs.
+    '''
+    regressions = []
+    for group, metric in (
+        ('reader', 'records_per_sec'), ('micro', 'calls_per_sec')):
+        for name, val in sorted(results[group].items()):
+            base = baseline.get(group, {}).get(name)
+            if base is None:
+                continue
+            ratio = val[metric] / base[metric]
+            tolerance = threshold + val['noise'] + base.get('noise', 0)
+            flag = ''
+            if ratio < 1 - tolerance:
+                flag = ' REGRESSION'
+                regressions.append('%s/%s' % (group, name))
+            print('%-8s %-28s %8.3fx +-%.3f%s' % (
+                group, name, ratio, tolerance, flag))
+    mem = results['memory']['peak_bytes']
+    base = baseline.get('memory', {}).get('peak_bytes')
+    if base:
+        ratio = float(mem) / base
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = ' REGRESSION'
+            regressions.append('memory')
+        print('%-8s %-28s %8.3fx%s' % ('memory', 'peak_bytes', ratio, flag))
+    return regressions
+
+def main():
+    '''
+    Run the benchmarks and compare the results with the baseline.
+    '''
+    args = parse_args()
+    tmpdir = tempfile.mkdtemp()
+    try:
+        paths = [
+            replicate(name, args.size * 1024 ** 2, tmpdir)
+            for name in SAMPLE_FILES
+        ]
+        results = {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'mrtparse': mrtparse.__version__,
+            'time': int(time.time()),
+            'reader': bench_reader(paths, args.repeat),
+            'micro': bench_micro(args.number, args.repeat),
+            'memory': bench_memory(max(paths, key=os.path.getsize)),
+        }
+    finally:
+        shutil.rmtree(tmpdir)
+
+    for name, val in sorted(results['reader'].items()):
+        print('%-8s %-28s %10.0f records/s %8.2f MB/s +-%.3f' % (
+            'reader', name, val['records_per_sec'], val['mb_per_sec'],
+            val['noise']))
+    for name, val in sorted(results['micro'].items()):
+        print('%-8s %-28s %10.0f calls/s %8.2f usec +-%.3f' % (
+            'micro', name, val['calls_per_sec'], val['usec_per_call'],
+            val['noise']))
+    print('%-8s %-28s %10d bytes' % (
+        'memory', results['memory']['file'],
+        results['memory']['peak_bytes']))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
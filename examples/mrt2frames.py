@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+'''
+mrt2frames.py - a script to transcode MRT format data into compressed frames.
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import sys, argparse
+from mrtparse.frames import (
+    FRAME_SIZE, codec_available, default_codec, transcode
+)
+
+def parse_args():
+    codecs = [c for c in ('zlib', 'lzma', 'zstd') if codec_available(c)]
+    p = argparse.ArgumentParser(
+        description='This script transcodes MRT format data into '
+        'independently compressed frames.')
+    p.add_argument(
+        '-c', dest='codec', default=default_codec(), choices=codecs,
+        help='compression codec (default: %s)' % default_codec())
+    p.add_argument(
+        '-s', dest='frame_size', default=FRAME_SIZE, type=int,
+        metavar='bytes',
+        help='uncompressed size of a frame (default: %d)' % FRAME_SIZE)
+    p.add_argument(
+        '-l', dest='level', default=None, type=int, metavar='N',
+        help='compression level')
+    p.add_argument(
+        'src', help='specify path to MRT format file')
+    p.add_argument(
+        'dst', help='specify path to output frame file')
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    table = transcode(
+        args.src, args.dst, args.codec, args.frame_size, args.level
+    )
+    sys.stderr.write('%d frames, %d records\n' % (
+        len(table), sum(frame.records for frame in table)
+    ))
+
+if __name__ == '__main__':
+    main()
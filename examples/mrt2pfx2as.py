@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+'''
+mrt2pfx2as.py - a script to convert MRT format to CAIDA pfx2as format.
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import sys, argparse
+from mrtparse.pfx2as import pfx2as
+
+def parse_args():
+    p = argparse.ArgumentParser(
+        description='This script converts to CAIDA pfx2as format.')
+    p.add_argument(
+        '-O', dest='output', default=sys.stdout, nargs='?', metavar='file',
+        type=argparse.FileType('w'),
+        help='output to a specified file')
+    p.add_argument(
+        '-c', dest='counts', default=False, action='store_true',
+        help='add the number of peers which see each origin')
+    p.add_argument(
+        '-j', dest='processes', default=1, type=int, metavar='N',
+        help='number of processes to split the work by prefix range')
+    p.add_argument(
+        'path_to_file', nargs='+',
+        help='specify path to MRT format file')
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    p = pfx2as(args.path_to_file, processes=args.processes)
+    p.write(args.output, counts=args.counts)
+
+if __name__ == '__main__':
+    main()
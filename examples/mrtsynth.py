@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+'''
+mrtsynth.py - a script to generate synthetic MRT format data.
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import time, argparse
+from mrtparse.synth import PATH_LEN, synth_rib, synth_updates
+
+def path_len(s):
+    '''
+    Convert "length:weight,..." to a distribution of AS path length.
+    '''
+    dist = {}
+    for item in s.split(','):
+        length, weight = item.split(':')
+        dist[int(length)] = float(weight)
+    return dist
+
+def parse_args():
+    p = argparse.ArgumentParser(
+        description='This script generates synthetic MRT format data.')
+    p.add_argument(
+        '-t', dest='type', default='rib', choices=['rib', 'updates'],
+        help='TABLE_DUMP_V2 dump or BGP4MP updates (default: rib)')
+    p.add_argument(
+        '-s', dest='seed', default=0, type=int, metavar='N',
+        help='random seed (default: 0)')
+    p.add_argument(
+        '-p', dest='peers', default=4, type=int, metavar='N',
+        help='number of peers (default: 4)')
+    p.add_argument(
+        '-n', dest='prefixes', default=1000, type=int, metavar='N',
+        help='number of prefixes (default: 1000)')
+    p.add_argument(
+        '-6', dest='ipv6_ratio', default=0.2, type=float, metavar='ratio',
+        help='ratio of IPv6 prefixes (default: 0.2)')
+    p.add_argument(
+        '-l', dest='path_len', default=PATH_LEN, type=path_len,
+        metavar='len:weight,...',
+        help='distribution of AS path length')
+    p.add_argument(
+        '-r', dest='attr_reuse', default=0.5, type=float, metavar='ratio',
+        help='ratio of routes sharing attributes (default: 0.5)')
+    p.add_argument(
+        '-c', dest='communities', default=2, type=int, metavar='N',
+        help='maximum number of communities of a route (default: 2)')
+    p.add_argument(
+        '-v', dest='coverage', default=1.0, type=float, metavar='ratio',
+        help='ratio of prefixes each peer has (default: 1.0)')
+    p.add_argument(
+        '-a', dest='add_path', default=False, action='store_true',
+        help='generate ADD-PATH subtypes')
+    p.add_argument(
+        '-u', dest='updates', default=10000, type=int, metavar='N',
+        help='number of UPDATE messages (default: 10000)')
+    p.add_argument(
+        '-d', dest='duration', default=900, type=int, metavar='sec',
+        help='duration of updates in seconds (default: 900)')
+    p.add_argument(
+        '-e', dest='et', default=False, action='store_true',
+        help='generate BGP4MP_ET instead of BGP4MP')
+    p.add_argument(
+        '-T', dest='ts', default=None, type=int, metavar='timestamp',
+        help='timestamp of the first record (default: now)')
+    p.add_argument(
+        'path_to_file',
+        help='specify path to output file (.gz/.bz2 are compressed)')
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    ts = int(time.time()) if args.ts is None else args.ts
+    kwargs = dict(
+        seed=args.seed, peers=args.peers, prefixes=args.prefixes,
+        ipv6_ratio=args.ipv6_ratio, path_len=args.path_len,
+        attr_reuse=args.attr_reuse, communities=args.communities,
+        add_path=args.add_path, coverage=args.coverage
+    )
+    if args.type == 'rib':
+        synth_rib(args.path_to_file, ts, **kwargs)
+    else:
+        synth_updates(
+            args.path_to_file, ts, args.updates, args.duration, args.et,
+            **kwargs
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,492 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+
+import os
+import re
+import zlib
+import struct
+import heapq
+import calendar
+import collections
+import multiprocessing
+from .base import MrtFormatError
+from . import Reader
+from .cache import encode_record, pack_batch, unpack_batch
+from .filter import HeaderFilter, filter_records
+from .merge import MergedRecord, microsecond
+
+# File names of archives like "updates.20220101.0000.bz2"
+ARCHIVE_RE = re.compile(
+    r'^(?P<kind>[a-z]+)\.(?P<date>\d{8})\.(?P<time>\d{4})'
+    r'(?:\.(?:bz2|gz))?$'
+)
+
+# Interval of files in seconds if it cannot be inferred
+ARCHIVE_INTERVAL = 900
+
+# Number of records sent from a worker process at a time
+ARCHIVE_CHUNK = 1000
+
+# Number of chunks of a file which a worker process sends ahead
+ARCHIVE_AHEAD = 4
+
+# Number of blocks decompressed ahead of parsing
+ARCHIVE_READAHEAD = 4
+
+# Errors of a file which a worker process reports to the parent process.
+# Corrupt data may break the decompressors and the decoders in other ways
+# than MrtFormatError, and TypeError is raised for a record which cannot
+# be packed.
+ARCHIVE_ERRORS = (
+    MrtFormatError, EnvironmentError, EOFError, zlib.error, struct.error,
+    ValueError, KeyError, IndexError, TypeError
+)
+
+# Record of a chunk sent from a worker process
+PackedRecord = collections.namedtuple(
+    'PackedRecord', ['data', 'buf', 'err', 'err_msg']
+)
+
+class ArchiveFile:
+    '''
+    File of an archive and the range of its timestamps.
+    '''
+    __slots__ = ['path', 'collector', 'kind', 'start', 'end']
+
+    def __init__(self, path, collector, kind=None, start=None, end=None):
+        self.path = path
+        self.collector = collector
+        self.kind = kind
+        # Timestamps of the first and last records (inclusive)
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return 'ArchiveFile(%s, %s, %s, %s, %s)' % (
+            self.path, self.collector, self.kind, self.start, self.end
+        )
+
+def parse_name(name):
+    '''
+    Convert a file name like "updates.20220101.0000.bz2" to
+    (kind, timestamp), or None.
+    '''
+    m = ARCHIVE_RE.match(name)
+    if m is None:
+        return None
+    d = m.group('date')
+    t = m.group('time')
+    try:
+        ts = calendar.timegm((
+            int(d[:4]), int(d[4:6]), int(d[6:]), int(t[:2]), int(t[2:]),
+            0, 0, 0, 0
+        ))
+    except ValueError:
+        return None
+    return (m.group('kind'), ts)
+
+def scan_range(path):
+    '''
+    Return (first timestamp, last timestamp) of the records of a file, or
+    None if it has no valid records. Only MRT headers are decoded.
+    '''
+    first = last = None
+    for rec in Reader(path, decode=False):
+        if rec.err:
+            continue
+        ts = list(rec.data['timestamp'])[0]
+        if first is None:
+            first = ts
+        last = ts
+    if first is None:
+        return None
+    return (first, last)
+
+def file_chunks(path, header_filter, decode):
+    '''
+    Yield lists of MergedRecord of a file which match the filter.
+    The file is decompressed as a stream in a background thread.
+    '''
+    reader = Reader(
+        path, decode=decode and not header_filter,
+        readahead=ARCHIVE_READAHEAD
+    )
+    try:
+        if header_filter:
+            recs = filter_records(reader, header_filter, decode)
+        else:
+            recs = reader
+        chunk = []
+        for rec in recs:
+            chunk.append(MergedRecord(rec, path))
+            if len(chunk) >= ARCHIVE_CHUNK:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        try:
+            reader.close()
+        except StopIteration:
+            pass
+
+def pack_chunk(chunk):
+    '''
+    Pack a chunk of file_chunks() into a compressed batch of JSON and raw
+    records, which is smaller and faster to load than pickled records.
+    '''
+    return pack_batch([(encode_record(rec), rec.buf) for rec in chunk])
+
+def unpack_chunk(val, path):
+    '''
+    Return the list of MergedRecord of a chunk packed by pack_chunk().
+    '''
+    return [
+        MergedRecord(PackedRecord(*rec), path) for rec in unpack_batch(val)
+    ]
+
+def _archive_worker(tasks, results, filter_args, decode):
+    '''
+    Decode files of tasks one at a time in a worker process and send the
+    packed chunks of their records.
+    '''
+    header_filter = HeaderFilter(*filter_args)
+    while True:
+        path = tasks.get()
+        if path is None:
+            break
+        try:
+            for chunk in file_chunks(path, header_filter, decode):
+                results.put((pack_chunk(chunk), None))
+        except ARCHIVE_ERRORS as e:
+            # MrtFormatError has its message only in "msg"
+            msg = e.msg if isinstance(e, MrtFormatError) else e
+            results.put((None, '%s: %s' % (e.__class__.__name__, msg)))
+            continue
+        results.put((None, None))
+
+class Archive:
+    '''
+    Directory trees of MRT archives like "updates.YYYYMMDD.HHMM.bz2".
+    The collector of a file is the first directory under the root.
+    '''
+    __slots__ = ['files', 'processes', 'interval']
+
+    def __init__(self, *roots, **kwargs):
+        '''
+        roots are directories or files. Keyword arguments are
+        "processes" (default: 1), "interval" of files in seconds (default:
+        inferred from the file names) and "scan" (default: False), which
+        reads the first and last records of all files instead of trusting
+        the file names. Files with other names are always scanned.
+        '''
+        self.processes = kwargs.get('processes', 1)
+        self.interval = kwargs.get('interval')
+        self.files = []
+        for root in roots:
+            self.discover(root)
+        self.set_ranges(kwargs.get('scan', False))
+        self.files.sort(key=lambda f: (f.start, f.path))
+
+    def discover(self, root):
+        '''
+        Add the files under root.
+        '''
+        if os.path.isfile(root):
+            self.files.append(ArchiveFile(
+                root, os.path.basename(os.path.dirname(root))
+            ))
+            return
+        base = os.path.basename(os.path.normpath(root))
+        for d, dirs, names in os.walk(root):
+            dirs.sort()
+            rel = os.path.relpath(d, root)
+            collector = base if rel == '.' else rel.split(os.sep)[0]
+            for name in sorted(names):
+                if name.startswith('.'):
+                    continue
+                self.files.append(
+                    ArchiveFile(os.path.join(d, name), collector)
+                )
+
+    def set_ranges(self, scan):
+        '''
+        Set the ranges of timestamps of the files from their names or
+        records.
+        '''
+        groups = collections.defaultdict(list)
+        unnamed = []
+        for f in self.files:
+            val = parse_name(os.path.basename(f.path))
+            if val is None or scan:
+                unnamed.append(f)
+            if val is not None:
+                f.kind, f.start = val
+                groups[(os.path.dirname(f.path), f.kind)].append(f)
+
+        # Each file covers the timestamps until the next one
+        for files in groups.values():
+            interval = self.interval
+            if interval is None:
+                diffs = [
+                    b.start - a.start for a, b in zip(files, files[1:])
+                    if b.start > a.start
+                ]
+                interval = min(diffs) if diffs else ARCHIVE_INTERVAL
+            for f in files:
+                f.end = f.start + interval - 1
+
+        paths = [f.path for f in unnamed]
+        if self.processes > 1 and len(paths) > 1:
+            pool = multiprocessing.Pool(self.processes)
+            try:
+                ranges = pool.map(scan_range, paths)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            ranges = [scan_range(path) for path in paths]
+        for f, val in zip(unnamed, ranges):
+            if val is None:
+                self.files.remove(f)
+            else:
+                f.start, f.end = val
+
+    def select(self, start=None, end=None, collectors=None, kinds=None):
+        '''
+        Return the files which may have records between start and end
+        (inclusive) of the collectors and kinds (e.g. "updates").
+        '''
+        return [
+            f for f in self.files
+            if (start is None or f.end >= start)
+            and (end is None or f.start <= end)
+            and (collectors is None or f.collector in collectors)
+            and (kinds is None or f.kind in kinds)
+        ]
+
+    def records(self, start=None, end=None, collectors=None, kinds=None,
+        types=None, subtypes=None, decode=True, ordered=True):
+        '''
+        Yield MergedRecord of the selected files whose MRT header matches
+        the timestamps, types and subtypes, where "source" is the file
+        path. Files are processed by the worker processes, and the records
+        are merged in order of timestamp unless ordered is False.
+        '''
+        files = self.select(start, end, collectors, kinds)
+        filter_args = (types, subtypes, start, end)
+        if self.processes > 1:
+            chunks = _PoolChunks(files, self.processes, filter_args, decode)
+        else:
+            chunks = _LocalChunks(files, filter_args, decode)
+        try:
+            if ordered:
+                for rec in merge_chunks(files, chunks):
+                    yield rec
+            else:
+                for chunk in chunks.all():
+                    for rec in chunk:
+                        yield rec
+        finally:
+            chunks.close()
+
+class _LocalChunks:
+    '''
+    Chunks of records of files processed in this process.
+    '''
+    __slots__ = ['gens', 'files', 'header_filter', 'decode']
+
+    def __init__(self, files, filter_args, decode):
+        self.files = files
+        self.gens = {}
+        self.header_filter = HeaderFilter(*filter_args)
+        self.decode = decode
+
+    def get(self, i):
+        '''
+        Return the next chunk of the i-th file, or None at its end.
+        '''
+        gen = self.gens.get(i)
+        if gen is None:
+            gen = self.gens[i] = file_chunks(
+                self.files[i].path, self.header_filter, self.decode
+            )
+        chunk = next(gen, None)
+        if chunk is None:
+            del self.gens[i]
+        return chunk
+
+    def all(self):
+        '''
+        Yield all chunks.
+        '''
+        for i in range(len(self.files)):
+            while True:
+                chunk = self.get(i)
+                if chunk is None:
+                    break
+                yield chunk
+
+    def close(self):
+        '''
+        Close the files being processed.
+        '''
+        for gen in self.gens.values():
+            gen.close()
+        self.gens = {}
+
+class _PoolChunks:
+    '''
+    Chunks of records of files processed by worker processes.
+    Each worker processes one file at a time and sends its chunks through
+    its own queue, which is bounded so that the worker waits while they
+    are not consumed. Free workers process the next files in order of
+    start, and a file needed while no worker is free is processed in
+    this process.
+    '''
+    __slots__ = [
+        'files', 'procs', 'tasks', 'results', 'idle', 'owner',
+        'started', 'next', 'local'
+    ]
+
+    def __init__(self, files, processes, filter_args, decode):
+        self.files = files
+        self.tasks = [multiprocessing.Queue() for _ in range(processes)]
+        self.results = [
+            multiprocessing.Queue(ARCHIVE_AHEAD) for _ in range(processes)
+        ]
+        self.procs = [
+            multiprocessing.Process(
+                target=_archive_worker,
+                args=(self.tasks[w], self.results[w], filter_args, decode)
+            )
+            for w in range(processes)
+        ]
+        for proc in self.procs:
+            proc.daemon = True
+            proc.start()
+        self.idle = list(range(processes))
+        # Worker of each file being processed
+        self.owner = {}
+        self.started = set()
+        self.next = 0
+        self.local = _LocalChunks(files, filter_args, decode)
+        self.prefetch()
+
+    def start(self, i):
+        '''
+        Start processing the i-th file, by a free worker if any.
+        '''
+        self.started.add(i)
+        if self.idle:
+            w = self.idle.pop()
+            self.owner[i] = w
+            self.tasks[w].put(self.files[i].path)
+
+    def prefetch(self):
+        '''
+        Assign the next files to the free workers.
+        '''
+        while self.idle and self.next < len(self.files):
+            if self.next not in self.started:
+                self.start(self.next)
+            self.next += 1
+
+    def get(self, i):
+        '''
+        Return the next chunk of the i-th file, or None at its end.
+        '''
+        if i not in self.started:
+            self.start(i)
+        w = self.owner.get(i)
+        if w is None:
+            return self.local.get(i)
+        path = self.files[i].path
+        chunk, err = self.results[w].get()
+        if err is not None:
+            raise IOError('%s: %s' % (path, err))
+        if chunk is None:
+            del self.owner[i]
+            self.idle.append(w)
+            self.prefetch()
+            return None
+        return unpack_chunk(chunk, path)
+
+    def all(self):
+        '''
+        Yield all chunks.
+        '''
+        for i in range(len(self.files)):
+            while True:
+                chunk = self.get(i)
+                if chunk is None:
+                    break
+                yield chunk
+
+    def close(self):
+        '''
+        Close the files being processed and stop the worker processes.
+        '''
+        self.local.close()
+        for proc in self.procs:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
+        self.procs = []
+
+def merge_chunks(files, chunks):
+    '''
+    Merge the records of files in order of timestamp.
+    A file joins the merge when the smallest timestamp reaches the start
+    of the file, so only the files overlapping in time are buffered.
+    '''
+    heap = []
+    bufs = {}
+    keys = {}
+
+    def push(i):
+        buf = bufs[i]
+        while not buf:
+            chunk = chunks.get(i)
+            if chunk is None:
+                del bufs[i]
+                return
+            buf.extend(chunk)
+        rec = buf.popleft()
+        if 'timestamp' in rec.data:
+            keys[i] = (list(rec.data['timestamp'])[0], microsecond(rec))
+        heapq.heappush(heap, (keys[i], i, rec))
+
+    n = 0
+    while True:
+        while n < len(files) and (not heap or files[n].start <= heap[0][0][0]):
+            bufs[n] = collections.deque()
+            keys[n] = (files[n].start, 0)
+            push(n)
+            n += 1
+        if not heap:
+            break
+        _, i, rec = heapq.heappop(heap)
+        push(i)
+        yield rec
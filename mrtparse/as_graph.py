@@ -0,0 +1,202 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import io
+import struct
+import multiprocessing
+from .params import *
+from . import Reader
+from .aspath import merge_segments
+from .raw import raw_routes, index_peers, as_path
+
+def pack_edge(a, b):
+    '''
+    Pack an undirected edge of AS numbers into a 64-bit integer.
+    '''
+    if a > b:
+        a, b = b, a
+    return (a << 32) | b
+
+def unpack_edge(key):
+    '''
+    Unpack a 64-bit integer to an edge (AS number, AS number).
+    '''
+    return (key >> 32, key & 0xffffffff)
+
+def path_edges(segs):
+    '''
+    Return the set of packed edges of AS path segments.
+    Prepending is removed, confederation segments are skipped and
+    AS_SET breaks the adjacency.
+    '''
+    edges = set()
+    prev = None
+    for t, asns in segs:
+        if t == AS_PATH_SEG_T['AS_SEQUENCE']:
+            for asn in asns:
+                if prev is not None and asn != prev:
+                    edges.add(pack_edge(prev, asn))
+                prev = asn
+        elif t == AS_PATH_SEG_T['AS_SET']:
+            prev = None
+    return edges
+
+class AsGraph:
+    '''
+    AS-level topology of AS_PATH/AS4_PATH.
+    Each edge has a bitmap of peers which observe it and the number of
+    prefixes which observe it.
+    '''
+    __slots__ = ['peers', 'peer_ids', 'edges', 'index_peers']
+
+    def __init__(self):
+        # list of (peer_ip as packed bytes, peer_as)
+        self.peers = []
+        self.peer_ids = {}
+        # packed edge -> [bitmap of peer ids, number of prefixes]
+        self.edges = {}
+        self.index_peers = []
+
+    def __len__(self):
+        return len(self.edges)
+
+    def peer_id(self, peer):
+        '''
+        Return the id of the peer, registering it if necessary.
+        '''
+        i = self.peer_ids.get(peer)
+        if i is None:
+            i = self.peer_ids[peer] = len(self.peers)
+            self.peers.append(peer)
+        return i
+
+    def add(self, rec):
+        '''
+        Add a record returned by Reader. The record can be decoded or not,
+        only the raw record in "buf" is used.
+        '''
+        if rec.err:
+            return
+        buf = rec.buf
+        t, st = struct.unpack('>HH', buf[4:8])
+        if t == MRT_T['TABLE_DUMP_V2'] \
+            and st == TD_V2_ST['PEER_INDEX_TABLE']:
+            if 'peer_entries' not in rec.data:
+                rec = next(Reader(io.BytesIO(buf)))
+            self.index_peers = index_peers(rec.data)
+            return
+
+        # Edges of a prefix are counted once even if many peers observe it
+        prefix_edges = {}
+        for route in raw_routes(buf, self.index_peers):
+            if route.action != 'A':
+                continue
+            as2 = []
+            as4 = []
+            for attr_t, start, end in route.iter_attrs():
+                if attr_t == BGP_ATTR_T['AS_PATH']:
+                    as2 = as_path(buf, start, end, route.as_size)
+                elif attr_t == BGP_ATTR_T['AS4_PATH']:
+                    as4 = as_path(buf, start, end, 4)
+            edges = path_edges(merge_segments(as2, as4))
+            if not edges:
+                continue
+            bit = 1 << self.peer_id(route.peer)
+            for prefix in route.prefixes:
+                prefix_edges.setdefault(prefix, set()).update(edges)
+            for edge in edges:
+                val = self.edges.get(edge)
+                if val is None:
+                    self.edges[edge] = [bit, 0]
+                else:
+                    val[0] |= bit
+        for edges in prefix_edges.values():
+            for edge in edges:
+                self.edges[edge][1] += 1
+
+    def add_reader(self, reader):
+        '''
+        Add all records of reader.
+        '''
+        for rec in reader:
+            self.add(rec)
+
+    def merge(self, other):
+        '''
+        Merge another AsGraph, e.g. the result of a parallel worker.
+        '''
+        remap = [self.peer_id(peer) for peer in other.peers]
+        for edge, (bits, n) in other.edges.items():
+            mapped = 0
+            i = 0
+            while bits:
+                if bits & 1:
+                    mapped |= 1 << remap[i]
+                bits >>= 1
+                i += 1
+            val = self.edges.get(edge)
+            if val is None:
+                self.edges[edge] = [mapped, n]
+            else:
+                val[0] |= mapped
+                val[1] += n
+
+    def items(self):
+        '''
+        Yield (AS number, AS number, number of peers, number of prefixes)
+        in order of edge.
+        '''
+        for edge in sorted(self.edges):
+            bits, n = self.edges[edge]
+            a, b = unpack_edge(edge)
+            yield (a, b, bin(bits).count('1'), n)
+
+def _as_graph_worker(path):
+    '''
+    Process a file in a worker process.
+    '''
+    g = AsGraph()
+    g.add_reader(Reader(path, decode=False))
+    return (g.peers, g.edges)
+
+def as_graph(paths, processes=1):
+    '''
+    Build AsGraph of files, processing them in parallel if processes is
+    more than 1.
+    '''
+    result = AsGraph()
+    if processes <= 1:
+        for path in paths:
+            result.add_reader(Reader(path, decode=False))
+        return result
+    pool = multiprocessing.Pool(processes)
+    try:
+        for peers, edges in pool.imap_unordered(_as_graph_worker, paths):
+            other = AsGraph()
+            other.peers = peers
+            other.edges = edges
+            result.merge(other)
+    finally:
+        pool.close()
+        pool.join()
+    return result
@@ -0,0 +1,115 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+from .params import *
+
+def as_num(asn):
+    '''
+    Convert AS number in asplain or asdot representation to integer.
+    '''
+    asn = str(asn)
+    if '.' in asn:
+        high, low = asn.split('.', 1)
+        return (int(high) << 16) + int(low)
+    return int(asn)
+
+def path_segments(attr):
+    '''
+    Convert AS_PATH/AS4_PATH attribute to a list of (type, [AS numbers]).
+    '''
+    return [
+        (list(seg['type'])[0], [as_num(asn) for asn in seg['value']])
+        for seg in attr['value']
+    ]
+
+def path_len(segs):
+    '''
+    Count the path length as defined in RFC4271 9.1.2.2.
+    AS_SET is counted as 1 and confederation segments are not counted.
+    '''
+    n = 0
+    for t, asns in segs:
+        if t == AS_PATH_SEG_T['AS_SEQUENCE']:
+            n += len(asns)
+        elif t == AS_PATH_SEG_T['AS_SET']:
+            n += 1
+    return n
+
+def merge_as_path(attrs):
+    '''
+    Return AS path of path attributes as a list of (type, [AS numbers]),
+    merging AS_PATH and AS4_PATH as described in RFC6793 4.2.3.
+    '''
+    as_path = []
+    as4_path = []
+    for attr in attrs:
+        t = list(attr['type'])[0]
+        if t == BGP_ATTR_T['AS_PATH']:
+            as_path = path_segments(attr)
+        elif t == BGP_ATTR_T['AS4_PATH']:
+            as4_path = path_segments(attr)
+    return merge_segments(as_path, as4_path)
+
+def merge_segments(as_path, as4_path):
+    '''
+    Merge segments of AS_PATH and AS4_PATH as described in RFC6793 4.2.3.
+    '''
+    if not as4_path:
+        return as_path
+    n = path_len(as_path) - path_len(as4_path)
+    if n < 0:
+        return as_path
+
+    # Take the leading n ASes of AS_PATH and append AS4_PATH
+    merged = []
+    for t, asns in as_path:
+        if n <= 0:
+            break
+        if t == AS_PATH_SEG_T['AS_SEQUENCE']:
+            merged.append((t, asns[:n]))
+            n -= len(asns[:n])
+        elif t == AS_PATH_SEG_T['AS_SET']:
+            merged.append((t, asns))
+            n -= 1
+        else:
+            merged.append((t, asns))
+    if merged and as4_path and merged[-1][0] == as4_path[0][0] \
+        == AS_PATH_SEG_T['AS_SEQUENCE']:
+        merged[-1] = (merged[-1][0], merged[-1][1] + as4_path[0][1])
+        as4_path = as4_path[1:]
+    return merged + as4_path
+
+def origin_as(attrs):
+    '''
+    Return the origin AS of path attributes.
+    It is an integer, a tuple of sorted AS numbers if the last segment is
+    AS_SET, or None if AS path has no AS outside of the confederation.
+    '''
+    for t, asns in reversed(merge_as_path(attrs)):
+        if not asns:
+            continue
+        if t == AS_PATH_SEG_T['AS_SEQUENCE']:
+            return asns[-1]
+        elif t == AS_PATH_SEG_T['AS_SET']:
+            return tuple(sorted(set(asns)))
+    return None
@@ -73,6 +73,17 @@ def is_add_path(f=None):
     except AttributeError:
         return False
 
+def lazy_nlri(f=None):
+    '''
+    Flag for NLRI of UPDATE messages decoded while iterating.
+    '''
+    if f is not None:
+        lazy_nlri.f = f
+    try:
+        return lazy_nlri.f
+    except AttributeError:
+        return False
+
 class MrtFormatError(Exception):
     '''
     Exception for invalid MRT formatted data.
@@ -171,6 +182,17 @@ class _Base:
                 nlri_list.append(nlri.data)
         return nlri_list
 
+    def val_nlri_view(self, n, af, saf=0):
+        '''
+        Convert buffers to NLRI, or LazyNlri of them if lazy_nlri() is
+        True.
+        '''
+        if not lazy_nlri():
+            return self.val_nlri(n, af, saf)
+        val = LazyNlri(self.buf, self.p, n, af, saf, is_add_path())
+        self.p = n
+        return val
+
 class _BasePy2(_Base):
     '''
     Super class for all other classes in Python2.
@@ -353,3 +375,114 @@ class Nlri(Base):
         self.data['route_distinguisher'] = self.val_rd()
         plen -= (3 * len(self.data['label']) + 8) * 8
         return plen
+
+class LazyNlri:
+    '''
+    View of NLRI which decodes the prefixes while iterating.
+    len() only walks the prefix lengths, and iterating gives the same
+    results as Base.val_nlri(), including the fallback to path
+    identifiers. Invalid NLRI raises MrtFormatError when it is accessed.
+    '''
+    __slots__ = ['buf', 'start', 'end', 'af', 'saf', 'add_path', 'count']
+
+    def __init__(self, buf, start, end, af, saf=0, add_path=False):
+        self.buf = buf
+        self.start = start
+        self.end = end
+        self.af = af
+        self.saf = saf
+        self.add_path = add_path
+        self.count = None
+
+    def __len__(self):
+        self.scan()
+        return self.count
+
+    def __repr__(self):
+        return 'LazyNlri(%d bytes)' % (self.end - self.start)
+
+    def __iter__(self):
+        self.scan()
+        p = self.start
+        hdr = 4 if self.add_path else 0
+        for _ in range(self.count):
+            size = hdr + 1 + (self.plen(p + hdr) + 7) // 8
+            nlri = Nlri(self.buf[p:p+size])
+            nlri.unpack(self.af, self.saf, add_path=1 if self.add_path else 0)
+            p += size
+            yield nlri.data
+
+    def plen(self, p):
+        '''
+        Return the prefix length at p.
+        '''
+        if p >= len(self.buf):
+            raise MrtFormatError(
+                'Insufficient buffer %d < 1 byte' % (len(self.buf) - p)
+            )
+        return struct.unpack('>B', self.buf[p:p+1])[0]
+
+    def scan(self):
+        '''
+        Count the prefixes and decide whether they have path identifiers.
+        '''
+        if self.count is not None:
+            return
+        if not self.add_path:
+            try:
+                self.count = self.count_prefixes()
+                return
+            except MrtFormatError:
+                self.add_path = True
+        # Decode to raise the same error as Base.val_nlri()
+        for _ in self.decode_all(True):
+            pass
+
+    def count_prefixes(self):
+        '''
+        Walk NLRI without path identifiers and return the number of
+        prefixes. Raise MrtFormatError if it is invalid or has duplicate
+        prefixes, which means that it has path identifiers.
+        '''
+        if self.saf == SAFI_T['L3VPN_UNICAST'] \
+            or self.saf == SAFI_T['L3VPN_MULTICAST']:
+            val = [repr(list(d.values())) for d in self.decode_all(False)]
+            if len(val) != len(set(val)):
+                raise MrtFormatError
+            return len(val)
+        if self.af == AFI_T['IPv4']:
+            plen_max = 32
+        elif self.af == AFI_T['IPv6']:
+            plen_max = 128
+        else:
+            raise MrtFormatError
+        seen = set()
+        p = self.start
+        while p < self.end:
+            plen = self.plen(p)
+            n = (plen + 7) // 8
+            if plen > plen_max or p + 1 + n > len(self.buf):
+                raise MrtFormatError
+            key = self.buf[p:p+1+n]
+            # A prefix like "192.168.0.0/9" is invalid
+            if plen % 8 and struct.unpack('>B', key[-1:])[0] \
+                & ((1 << (8 - plen % 8)) - 1):
+                raise MrtFormatError
+            if key in seen:
+                raise MrtFormatError
+            seen.add(key)
+            p += 1 + n
+        return len(seen)
+
+    def decode_all(self, add_path):
+        '''
+        Yield all prefixes decoded like Base.val_nlri() and set count.
+        '''
+        p = self.start
+        n = 0
+        while p < self.end:
+            nlri = Nlri(self.buf[p:])
+            p += nlri.unpack(self.af, self.saf, add_path=1 if add_path else 0)
+            n += 1
+            yield nlri.data
+        self.count = n
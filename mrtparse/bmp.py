@@ -0,0 +1,797 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+
+import io
+import sys
+import json
+import time
+import socket
+import struct
+import argparse
+import threading
+import collections
+from datetime import datetime
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+from .params import *
+from .base import Base, MrtFormatError, as_len, is_add_path, lazy_nlri
+from . import Reader, BgpMessage
+from .frames import open_mrt_file
+from .filter import HeaderFilter, filter_records
+from .route import iter_routes
+from .writer import pack_hdr
+
+# Length of BMP common header and per-peer header
+BMP_HDR_LEN = 6
+BMP_PEER_HDR_LEN = 42
+
+# Maximum length of a plausible BMP message
+BMP_MAX_LEN = 1024 * 1024
+
+# Number of messages decoded at a time by BmpServer
+BMP_BATCH = 256
+
+# Bytes received from a socket at once
+BMP_READ_SIZE = 64 * 1024
+
+# Output formats of the command line
+BMP_FORMATS = ('json', 'bmp', 'routes', 'mrt', 'count')
+
+# AS_TRANS for 4-octet AS numbers in 2-octet AS fields (RFC6793)
+AS_TRANS = 23456
+
+# Capability codes used by BmpConverter
+CAP_AS4 = 65
+CAP_ADD_PATH = 69
+
+def read_bmp(f):
+    '''
+    Read a raw BMP message from a file object.
+    Return b'' at the end of file.
+    '''
+    hdr = f.read(BMP_HDR_LEN)
+    if not hdr:
+        return b''
+    length = check_bmp_hdr(hdr)
+    buf = hdr + f.read(length - BMP_HDR_LEN)
+    if len(buf) < length:
+        raise MrtFormatError(
+            'Invalid BMP message length %d < %d byte' % (len(buf), length)
+        )
+    return buf
+
+def check_bmp_hdr(buf, p=0):
+    '''
+    Check the BMP common header at p and return the message length.
+    '''
+    if len(buf) - p < BMP_HDR_LEN:
+        raise MrtFormatError(
+            'Invalid BMP header length %d < %d byte'
+            % (len(buf) - p, BMP_HDR_LEN)
+        )
+    version, length = struct.unpack('>BI', buf[p:p+5])
+    if version != BMP_VERSION:
+        raise MrtFormatError('Unsupported BMP version %d' % version)
+    if length < BMP_HDR_LEN or length > BMP_MAX_LEN:
+        raise MrtFormatError('Invalid BMP message length %d' % length)
+    return length
+
+def split_bmp(buf):
+    '''
+    Split complete BMP messages from the start of buf.
+    Return (list of messages, number of bytes consumed).
+    '''
+    msgs = []
+    p = 0
+    while len(buf) - p >= BMP_HDR_LEN:
+        length = check_bmp_hdr(buf, p)
+        if len(buf) - p < length:
+            break
+        msgs.append(bytes(buf[p:p+length]))
+        p += length
+    return (msgs, p)
+
+class Bmp(Base):
+    '''
+    Class for BMP message.
+    '''
+    __slots__ = []
+
+    def __init__(self, buf):
+        Base.__init__(self)
+        self.buf = buf
+
+    def unpack(self):
+        '''
+        Decoder for BMP message.
+        '''
+        self.data['version'] = self.val_num(1)
+        if self.data['version'] != BMP_VERSION:
+            raise MrtFormatError(
+                'Unsupported BMP version %d' % self.data['version']
+            )
+        self.data['length'] = self.val_num(4)
+        self.chk_buf(self.data['length'] - self.p)
+        self.buf = self.buf[:self.data['length']]
+        t = self.val_num(1)
+        self.data['type'] = {t: BMP_MSG_T[t]}
+
+        if t == BMP_MSG_T['Initiation Message']:
+            self.data['information'] = self.val_tlvs(BMP_INFO_T)
+        elif t == BMP_MSG_T['Termination Message']:
+            self.data['information'] = self.val_tlvs(BMP_TERM_T)
+        elif t in BMP_MSG_T:
+            self.unpack_peer_hdr()
+            if t == BMP_MSG_T['Route Monitoring']:
+                self.data['bgp_message'] = self.val_bgp_message()
+            elif t == BMP_MSG_T['Statistics Report']:
+                self.unpack_stats()
+            elif t == BMP_MSG_T['Peer Down Notification']:
+                self.unpack_peer_down()
+            elif t == BMP_MSG_T['Peer Up Notification']:
+                self.unpack_peer_up()
+            elif t == BMP_MSG_T['Route Mirroring Message']:
+                self.unpack_route_mirroring()
+        self.p = self.data['length']
+        return self.p
+
+    def unpack_peer_hdr(self):
+        '''
+        Decoder for BMP per-peer header.
+        '''
+        t = self.val_num(1)
+        self.data['peer_type'] = {t: BMP_PEER_T[t]}
+        flags = self.data['peer_flags'] = self.val_num(1)
+        self.data['peer_distinguisher'] = self.val_rd()
+        if flags & BMP_PEER_FLAG_V:
+            self.data['peer_ip'] = self.val_addr(AFI_T['IPv6'])
+        else:
+            self.p += 12
+            self.data['peer_ip'] = self.val_addr(AFI_T['IPv4'])
+        self.data['peer_as'] = self.val_as(4)
+        self.data['peer_bgp_id'] = self.val_addr(AFI_T['IPv4'])
+        ts = self.val_num(4)
+        self.data['timestamp'] = {ts: str(datetime.fromtimestamp(ts))}
+        self.data['microsecond_timestamp'] = self.val_num(4)
+        # BGP messages of the peer use 2-byte AS_PATH if A flag is set
+        as_len(2 if flags & BMP_PEER_FLAG_A else 4)
+
+    def val_bgp_message(self):
+        '''
+        Convert buffers to BGP message.
+        '''
+        self.chk_buf(19)
+        n = struct.unpack('>H', self.buf[self.p+16:self.p+18])[0]
+        self.chk_buf(n)
+        bgp_msg = BgpMessage(self.buf[self.p:self.p+n])
+        bgp_msg.unpack()
+        self.p += n
+        return bgp_msg.data
+
+    def val_tlvs(self, types):
+        '''
+        Convert buffers to the list of information TLVs.
+        '''
+        tlvs = []
+        while self.p < len(self.buf):
+            tlv = collections.OrderedDict()
+            t = self.val_num(2)
+            tlv['type'] = {t: types[t]}
+            n = tlv['length'] = self.val_num(2)
+            if types is BMP_TERM_T and t == BMP_TERM_T['Reason']:
+                r = self.val_num(n)
+                tlv['value'] = {r: BMP_TERM_R[r]}
+            else:
+                tlv['value'] = self.val_str(n)
+            tlvs.append(tlv)
+        return tlvs
+
+    def unpack_stats(self):
+        '''
+        Decoder for BMP Statistics Report.
+        '''
+        self.data['stats_count'] = self.val_num(4)
+        self.data['stats'] = []
+        for _ in range(self.data['stats_count']):
+            stat = collections.OrderedDict()
+            t = self.val_num(2)
+            stat['type'] = {t: BMP_STAT_T[t]}
+            n = stat['length'] = self.val_num(2)
+            if t == BMP_STAT_T['Routes in per-AFI/SAFI Adj-RIB-In'] \
+                or t == BMP_STAT_T['Routes in per-AFI/SAFI Loc-RIB']:
+                afi = self.val_num(2)
+                stat['afi'] = {afi: AFI_T[afi]}
+                safi = self.val_num(1)
+                stat['safi'] = {safi: SAFI_T[safi]}
+                n -= 3
+            stat['value'] = self.val_num(n)
+            self.data['stats'].append(stat)
+
+    def unpack_peer_down(self):
+        '''
+        Decoder for BMP Peer Down Notification.
+        '''
+        r = self.val_num(1)
+        self.data['reason'] = {r: BMP_PEER_DOWN_R[r]}
+        if r == BMP_PEER_DOWN_R['Local System Closed with NOTIFICATION'] \
+            or r == BMP_PEER_DOWN_R['Remote System Closed with NOTIFICATION']:
+            self.data['bgp_message'] = self.val_bgp_message()
+        elif r == BMP_PEER_DOWN_R['Local System Closed without NOTIFICATION']:
+            self.data['fsm_event_code'] = self.val_num(2)
+        elif self.p < len(self.buf):
+            self.data['data'] = self.val_bytes(len(self.buf) - self.p)
+
+    def unpack_peer_up(self):
+        '''
+        Decoder for BMP Peer Up Notification.
+        '''
+        if self.data['peer_flags'] & BMP_PEER_FLAG_V:
+            self.data['local_ip'] = self.val_addr(AFI_T['IPv6'])
+        else:
+            self.p += 12
+            self.data['local_ip'] = self.val_addr(AFI_T['IPv4'])
+        self.data['local_port'] = self.val_num(2)
+        self.data['remote_port'] = self.val_num(2)
+        self.data['sent_open'] = self.val_bgp_message()
+        self.data['received_open'] = self.val_bgp_message()
+        if self.p < len(self.buf):
+            self.data['information'] = self.val_tlvs(BMP_INFO_T)
+
+    def unpack_route_mirroring(self):
+        '''
+        Decoder for BMP Route Mirroring Message.
+        '''
+        self.data['tlvs'] = []
+        while self.p < len(self.buf):
+            tlv = collections.OrderedDict()
+            t = self.val_num(2)
+            tlv['type'] = {t: BMP_MIRROR_T[t]}
+            n = tlv['length'] = self.val_num(2)
+            if t == BMP_MIRROR_T['BGP Message']:
+                tlv['value'] = self.val_bgp_message()
+            elif t == BMP_MIRROR_T['Information']:
+                code = self.val_num(n)
+                tlv['value'] = {code: BMP_MIRROR_INFO[code]}
+            else:
+                tlv['value'] = self.val_bytes(n)
+            self.data['tlvs'].append(tlv)
+
+def check_len(buf, n, name):
+    '''
+    Check that a raw BMP message has at least n bytes for name.
+    '''
+    if len(buf) < n:
+        raise MrtFormatError(
+            'Invalid %s length %d < %d byte' % (name, len(buf), n)
+        )
+
+def open_len(buf, p):
+    '''
+    Check a raw BGP OPEN message at p and return its length.
+    '''
+    check_len(buf, p + 29, 'BGP OPEN message')
+    n = struct.unpack('>H', buf[p+16:p+18])[0]
+    if n < 29 + struct.unpack('>B', buf[p+28:p+29])[0]:
+        raise MrtFormatError('Invalid BGP OPEN message length %d' % n)
+    check_len(buf, p + n, 'BGP OPEN message')
+    return n
+
+def open_caps(buf, p):
+    '''
+    Return {capability code: value} of a raw BGP OPEN message at p
+    checked by open_len().
+    '''
+    caps = {}
+    end = p + 29 + struct.unpack('>B', buf[p+28:p+29])[0]
+    p += 29
+    while p + 2 <= end:
+        t, n = struct.unpack('>BB', buf[p:p+2])
+        p += 2
+        # Capabilities Optional Parameter
+        if t == BGP_OPT_PARAMS_T['Capabilities']:
+            q = p
+            while q + 2 <= min(p + n, end):
+                code, m = struct.unpack('>BB', buf[q:q+2])
+                caps[code] = buf[q+2:q+2+m]
+                q += 2 + m
+        p += n
+    return caps
+
+class BmpConverter:
+    '''
+    Converter of BMP messages to MRT BGP4MP_ET records.
+    Route Monitoring becomes BGP4MP_MESSAGE_AS4 (BGP4MP_MESSAGE if the
+    peer uses 2-byte AS_PATH), and Peer Up and Peer Down become
+    BGP4MP_STATE_CHANGE_AS4 to and from Established.
+    The local address, local AS and ADD-PATH of each peer are taken from
+    its Peer Up Notification. Other messages have no MRT record.
+    A truncated message raises MrtFormatError.
+    '''
+    __slots__ = ['peers']
+
+    def __init__(self):
+        # (peer distinguisher, peer address) -> (local address, local AS,
+        # ADD-PATH)
+        self.peers = {}
+
+    def convert(self, buf):
+        '''
+        Return the MRT record of a raw BMP message, or None.
+        '''
+        t = struct.unpack('>B', buf[5:6])[0]
+        if t != BMP_MSG_T['Route Monitoring'] \
+            and t != BMP_MSG_T['Peer Up Notification'] \
+            and t != BMP_MSG_T['Peer Down Notification']:
+            return None
+        p = BMP_HDR_LEN
+        check_len(buf, p + BMP_PEER_HDR_LEN, 'BMP per-peer header')
+        flags = struct.unpack('>B', buf[p+1:p+2])[0]
+        key = buf[p+2:p+26]
+        if flags & BMP_PEER_FLAG_V:
+            afi = AFI_T['IPv6']
+            peer_ip = buf[p+10:p+26]
+        else:
+            afi = AFI_T['IPv4']
+            peer_ip = buf[p+22:p+26]
+        peer_as, ts, usec = struct.unpack('>I4xII', buf[p+26:p+42])
+        p += BMP_PEER_HDR_LEN
+
+        if t == BMP_MSG_T['Peer Up Notification']:
+            check_len(buf, p + 20, 'Peer Up Notification')
+            local_ip = buf[p:p+16] if afi == AFI_T['IPv6'] \
+                else buf[p+12:p+16]
+            p += 20
+            n = open_len(buf, p)
+            sent = open_caps(buf, p)
+            local_as = struct.unpack('>H', buf[p+20:p+22])[0]
+            if CAP_AS4 in sent and len(sent[CAP_AS4]) == 4:
+                local_as = struct.unpack('>I', sent[CAP_AS4])[0]
+            p += n
+            open_len(buf, p)
+            recv = open_caps(buf, p)
+            self.peers[key] = (
+                local_ip, local_as, CAP_ADD_PATH in sent
+                and CAP_ADD_PATH in recv
+            )
+        local_ip, local_as, add_path = self.peers.get(
+            key, (b'\x00' * len(peer_ip), 0, False)
+        )
+
+        if t == BMP_MSG_T['Route Monitoring']:
+            if flags & BMP_PEER_FLAG_A:
+                st = BGP4MP_ST['BGP4MP_MESSAGE_ADDPATH'] if add_path \
+                    else BGP4MP_ST['BGP4MP_MESSAGE']
+                ases = struct.pack(
+                    '>HH', AS_TRANS if peer_as > 0xffff else peer_as,
+                    AS_TRANS if local_as > 0xffff else local_as
+                )
+            else:
+                st = BGP4MP_ST['BGP4MP_MESSAGE_AS4_ADDPATH'] if add_path \
+                    else BGP4MP_ST['BGP4MP_MESSAGE_AS4']
+                ases = struct.pack('>II', peer_as, local_as)
+            tail = buf[p:]
+        else:
+            st = BGP4MP_ST['BGP4MP_STATE_CHANGE_AS4']
+            ases = struct.pack('>II', peer_as, local_as)
+            if t == BMP_MSG_T['Peer Up Notification']:
+                tail = struct.pack(
+                    '>HH', BGP_FSM['OpenConfirm'], BGP_FSM['Established']
+                )
+            else:
+                self.peers.pop(key, None)
+                tail = struct.pack(
+                    '>HH', BGP_FSM['Established'], BGP_FSM['Idle']
+                )
+        body = struct.pack('>I', usec) + ases + struct.pack('>HH', 0, afi) \
+            + peer_ip + local_ip + tail
+        return pack_hdr(ts, MRT_T['BGP4MP_ET'], st, len(body)) + body
+
+class BmpFile:
+    '''
+    File object which converts a stream of BMP messages to MRT records
+    with BmpConverter, so that Reader decodes BMP feeds.
+    "skipped" is the number of BMP messages without MRT records, and
+    "invalid" is the number of truncated messages, which are skipped.
+    '''
+    __slots__ = ['f', 'conv', 'buf', 'skipped', 'invalid']
+
+    def __init__(self, f):
+        self.f = f
+        self.conv = BmpConverter()
+        self.buf = b''
+        self.skipped = 0
+        self.invalid = 0
+
+    def read(self, n):
+        '''
+        Read n bytes of MRT records.
+        '''
+        while len(self.buf) < n:
+            msg = read_bmp(self.f)
+            if not msg:
+                break
+            try:
+                rec = self.conv.convert(msg)
+            except MrtFormatError:
+                self.invalid += 1
+                continue
+            if rec is None:
+                self.skipped += 1
+                continue
+            self.buf += rec
+        val = self.buf[:n]
+        self.buf = self.buf[n:]
+        return val
+
+    def close(self):
+        '''
+        Close file object.
+        '''
+        self.f.close()
+
+def open_bmp(arg):
+    '''
+    Open a BMP file which may be compressed with gzip or bzip2.
+    arg is a filepath or a file object.
+    '''
+    if hasattr(arg, 'read'):
+        return arg
+    return open_mrt_file(arg)[0]
+
+def mrt_reader(arg, **kwargs):
+    '''
+    Return a Reader of the MRT records converted from BMP messages.
+    arg is a filepath or a file object of BMP messages, and kwargs are
+    passed to Reader.
+    '''
+    return Reader(BmpFile(open_bmp(arg)), **kwargs)
+
+class BmpReader(Base):
+    '''
+    Reader for BMP messages.
+    Like Reader, it yields itself with the decoded message in "data" and
+    the raw message in "buf".
+    '''
+    __slots__ = ['f', 'err', 'err_msg', 'decode', 'lazy_nlri', 'broken']
+
+    def __init__(self, arg, decode=True, lazy_nlri=False):
+        Base.__init__(self)
+        # If decode is False, only the common header is decoded
+        self.decode = decode
+        self.lazy_nlri = lazy_nlri
+        self.f = open_bmp(arg)
+        self.broken = False
+        # The last message and its error
+        self.buf = None
+        self.err = None
+        self.err_msg = None
+
+    def close(self):
+        '''
+        Close file object and stop iteration.
+        '''
+        self.f.close()
+        raise StopIteration
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        as_len(4)
+        is_add_path(False)
+        lazy_nlri(self.lazy_nlri)
+        self.err = None
+        self.err_msg = None
+        # The framing is lost after an invalid common header
+        if self.broken:
+            self.close()
+        try:
+            self.buf = read_bmp(self.f)
+        except MrtFormatError as e:
+            self.err = MRT_ERR_C['MRT Header Error']
+            self.err_msg = e.msg
+            self.buf = b''
+            self.broken = True
+            return self
+        if not self.buf:
+            self.close()
+
+        bmp = Bmp(self.buf)
+        try:
+            if self.decode:
+                bmp.unpack()
+            else:
+                bmp.data['version'] = bmp.val_num(1)
+                bmp.data['length'] = bmp.val_num(4)
+                t = bmp.val_num(1)
+                bmp.data['type'] = {t: BMP_MSG_T[t]}
+        except MrtFormatError as e:
+            self.err = MRT_ERR_C['MRT Data Error']
+            self.err_msg = e.msg
+        self.data = bmp.data
+        return self
+
+    # Python2 compatibility
+    next = __next__
+
+class BmpHandler(socketserver.BaseRequestHandler):
+    '''
+    Handler of a BMP session, which decodes received messages in
+    batches.
+    '''
+
+    def handle(self):
+        conv = BmpConverter()
+        buf = b''
+        while True:
+            data = self.request.recv(BMP_READ_SIZE)
+            if not data:
+                break
+            buf += data
+            try:
+                msgs, p = split_bmp(buf)
+            except MrtFormatError as e:
+                sys.stderr.write(
+                    'Error: %s from %s\n' % (e.msg, self.client_address[0])
+                )
+                break
+            buf = buf[p:]
+            for i in range(0, len(msgs), self.server.batch):
+                self.server.process(
+                    self.client_address, conv, msgs[i:i+self.server.batch]
+                )
+
+class BmpServer(socketserver.ThreadingTCPServer):
+    '''
+    TCP listener for BMP sessions of routers.
+    Each session is received in its own thread, and every batch of up to
+    "batch" messages is decoded and passed to handler(client_address,
+    records) one batch at a time, because the decoders share global
+    state.
+    If mrt is True, records are Reader instances of MRT records converted
+    by BmpConverter, optionally filtered by header_filter, so that the
+    output of Reader can be reused. Otherwise they are BmpReader
+    instances.
+    '''
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, handler, batch=BMP_BATCH, mrt=True,
+        decode=True, lazy_nlri=False, header_filter=None):
+        if header_filter and not mrt:
+            raise ValueError('Filters need mrt=True')
+        self.handler = handler
+        self.batch = batch
+        self.mrt = mrt
+        self.decode = decode
+        self.lazy_nlri = lazy_nlri
+        self.header_filter = header_filter
+        self.lock = threading.Lock()
+        socketserver.ThreadingTCPServer.__init__(self, address, BmpHandler)
+
+    def process(self, client_address, conv, msgs):
+        '''
+        Decode a batch of raw BMP messages of a session and pass the
+        records to the handler.
+        '''
+        with self.lock:
+            if not self.mrt:
+                self.handler(client_address, BmpReader(
+                    io.BytesIO(b''.join(msgs)), self.decode, self.lazy_nlri
+                ))
+                return
+            recs = []
+            for msg in msgs:
+                try:
+                    recs.append(conv.convert(msg))
+                except MrtFormatError as e:
+                    sys.stderr.write(
+                        'Error: %s from %s\n' % (e.msg, client_address[0])
+                    )
+            buf = b''.join(rec for rec in recs if rec is not None)
+            if not buf:
+                return
+            hf = self.header_filter
+            reader = Reader(
+                io.BytesIO(buf), decode=self.decode and not hf,
+                lazy_nlri=self.lazy_nlri
+            )
+            if hf:
+                records = filter_records(reader, hf, self.decode)
+            else:
+                records = reader
+            self.handler(client_address, records)
+
+def replay(arg, address, rate=None):
+    '''
+    Send BMP messages of a file to a listener like a router and return
+    the number of messages sent.
+    If rate is given, messages are sent at rate messages per second.
+    '''
+    f = open_bmp(arg)
+    sock = socket.create_connection(address)
+    n = 0
+    try:
+        start = time.time()
+        chunk = []
+        size = 0
+        while True:
+            msg = read_bmp(f)
+            if not msg:
+                break
+            chunk.append(msg)
+            size += len(msg)
+            n += 1
+            if rate:
+                wait = start + float(n) / rate - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+            if rate or size >= BMP_READ_SIZE:
+                sock.sendall(b''.join(chunk))
+                chunk = []
+                size = 0
+        if chunk:
+            sock.sendall(b''.join(chunk))
+    finally:
+        sock.close()
+        f.close()
+    return n
+
+class RecordWriter:
+    '''
+    Writer of records in an output format of the command line.
+    json writes a JSON line of each decoded record.
+    '''
+    __slots__ = ['fmt', 'f', 'count']
+
+    def __init__(self, fmt, f):
+        self.fmt = fmt
+        self.f = f
+        self.count = 0
+
+    def write(self, reader, records):
+        '''
+        Write records of reader.
+        '''
+        if self.fmt == 'routes':
+            for r in iter_routes(reader, records):
+                self.f.write('%d|%s|%s|%s|%s/%d|%s\n' % (
+                    r.ts, r.action, r.peer_ip, r.peer_as, r.prefix, r.plen,
+                    '' if r.path_id is None else r.path_id
+                ))
+                self.count += 1
+            return
+        for rec in records:
+            if rec.err:
+                sys.stderr.write('Error: %s\n' % rec.err_msg)
+                continue
+            if self.fmt == 'mrt':
+                self.f.write(rec.buf)
+            elif self.fmt != 'count':
+                self.f.write(json.dumps(rec.data) + '\n')
+            self.count += 1
+        self.f.flush()
+
+def parse_address(value):
+    '''
+    Convert "host:port" to (host, port).
+    '''
+    host, _, port = value.rpartition(':')
+    return (host.strip('[]') or '0.0.0.0', int(port))
+
+def parse_args():
+    '''
+    Parse the command line arguments.
+    '''
+    p = argparse.ArgumentParser(
+        description='Decode BMP messages from a file or a TCP listener.')
+    p.add_argument(
+        'path_to_file', nargs='?',
+        help='specify path to BMP file (or file to replay with -r)')
+    p.add_argument(
+        '-l', dest='listen', default=None, metavar='host:port',
+        help='listen for BMP sessions of routers')
+    p.add_argument(
+        '-r', dest='replay', default=None, metavar='host:port',
+        help='replay the file to a listener')
+    p.add_argument(
+        '--rate', dest='rate', default=None, type=float, metavar='N',
+        help='replay N messages per second')
+    p.add_argument(
+        '-f', dest='format', default='json', choices=BMP_FORMATS,
+        help='output format (default: json)')
+    p.add_argument(
+        '-o', dest='output', default=None, metavar='path',
+        help='output file (default: stdout)')
+    p.add_argument(
+        '-t', dest='types', action='append', default=None,
+        metavar='type', help='output only MRT type')
+    p.add_argument(
+        '-T', dest='subtypes', action='append', default=None,
+        metavar='subtype', help='output only MRT subtype')
+    p.add_argument(
+        '--start', dest='start', default=None, type=int, metavar='ts',
+        help='output only records at or after ts')
+    p.add_argument(
+        '--end', dest='end', default=None, type=int, metavar='ts',
+        help='output only records at or before ts')
+    p.add_argument(
+        '-b', dest='batch', default=BMP_BATCH, type=int, metavar='N',
+        help='decode N messages at a time (default: %d)' % BMP_BATCH)
+    return p.parse_args()
+
+def main():
+    '''
+    Decode, convert or replay BMP messages as given by the arguments.
+    '''
+    args = parse_args()
+    if args.replay is not None:
+        n = replay(args.path_to_file, parse_address(args.replay), args.rate)
+        sys.stderr.write('%d messages sent\n' % n)
+        return
+
+    hf = HeaderFilter(args.types, args.subtypes, args.start, args.end)
+    mrt = args.format != 'bmp'
+    decode = args.format in ('json', 'bmp', 'routes')
+    if hf and not mrt:
+        sys.stderr.write('Error: Filters are not supported for bmp\n')
+        sys.exit(1)
+    if args.output is not None:
+        f = open(args.output, 'wb' if args.format == 'mrt' else 'w')
+    elif args.format == 'mrt':
+        f = getattr(sys.stdout, 'buffer', sys.stdout)
+    else:
+        f = sys.stdout
+    w = RecordWriter(args.format, f)
+
+    if args.listen is not None:
+        server = BmpServer(
+            parse_address(args.listen), w.write, args.batch, mrt, decode,
+            header_filter=hf
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    elif args.path_to_file is not None:
+        if mrt:
+            reader = mrt_reader(args.path_to_file, decode=decode and not hf)
+            records = filter_records(reader, hf, decode) if hf else reader
+        else:
+            reader = records = BmpReader(args.path_to_file)
+        w.write(reader, records)
+    else:
+        sys.stderr.write('Error: No BMP file or listener\n')
+        sys.exit(1)
+    if args.format == 'count':
+        f.write('%d\n' % w.count)
+    if args.output is not None:
+        f.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import os
+import gc
+import json
+import time
+import zlib
+import struct
+import hashlib
+import tempfile
+import collections
+
+# Default limit of the total size of cache files in bytes
+CACHE_SIZE = 4 * 1024 ** 3
+
+# Number of records stored in a batch
+CACHE_BATCH = 1024
+
+# zlib level of batches
+CACHE_LEVEL = 1
+
+# Bytes hashed at the head and the tail of a file
+CACHE_HASH_SIZE = 1024 * 1024
+
+CACHE_MAGIC = b'mrtparse-cache-2\n'
+CACHE_SUFFIX = '.cache'
+
+# Incomplete cache files older than this are removed on eviction
+CACHE_TMP_AGE = 3600
+
+def content_hash(path, size):
+    '''
+    Return the hash of the head and the tail of a file.
+    '''
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        h.update(f.read(CACHE_HASH_SIZE))
+        if size > CACHE_HASH_SIZE * 2:
+            f.seek(size - CACHE_HASH_SIZE)
+        h.update(f.read(CACHE_HASH_SIZE))
+    return h.hexdigest()
+
+def cache_key(path, options):
+    '''
+    Return the cache key of a file, which is a hash of its size, mtime,
+    content hash and decode options.
+    '''
+    st = os.stat(path)
+    h = hashlib.sha1()
+    h.update(repr((
+        CACHE_MAGIC, st.st_size, int(st.st_mtime * 1000000),
+        content_hash(path, st.st_size), options
+    )).encode('utf-8'))
+    return h.hexdigest()
+
+def evict(cache_dir, max_size):
+    '''
+    Remove the least recently used cache files until the total size is
+    not more than max_size.
+    '''
+    now = time.time()
+    files = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if name.endswith(CACHE_SUFFIX):
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        elif name.endswith('.tmp') and now - st.st_mtime > CACHE_TMP_AGE:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    files.sort()
+    for _, size, path in files:
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+def encode_view(obj):
+    '''
+    Convert lazy views of decoded records (RibEntryStream and LazyNlri) to
+    lists when they are stored.
+    '''
+    if isinstance(obj, (bytes, bytearray)) or not hasattr(obj, '__iter__'):
+        raise TypeError('Cannot store %r' % obj)
+    return list(obj)
+
+def decode_object(pairs):
+    '''
+    Restore a dictionary of a decoded record. Dictionaries of codes such as
+    {1: 'IGP'} have integer keys and the others are OrderedDict.
+    '''
+    # Digits sort before the letters of field names
+    if pairs and pairs[0][0] < ':':
+        if len(pairs) == 1:
+            k, v = pairs[0]
+            return {int(k): v}
+        return dict((int(k), v) for k, v in pairs)
+    return collections.OrderedDict(pairs)
+
+CACHE_ENCODER = json.JSONEncoder(
+    separators=(',', ':'), default=encode_view
+)
+CACHE_DECODER = json.JSONDecoder(object_pairs_hook=decode_object)
+
+def encode_record(reader):
+    '''
+    Encode a record decoded by reader as JSON of
+    [data, err, err_msg, length of buf].
+    '''
+    return CACHE_ENCODER.encode(
+        (reader.data, reader.err, reader.err_msg, len(reader.buf))
+    )
+
+def pack_batch(batch):
+    '''
+    Pack records (JSON, buf) into a compressed batch, which is a JSON
+    array of the records followed by the raw records.
+    '''
+    js = ('[' + ','.join(val for val, _ in batch) + ']').encode('utf-8')
+    return zlib.compress(
+        struct.pack('>I', len(js)) + js + b''.join(buf for _, buf in batch),
+        CACHE_LEVEL
+    )
+
+def unpack_batch(val):
+    '''
+    Unpack a batch packed by pack_batch() into a list of records.
+    '''
+    val = zlib.decompress(val)
+    n = struct.unpack('>I', val[:4])[0]
+    p = 4 + n
+    # Decoded records have no reference cycles, so the collector only
+    # slows down creating many objects
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        recs = CACHE_DECODER.decode(val[4:p].decode('utf-8'))
+    finally:
+        if enabled:
+            gc.enable()
+    batch = []
+    for data, err, err_msg, length in recs:
+        batch.append((data, val[p:p+length], err, err_msg))
+        p += length
+    return batch
+
+class ParseCache:
+    '''
+    On-disk cache of records decoded by Reader.
+    Records are stored as zlib-compressed batches of JSON and raw records,
+    so that loading a cache file does not execute anything.
+    The mtime of a cache file is updated on each hit to evict the least
+    recently used files.
+    '''
+    __slots__ = [
+        'cache_dir', 'max_size', 'path', 'hit', 'f', 'tmp', 'batch',
+        'records'
+    ]
+
+    def __init__(self, cache_dir, path, options, max_size=CACHE_SIZE):
+        '''
+        options is a tuple of the decode options which change the result.
+        '''
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.batch = []
+        self.records = iter(())
+        self.tmp = None
+        self.f = None
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.path = os.path.join(
+            cache_dir, cache_key(path, options) + CACHE_SUFFIX
+        )
+        try:
+            self.f = open(self.path, 'rb')
+        except (IOError, OSError):
+            self.f = None
+        self.hit = self.f is not None
+        if self.hit:
+            if self.f.read(len(CACHE_MAGIC)) == CACHE_MAGIC:
+                os.utime(self.path, None)
+            else:
+                self.f.close()
+                self.f = None
+                self.hit = False
+        if not self.hit:
+            fd, self.tmp = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+            self.f = os.fdopen(fd, 'wb')
+            self.f.write(CACHE_MAGIC)
+
+    def __del__(self):
+        self.close()
+
+    def replay(self, reader):
+        '''
+        Set the next cached record to reader and return it.
+        '''
+        try:
+            rec = next(self.records)
+        except StopIteration:
+            hdr = self.f.read(4)
+            if len(hdr) < 4:
+                reader.close()
+            val = self.f.read(struct.unpack('>I', hdr)[0])
+            self.records = iter(unpack_batch(val))
+            rec = next(self.records)
+        reader.data, reader.buf, reader.err, reader.err_msg = rec
+        return reader
+
+    def store(self, reader):
+        '''
+        Append a record decoded by reader.
+        Records are encoded one by one so that they are not held in memory.
+        The cache file is discarded if a record can not be stored.
+        '''
+        if self.tmp is None:
+            return
+        try:
+            val = encode_record(reader)
+        except (TypeError, ValueError):
+            self.close()
+            return
+        self.batch.append((val, reader.buf))
+        if len(self.batch) >= CACHE_BATCH:
+            self.flush()
+
+    def flush(self):
+        '''
+        Write the stored records as a batch.
+        '''
+        val = pack_batch(self.batch)
+        self.batch = []
+        self.f.write(struct.pack('>I', len(val)))
+        self.f.write(val)
+
+    def commit(self):
+        '''
+        Complete the cache file after the last record is stored.
+        '''
+        if self.tmp is None:
+            return
+        if self.batch:
+            self.flush()
+        self.f.close()
+        os.rename(self.tmp, self.path)
+        self.tmp = None
+        evict(self.cache_dir, self.max_size)
+
+    def close(self):
+        '''
+        Close the cache file. An incomplete cache file is removed.
+        '''
+        if self.f is not None:
+            self.f.close()
+        if self.tmp is not None:
+            try:
+                os.remove(self.tmp)
+            except OSError:
+                pass
+            self.tmp = None
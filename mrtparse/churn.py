@@ -0,0 +1,268 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import zlib
+import socket
+import struct
+from .params import *
+from .raw import raw_routes, state_change
+from .trie import int_to_addr
+
+# (window size in seconds, number of buckets)
+CHURN_WINDOWS = ((60, 12), (300, 10), (3600, 12))
+
+# Index of counters
+ANNOUNCE = 0
+WITHDRAW = 1
+DUPLICATE = 2
+
+class Window:
+    '''
+    Sliding window of bucketed ring counters.
+    Each key has [epoch of the last bucket, announcements * n,
+    withdrawals * n, duplicates * n]. Buckets are cleared lazily when
+    the key is updated, so rollover costs nothing for idle keys.
+    '''
+    __slots__ = ['size', 'n', 'width', 'counters']
+
+    def __init__(self, size, n):
+        self.size = size
+        self.n = n
+        self.width = size // n
+        self.counters = {}
+
+    def advance(self, val, epoch):
+        '''
+        Clear buckets between the last epoch of the key and epoch.
+        '''
+        last = val[0]
+        if epoch <= last:
+            return
+        for e in range(max(last + 1, epoch - self.n + 1), epoch + 1):
+            i = e % self.n
+            val[1+i] = val[1+self.n+i] = val[1+2*self.n+i] = 0
+        val[0] = epoch
+
+    def add(self, key, ts, kind, count=1):
+        '''
+        Increment the counter of the key.
+        '''
+        epoch = ts // self.width
+        val = self.counters.get(key)
+        if val is None:
+            val = self.counters[key] = [epoch] + [0] * (3 * self.n)
+        elif epoch > val[0]:
+            self.advance(val, epoch)
+        elif epoch <= val[0] - self.n:
+            # Too old for the window
+            return
+        val[1+kind*self.n+epoch%self.n] += count
+
+    def totals(self, key, now):
+        '''
+        Return (announcements, withdrawals, duplicates) of the key in the
+        window ending at now.
+        '''
+        val = self.counters.get(key)
+        if val is None:
+            return (0, 0, 0)
+        epoch = now // self.width
+        self.advance(val, epoch)
+        if epoch < val[0]:
+            # The key has newer data than now
+            return (0, 0, 0)
+        return tuple(
+            sum(val[1+kind*self.n:1+(kind+1)*self.n])
+            for kind in (ANNOUNCE, WITHDRAW, DUPLICATE)
+        )
+
+    def prune(self, now):
+        '''
+        Remove keys which have no counts in the window ending at now.
+        '''
+        epoch = now // self.width
+        for key in [k for k, v in self.counters.items()
+            if v[0] <= epoch - self.n]:
+            del self.counters[key]
+
+    def merge(self, other, remap=None):
+        '''
+        Add the counters of another Window of the same size.
+        '''
+        for key, val in other.counters.items():
+            if remap is not None:
+                key = remap(key)
+            mine = self.counters.get(key)
+            if mine is None:
+                self.counters[key] = list(val)
+                continue
+            val = list(val)
+            epoch = max(mine[0], val[0])
+            self.advance(mine, epoch)
+            self.advance(val, epoch)
+            for i in range(1, len(mine)):
+                mine[i] += val[i]
+
+class ChurnStats:
+    '''
+    Streaming statistics of announcements, withdrawals and duplicate
+    announcements per peer and per prefix in sliding windows.
+    '''
+    __slots__ = [
+        'windows', 'peers', 'peer_ids', 'last_attrs', 'duplicates', 'ts'
+    ]
+
+    def __init__(self, windows=CHURN_WINDOWS, duplicates=True):
+        '''
+        windows is a list of (window size in seconds, number of buckets).
+        If duplicates is True, the hash of path attributes of each route
+        is kept to detect duplicate announcements.
+        '''
+        self.windows = [
+            (Window(size, n), Window(size, n)) for size, n in windows
+        ]
+        self.peers = []
+        self.peer_ids = {}
+        self.last_attrs = {}
+        self.duplicates = duplicates
+        self.ts = 0
+
+    def peer_id(self, peer):
+        '''
+        Return the id of the peer, registering it if necessary.
+        '''
+        i = self.peer_ids.get(peer)
+        if i is None:
+            i = self.peer_ids[peer] = len(self.peers)
+            self.peers.append(peer)
+        return i
+
+    def count(self, peer, prefix, ts, kind):
+        '''
+        Increment the counters of the peer and the prefix.
+        '''
+        for peer_w, prefix_w in self.windows:
+            peer_w.add(peer, ts, kind)
+            prefix_w.add(prefix, ts, kind)
+
+    def add(self, rec):
+        '''
+        Add a BGP4MP record returned by Reader.
+        '''
+        if rec.err:
+            return
+        buf = rec.buf
+        ts, t = struct.unpack('>IH', buf[:6])
+        if t != MRT_T['BGP4MP'] and t != MRT_T['BGP4MP_ET']:
+            return
+        self.ts = max(self.ts, ts)
+        state = state_change(buf)
+        if state is not None:
+            # Routes are flushed when the session goes down
+            if state[1] == BGP_FSM['Established'] \
+                and state[2] != BGP_FSM['Established']:
+                self.last_attrs.pop(self.peer_id(state[0]), None)
+            return
+        for route in raw_routes(buf, []):
+            peer = self.peer_id(route.peer)
+            last = self.last_attrs.setdefault(peer, {})
+            if route.action == 'W':
+                for prefix in route.prefixes:
+                    self.count(peer, prefix, ts, WITHDRAW)
+                    last.pop(prefix, None)
+                continue
+            attrs = buf[route.attrs[0]:route.attrs[1]]
+            # The hash is stable across processes to merge shards
+            h = (len(attrs) << 32) | (zlib.crc32(attrs) & 0xffffffff)
+            for prefix in route.prefixes:
+                kind = ANNOUNCE
+                if self.duplicates:
+                    if last.get(prefix) == h:
+                        kind = DUPLICATE
+                    last[prefix] = h
+                self.count(peer, prefix, ts, kind)
+
+    def add_reader(self, reader):
+        '''
+        Add all records of reader.
+        '''
+        for rec in reader:
+            self.add(rec)
+
+    def prune(self, now=None):
+        '''
+        Remove keys which have no counts in any window.
+        '''
+        if now is None:
+            now = self.ts
+        for peer_w, prefix_w in self.windows:
+            peer_w.prune(now)
+            prefix_w.prune(now)
+
+    def peer_key(self, peer):
+        '''
+        Convert a peer id to (peer_ip, peer_as).
+        '''
+        peer_ip, peer_as = self.peers[peer]
+        af = socket.AF_INET6 if len(peer_ip) == 16 else socket.AF_INET
+        return (socket.inet_ntop(af, peer_ip), peer_as)
+
+    def snapshot(self, now=None):
+        '''
+        Return the counts in the windows ending at now (default is the
+        latest timestamp) as a dictionary:
+        {'peers': {(peer_ip, peer_as): {window size: (announcements,
+        withdrawals, duplicates)}}, 'prefixes': {'prefix/length': {...}}}
+        '''
+        if now is None:
+            now = self.ts
+        val = {'peers': {}, 'prefixes': {}}
+        for peer_w, prefix_w in self.windows:
+            for peer in list(peer_w.counters):
+                counts = peer_w.totals(peer, now)
+                if any(counts):
+                    val['peers'].setdefault(
+                        self.peer_key(peer), {}
+                    )[peer_w.size] = counts
+            for prefix in list(prefix_w.counters):
+                counts = prefix_w.totals(prefix, now)
+                if any(counts):
+                    af, n, plen = prefix
+                    val['prefixes'].setdefault(
+                        '%s/%d' % (int_to_addr(af, n), plen), {}
+                    )[prefix_w.size] = counts
+        return val
+
+    def merge(self, other):
+        '''
+        Merge another ChurnStats with the same windows, e.g. the result of
+        a parallel shard.
+        '''
+        ids = [self.peer_id(peer) for peer in other.peers]
+        for (peer_w, prefix_w), (o_peer_w, o_prefix_w) in zip(
+            self.windows, other.windows):
+            peer_w.merge(o_peer_w, lambda peer: ids[peer])
+            prefix_w.merge(o_prefix_w)
+        for peer, last in other.last_attrs.items():
+            self.last_attrs.setdefault(ids[peer], {}).update(last)
+        self.ts = max(self.ts, other.ts)
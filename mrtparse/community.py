@@ -0,0 +1,371 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+
+import io
+import sys
+import json
+import array
+import socket
+import struct
+from .params import *
+from .base import MrtFormatError
+from . import Reader
+from .raw import raw_routes, index_peers, ADDR_LEN, num
+
+# Magic Number of the community index file
+COMM_INDEX_MAGIC = b'MRTCOMM1'
+
+# Header of the community index file
+# (byte order, length of peers, prefixes, routes, communities,
+# large communities)
+COMM_INDEX_HDR = struct.Struct('>BIIIII')
+
+# Prefix of the community index file, (AFI, upper and lower 64 bits of
+# prefix, length)
+COMM_INDEX_PREFIX = struct.Struct('>BQQB')
+
+def parse_community(value):
+    '''
+    Convert a community to (large, integer).
+    value is an integer of COMMUNITY, "AS:value", "AS:value1:value2" of
+    LARGE_COMMUNITY, a tuple of them or a name like "NO_EXPORT".
+    '''
+    if isinstance(value, int):
+        return (False, value)
+    if isinstance(value, tuple):
+        parts = list(value)
+    elif value in COMM_T:
+        return (False, COMM_T[value])
+    else:
+        try:
+            parts = [int(v) for v in value.split(':')]
+        except (AttributeError, ValueError):
+            parts = []
+    if len(parts) == 2 and all(0 <= v <= 0xffff for v in parts):
+        return (False, (parts[0] << 16) | parts[1])
+    elif len(parts) == 3 and all(0 <= v <= 0xffffffff for v in parts):
+        return (True, (parts[0] << 64) | (parts[1] << 32) | parts[2])
+    raise MrtFormatError('Invalid community %s' % (value,))
+
+def format_community(large, value):
+    '''
+    Convert (large, integer) to "AS:value" or "AS:value1:value2".
+    '''
+    if large:
+        return '%d:%d:%d' % (
+            value >> 64, (value >> 32) & 0xffffffff, value & 0xffffffff
+        )
+    return '%d:%d' % (value >> 16, value & 0xffff)
+
+def add_posting(postings, key, route_id):
+    '''
+    Append a route id to the posting list of key.
+    A posting list is [last route id, deltas of route ids as varints].
+    '''
+    val = postings.get(key)
+    if val is None:
+        val = postings[key] = [-1, bytearray()]
+    elif val[0] is None:
+        # Posting list loaded from a file
+        val[0] = decode_posting(val[1])[-1]
+        val[1] = bytearray(val[1])
+    if val[0] == route_id:
+        return
+    delta = route_id - val[0] - 1
+    val[0] = route_id
+    buf = val[1]
+    while delta >= 0x80:
+        buf.append((delta & 0x7f) | 0x80)
+        delta >>= 7
+    buf.append(delta)
+
+def decode_posting(buf):
+    '''
+    Convert deltas of a posting list to the list of route ids.
+    '''
+    val = []
+    last = -1
+    delta = 0
+    shift = 0
+    for c in bytearray(buf):
+        delta |= (c & 0x7f) << shift
+        if c & 0x80:
+            shift += 7
+            continue
+        last += delta + 1
+        val.append(last)
+        delta = 0
+        shift = 0
+    return val
+
+class CommunityIndex:
+    '''
+    Inverted index of COMMUNITY and LARGE_COMMUNITY values of RIB dumps.
+    Each route of a prefix and a peer has an id, and each value maps to
+    the compressed posting list of the ids of routes carrying it.
+    '''
+    __slots__ = [
+        'peers', 'peer_ids', 'index_peers', 'prefixes', 'prefix_ids',
+        'route_prefix', 'route_peer', 'communities', 'large_communities'
+    ]
+
+    def __init__(self):
+        # list of (peer_ip, peer_as)
+        self.peers = []
+        self.peer_ids = {}
+        self.index_peers = []
+        # list of (AFI, prefix as integer, length)
+        self.prefixes = []
+        self.prefix_ids = {}
+        # prefix id and peer id of each route id
+        self.route_prefix = array.array('I')
+        self.route_peer = array.array('I')
+        # value -> posting list
+        self.communities = {}
+        self.large_communities = {}
+
+    def __len__(self):
+        return len(self.route_prefix)
+
+    def peer_id(self, peer):
+        '''
+        Return the id of the peer, registering it if necessary.
+        '''
+        i = self.peer_ids.get(peer)
+        if i is None:
+            i = self.peer_ids[peer] = len(self.peers)
+            af = socket.AF_INET6 if len(peer[0]) == 16 else socket.AF_INET
+            self.peers.append((socket.inet_ntop(af, peer[0]), peer[1]))
+        return i
+
+    def prefix_id(self, prefix):
+        '''
+        Return the id of the prefix, registering it if necessary.
+        '''
+        i = self.prefix_ids.get(prefix)
+        if i is None:
+            i = self.prefix_ids[prefix] = len(self.prefixes)
+            self.prefixes.append(prefix)
+        return i
+
+    def add(self, rec):
+        '''
+        Add a TABLE_DUMP or TABLE_DUMP_V2 record returned by Reader.
+        The record can be decoded or not, only the raw record in "buf" is
+        used.
+        '''
+        if rec.err:
+            return
+        buf = rec.buf
+        t, st = struct.unpack('>HH', buf[4:8])
+        if t == MRT_T['TABLE_DUMP_V2'] \
+            and st == TD_V2_ST['PEER_INDEX_TABLE']:
+            if 'peer_entries' not in rec.data:
+                rec = next(Reader(io.BytesIO(buf)))
+            self.index_peers = index_peers(rec.data)
+            return
+        if t != MRT_T['TABLE_DUMP_V2'] and t != MRT_T['TABLE_DUMP']:
+            return
+        for route in raw_routes(buf, self.index_peers):
+            peer = self.peer_id(route.peer)
+            prefix = self.prefix_id(route.prefixes[0])
+            route_id = len(self.route_prefix)
+            self.route_prefix.append(prefix)
+            self.route_peer.append(peer)
+            for attr_t, start, end in route.iter_attrs():
+                if attr_t == BGP_ATTR_T['COMMUNITY']:
+                    for p in range(start, end - 3, 4):
+                        add_posting(
+                            self.communities, num(buf, p, 4), route_id
+                        )
+                elif attr_t == BGP_ATTR_T['LARGE_COMMUNITY']:
+                    for p in range(start, end - 11, 12):
+                        add_posting(
+                            self.large_communities, num(buf, p, 12),
+                            route_id
+                        )
+
+    def add_reader(self, reader):
+        '''
+        Add all records of reader.
+        '''
+        for rec in reader:
+            self.add(rec)
+
+    @classmethod
+    def build(cls, reader):
+        '''
+        Build the index from the records of reader in one pass.
+        '''
+        index = cls()
+        index.add_reader(reader)
+        return index
+
+    def values(self):
+        '''
+        Yield (community string, number of routes) of all values.
+        '''
+        for large, postings in (
+            (False, self.communities), (True, self.large_communities)):
+            for value in sorted(postings):
+                yield (
+                    format_community(large, value),
+                    len(decode_posting(postings[value][1]))
+                )
+
+    def lookup(self, value):
+        '''
+        Return the set of ids of routes carrying the community.
+        '''
+        large, value = parse_community(value)
+        postings = self.large_communities if large else self.communities
+        val = postings.get(value)
+        if val is None:
+            return set()
+        return set(decode_posting(val[1]))
+
+    def match(self, all_of=(), any_of=(), peer=None):
+        '''
+        Return the sorted list of ids of routes carrying all communities
+        of all_of and at least one of any_of.
+        peer restricts routes to a peer given as IP address or
+        (IP address, AS number).
+        '''
+        ids = None
+        for val in sorted((self.lookup(v) for v in all_of), key=len):
+            ids = val if ids is None else ids & val
+            if not ids:
+                return []
+        if any_of:
+            union = set()
+            for value in any_of:
+                union |= self.lookup(value)
+            ids = union if ids is None else ids & union
+        if ids is None:
+            ids = set(range(len(self.route_prefix)))
+        if peer is not None:
+            if isinstance(peer, tuple):
+                peers = set(
+                    i for i, p in enumerate(self.peers)
+                    if p[0] == peer[0] and p[1] == int(peer[1])
+                )
+            else:
+                peers = set(
+                    i for i, p in enumerate(self.peers) if p[0] == peer
+                )
+            ids = [i for i in ids if self.route_peer[i] in peers]
+        return sorted(ids)
+
+    def route(self, i):
+        '''
+        Return (prefix, length, peer_ip, peer_as) of a route id.
+        '''
+        af, n, plen = self.prefixes[self.route_prefix[i]]
+        size = ADDR_LEN[af]
+        addr = struct.pack('>QQ', n >> 64, n & 0xffffffffffffffff)[-size:]
+        prefix = socket.inet_ntop(
+            socket.AF_INET6 if size == 16 else socket.AF_INET, addr
+        )
+        peer_ip, peer_as = self.peers[self.route_peer[i]]
+        return (prefix, plen, peer_ip, peer_as)
+
+    def query(self, all_of=(), any_of=(), peer=None):
+        '''
+        Return the list of (prefix, length, peer_ip, peer_as) matched by
+        match().
+        '''
+        return [self.route(i) for i in self.match(all_of, any_of, peer)]
+
+    def save(self, path):
+        '''
+        Write the index to a file which can be loaded by load().
+        '''
+        peers = json.dumps(self.peers).encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(COMM_INDEX_MAGIC)
+            f.write(COMM_INDEX_HDR.pack(
+                sys.byteorder == 'little', len(peers), len(self.prefixes),
+                len(self.route_prefix), len(self.communities),
+                len(self.large_communities)
+            ))
+            f.write(peers)
+            for af, n, plen in self.prefixes:
+                f.write(COMM_INDEX_PREFIX.pack(
+                    af, n >> 64, n & 0xffffffffffffffff, plen
+                ))
+            f.write(self.route_prefix.tobytes())
+            f.write(self.route_peer.tobytes())
+            for value in sorted(self.communities):
+                buf = self.communities[value][1]
+                f.write(struct.pack('>II', value, len(buf)))
+                f.write(buf)
+            for value in sorted(self.large_communities):
+                buf = self.large_communities[value][1]
+                f.write(struct.pack(
+                    '>QII', value >> 32, value & 0xffffffff, len(buf)
+                ))
+                f.write(buf)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Load the index written by save().
+        Posting lists are kept compressed until they are queried.
+        '''
+        index = cls()
+        with open(path, 'rb') as f:
+            buf = f.read()
+        if buf[:8] != COMM_INDEX_MAGIC:
+            raise MrtFormatError('Invalid community index file %s' % path)
+        p = 8
+        hdr = COMM_INDEX_HDR.unpack(buf[p:p+COMM_INDEX_HDR.size])
+        if hdr[0] != (sys.byteorder == 'little'):
+            raise MrtFormatError('Unsupported byte order of %s' % path)
+        p += COMM_INDEX_HDR.size
+        for peer_ip, peer_as in json.loads(buf[p:p+hdr[1]].decode('utf-8')):
+            af = socket.AF_INET6 if ':' in peer_ip else socket.AF_INET
+            index.peer_ids[(socket.inet_pton(af, peer_ip), peer_as)] = \
+                len(index.peers)
+            index.peers.append((peer_ip, peer_as))
+        p += hdr[1]
+        for _ in range(hdr[2]):
+            af, hi, lo, plen = COMM_INDEX_PREFIX.unpack(
+                buf[p:p+COMM_INDEX_PREFIX.size]
+            )
+            index.prefix_id((af, (hi << 64) | lo, plen))
+            p += COMM_INDEX_PREFIX.size
+        for a in (index.route_prefix, index.route_peer):
+            a.frombytes(buf[p:p+hdr[3]*4])
+            p += hdr[3] * 4
+        for _ in range(hdr[4]):
+            value, n = struct.unpack('>II', buf[p:p+8])
+            p += 8
+            index.communities[value] = [None, buf[p:p+n]]
+            p += n
+        for _ in range(hdr[5]):
+            hi, lo, n = struct.unpack('>QII', buf[p:p+16])
+            p += 16
+            index.large_communities[(hi << 32) | lo] = [None, buf[p:p+n]]
+            p += n
+        return index
@@ -0,0 +1,124 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+
+import io
+import struct
+from .params import *
+from . import Reader
+
+def type_num(value):
+    '''
+    Convert an MRT type name or number to integer.
+    '''
+    if isinstance(value, int):
+        return value
+    if value.isdigit():
+        return int(value)
+    if value not in MRT_T:
+        raise ValueError('Unknown MRT type %s' % value)
+    return MRT_T[value]
+
+def subtype_num(value):
+    '''
+    Convert an MRT subtype name or number to integer.
+    '''
+    if isinstance(value, int):
+        return value
+    if value.isdigit():
+        return int(value)
+    for table in (TD_V2_ST, BGP4MP_ST, TD_ST):
+        if value in table:
+            return table[value]
+    raise ValueError('Unknown MRT subtype %s' % value)
+
+class HeaderFilter:
+    '''
+    Filter of raw records by the fields of MRT header, which does not
+    need the records to be decoded.
+    types and subtypes are lists of names or numbers, and start and end
+    are timestamps (inclusive). None matches anything.
+    '''
+    __slots__ = ['types', 'subtypes', 'start', 'end']
+
+    def __init__(self, types=None, subtypes=None, start=None, end=None):
+        self.types = None if types is None \
+            else set(type_num(t) for t in types)
+        self.subtypes = None if subtypes is None \
+            else set(subtype_num(st) for st in subtypes)
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def from_dict(cls, d):
+        '''
+        Create a filter from a dictionary of a job descriptor, whose keys
+        are "type", "subtype", "start" and "end".
+        '''
+        d = d or {}
+        types = d.get('type')
+        subtypes = d.get('subtype')
+        if types is not None and not isinstance(types, list):
+            types = [types]
+        if subtypes is not None and not isinstance(subtypes, list):
+            subtypes = [subtypes]
+        return cls(types, subtypes, d.get('start'), d.get('end'))
+
+    def __bool__(self):
+        return self.types is not None or self.subtypes is not None \
+            or self.start is not None or self.end is not None
+
+    # Python2 compatibility
+    __nonzero__ = __bool__
+
+    def match(self, buf):
+        '''
+        Check whether a raw record matches the filter.
+        '''
+        ts, t, st = struct.unpack('>IHH', buf[:8])
+        if self.types is not None and t not in self.types:
+            return False
+        if self.subtypes is not None and st not in self.subtypes:
+            return False
+        if self.start is not None and ts < self.start:
+            return False
+        if self.end is not None and ts > self.end:
+            return False
+        return True
+
+def filter_records(reader, header_filter, decode=True):
+    '''
+    Yield records of a Reader with decode=False which match the filter.
+    If decode is True, only the matched records are decoded.
+    Records with errors are yielded as they are.
+    '''
+    for rec in reader:
+        if rec.err or len(rec.buf) < 12:
+            yield rec
+        elif header_filter.match(rec.buf):
+            if decode:
+                try:
+                    rec = next(Reader(io.BytesIO(rec.buf)))
+                except StopIteration:
+                    return
+            yield rec
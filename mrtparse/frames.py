@@ -0,0 +1,424 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import os
+import bz2
+import gzip
+import zlib
+import struct
+import collections
+try:
+    import lzma
+except ImportError:
+    lzma = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+from .params import *
+from .base import MrtFormatError
+
+# Magic Number of compressed files
+GZIP_MAGIC = b'\x1f\x8b'
+BZ2_MAGIC = b'\x42\x5a\x68'
+
+# Magic Number of the frame file
+FRAME_MAGIC = b'MRTFRM02'
+
+# Header of the frame file, (magic, codec)
+FRAME_HDR = struct.Struct('>8sB')
+
+# Entry of the frame table, (offset, compressed length, uncompressed
+# length, number of records, first and last timestamps, offset and
+# compressed length of the PEER_INDEX_TABLE at the start of the frame)
+FRAME_ENTRY = struct.Struct('>QIIIIIQI')
+
+# Trailer of the frame file, (offset of the frame table, number of
+# frames, magic)
+FRAME_TRAILER = struct.Struct('>QI8s')
+
+# Uncompressed size of a frame by default
+FRAME_SIZE = 4 * 1024 * 1024
+
+# Compression codecs
+FRAME_CODEC_T = reverse_defaultdict({
+    1:'zlib',
+    2:'lzma',
+    3:'zstd',   # Available with the zstandard module
+})
+
+Frame = collections.namedtuple(
+    'Frame',
+    [
+        'index', 'offset', 'length', 'size', 'records', 'start', 'end',
+        'peers_offset', 'peers_length'
+    ]
+)
+
+def file_compression(f):
+    '''
+    Return 'frame', 'bz2', 'gzip' or None by the magic number at the
+    start of a file object, whose position is moved back to the start.
+    '''
+    hdr = f.read(max(len(BZ2_MAGIC), len(GZIP_MAGIC), len(FRAME_MAGIC)))
+    f.seek(0)
+    if hdr.startswith(FRAME_MAGIC):
+        return 'frame'
+    elif hdr.startswith(BZ2_MAGIC):
+        return 'bz2'
+    elif hdr.startswith(GZIP_MAGIC):
+        return 'gzip'
+    return None
+
+def open_mrt_file(arg, frames=None):
+    '''
+    Open an MRT file which may be compressed with gzip or bzip2 or written
+    by FrameWriter, and return (file object of the decompressed data, file
+    object of the file). They are the same if it is not compressed.
+    arg is a filepath or a seekable file object, and frames is passed to
+    FrameFile.
+    '''
+    raw = open(arg, 'rb') if isinstance(arg, str) else arg
+    comp = file_compression(raw)
+    if comp != 'frame' and frames is not None:
+        if raw is not arg:
+            raw.close()
+        raise ValueError('%s is not a frame file' % arg)
+    if comp == 'frame':
+        return FrameFile(raw, frames), raw
+    elif comp == 'bz2':
+        return bz2.BZ2File(raw, 'rb'), raw
+    elif comp == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='rb'), raw
+    return raw, raw
+
+def codec_available(codec):
+    '''
+    Check whether a codec name is available.
+    '''
+    if codec == 'zlib':
+        return True
+    elif codec == 'lzma':
+        return lzma is not None
+    elif codec == 'zstd':
+        return zstandard is not None
+    return False
+
+def default_codec():
+    '''
+    Return zstd if it is available, otherwise zlib.
+    '''
+    return 'zstd' if codec_available('zstd') else 'zlib'
+
+def compress(codec, data, level=None):
+    '''
+    Compress data into an independent frame.
+    '''
+    if codec == 'zlib':
+        return zlib.compress(data, 6 if level is None else level)
+    elif codec == 'lzma':
+        return lzma.compress(data, preset=6 if level is None else level)
+    return zstandard.ZstdCompressor(
+        level=3 if level is None else level
+    ).compress(data)
+
+def decompress(codec, data):
+    '''
+    Decompress a frame.
+    '''
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    elif codec == 'lzma':
+        return lzma.decompress(data)
+    return zstandard.ZstdDecompressor().decompress(data)
+
+def read_frame_table(f):
+    '''
+    Read the codec and the frame table of a frame file object.
+    Return (codec name, list of Frame).
+    '''
+    f.seek(0)
+    magic, codec = FRAME_HDR.unpack(f.read(FRAME_HDR.size))
+    if magic != FRAME_MAGIC:
+        raise MrtFormatError('Invalid frame file')
+    f.seek(-FRAME_TRAILER.size, 2)
+    off, n, magic = FRAME_TRAILER.unpack(f.read(FRAME_TRAILER.size))
+    if magic != FRAME_MAGIC:
+        raise MrtFormatError('Frame file has no frame table')
+    f.seek(off)
+    buf = f.read(n * FRAME_ENTRY.size)
+    if len(buf) < n * FRAME_ENTRY.size:
+        raise MrtFormatError('Invalid frame table length')
+    frames = [
+        Frame(i, *FRAME_ENTRY.unpack_from(buf, i * FRAME_ENTRY.size))
+        for i in range(n)
+    ]
+    return (FRAME_CODEC_T[codec], frames)
+
+def frame_table(path):
+    '''
+    Return the list of Frame of a frame file.
+    '''
+    with open(path, 'rb') as f:
+        return read_frame_table(f)[1]
+
+class FrameFile:
+    '''
+    File object which decompresses the frames of a frame file.
+    frames is an iterable of frame indexes to read, or None for all
+    frames, so that any frame can be read without the others.
+    The PEER_INDEX_TABLE at the start of a frame is read before it unless
+    the frame follows the last one read, so that its TABLE_DUMP_V2 RIB
+    records can be decoded.
+    '''
+    __slots__ = ['f', 'codec', 'table', 'frames', 'buf', 'pos', 'last']
+
+    def __init__(self, f, frames=None):
+        self.f = f
+        self.codec, self.table = read_frame_table(f)
+        if not codec_available(self.codec):
+            raise MrtFormatError(
+                'Codec %s of frame file is not available' % self.codec
+            )
+        if frames is None:
+            frames = range(len(self.table))
+        self.frames = iter(frames)
+        self.buf = b''
+        self.pos = 0
+        self.last = -1
+
+    def read(self, n):
+        '''
+        Read n bytes.
+        '''
+        val = []
+        while n > 0:
+            if self.pos >= len(self.buf):
+                i = next(self.frames, None)
+                if i is None:
+                    break
+                if not 0 <= i < len(self.table):
+                    raise MrtFormatError('Invalid frame index %d' % i)
+                frame = self.table[i]
+                self.f.seek(frame.offset)
+                self.buf = decompress(self.codec, self.f.read(frame.length))
+                self.pos = 0
+                if len(self.buf) != frame.size:
+                    raise MrtFormatError(
+                        'Invalid frame length %d != %d byte'
+                        % (len(self.buf), frame.size)
+                    )
+                if frame.peers_length and i != self.last + 1:
+                    self.f.seek(frame.peers_offset)
+                    self.buf = decompress(
+                        self.codec, self.f.read(frame.peers_length)
+                    ) + self.buf
+                self.last = i
+                continue
+            chunk = self.buf[self.pos:self.pos+n]
+            self.pos += len(chunk)
+            n -= len(chunk)
+            val.append(chunk)
+        return b''.join(val)
+
+    def close(self):
+        '''
+        Close file object.
+        '''
+        self.f.close()
+
+class FrameWriter:
+    '''
+    Writer of a frame file, whose frames are independently compressed
+    runs of whole MRT records of about frame_size bytes, followed by the
+    frame table.
+    The last PEER_INDEX_TABLE before each frame is compressed once and
+    referred to by the frame table, so that each frame can be decoded
+    without the others.
+    A filepath is written as "<path>.tmp" and renamed by close(), so that
+    an incomplete frame file is never left at the path.
+    '''
+    __slots__ = [
+        'f', 'path', 'codec', 'level', 'frame_size', 'bufs', 'size',
+        'records', 'start', 'end', 'offset', 'table', 'peers',
+        'frame_peers'
+    ]
+
+    def __init__(self, arg, codec=None, frame_size=FRAME_SIZE, level=None):
+        '''
+        arg is a filepath string or file object.
+        codec is 'zlib', 'lzma' or 'zstd', or None for default_codec().
+        '''
+        if codec is None:
+            codec = default_codec()
+        if not codec_available(codec):
+            raise ValueError('Unsupported codec %s' % codec)
+        self.codec = codec
+        self.level = level
+        self.frame_size = frame_size
+        if hasattr(arg, 'write'):
+            self.path = None
+            self.f = arg
+        else:
+            self.path = arg
+            self.f = open(arg + '.tmp', 'wb')
+        self.f.write(FRAME_HDR.pack(FRAME_MAGIC, FRAME_CODEC_T[codec]))
+        self.offset = FRAME_HDR.size
+        self.table = []
+        self.bufs = []
+        self.size = 0
+        self.records = 0
+        self.start = None
+        self.end = None
+        # [raw PEER_INDEX_TABLE, (offset, compressed length) once written]
+        # of the last one and of the one at the start of the frame
+        self.peers = None
+        self.frame_peers = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, rec):
+        '''
+        Write a record as it is.
+        rec is raw bytes or a Reader instance (its "buf" is written).
+        '''
+        buf = rec.buf if hasattr(rec, 'buf') else rec
+        if len(buf) < 12:
+            raise MrtFormatError(
+                'Invalid MRT header length %d < 12 byte' % len(buf)
+            )
+        ts, t, st = struct.unpack('>IHH', buf[:8])
+        is_peers = t == MRT_T['TABLE_DUMP_V2'] \
+            and st == TD_V2_ST['PEER_INDEX_TABLE']
+        if not self.bufs:
+            self.frame_peers = None if is_peers else self.peers
+        if is_peers:
+            self.peers = [buf, None]
+        if self.start is None or ts < self.start:
+            self.start = ts
+        if self.end is None or ts > self.end:
+            self.end = ts
+        self.bufs.append(buf)
+        self.size += len(buf)
+        self.records += 1
+        if self.size >= self.frame_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Compress and write the buffered records as a frame.
+        '''
+        if not self.bufs:
+            return
+        peers = (0, 0)
+        if self.frame_peers is not None:
+            if self.frame_peers[1] is None:
+                data = compress(self.codec, self.frame_peers[0], self.level)
+                self.f.write(data)
+                self.frame_peers[1] = (self.offset, len(data))
+                self.offset += len(data)
+            peers = self.frame_peers[1]
+        data = compress(self.codec, b''.join(self.bufs), self.level)
+        self.f.write(data)
+        self.table.append(Frame(
+            len(self.table), self.offset, len(data), self.size,
+            self.records, self.start, self.end, *peers
+        ))
+        self.offset += len(data)
+        self.bufs = []
+        self.size = 0
+        self.records = 0
+        self.start = None
+        self.end = None
+
+    def close(self):
+        '''
+        Write the last frame and the frame table, and close file object.
+        '''
+        self.flush()
+        for frame in self.table:
+            self.f.write(FRAME_ENTRY.pack(*frame[1:]))
+        self.f.write(FRAME_TRAILER.pack(
+            self.offset, len(self.table), FRAME_MAGIC
+        ))
+        self.f.close()
+        if self.path is not None:
+            os.rename(self.path + '.tmp', self.path)
+
+    def abort(self):
+        '''
+        Close file object without writing the frame table, so that the
+        frame file is not readable, and remove it if it is a filepath.
+        '''
+        self.f.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path + '.tmp')
+            except OSError:
+                pass
+
+def raw_records(f):
+    '''
+    Yield raw records of an MRT file object.
+    '''
+    while True:
+        hdr = f.read(12)
+        if len(hdr) == 0:
+            return
+        elif len(hdr) < 12:
+            raise MrtFormatError(
+                'Invalid MRT header length %d < 12 byte' % len(hdr)
+            )
+        length = struct.unpack('>I', hdr[8:12])[0]
+        buf = f.read(length)
+        if len(buf) < length:
+            raise MrtFormatError(
+                'Invalid MRT data length %d < %d byte' % (len(buf), length)
+            )
+        yield hdr + buf
+
+def transcode(src, dst, codec=None, frame_size=FRAME_SIZE, level=None):
+    '''
+    Rewrite an MRT file, which may be compressed with gzip or bzip2, into
+    a frame file and return the list of Frame.
+    No frame file is left if the MRT file is invalid.
+    '''
+    with open(src, 'rb') as raw:
+        f, _ = open_mrt_file(raw)
+        with FrameWriter(dst, codec, frame_size, level) as w:
+            try:
+                for buf in raw_records(f):
+                    w.write(buf)
+            except MrtFormatError as e:
+                raise MrtFormatError(
+                    'Invalid record in %s: %s' % (src, e.msg)
+                )
+        f.close()
+    return w.table
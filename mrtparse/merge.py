@@ -0,0 +1,226 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import bz2
+import zlib
+import heapq
+import struct
+import collections
+from .params import *
+from .reader import Reader
+from .frames import file_compression
+
+# Size of raw data read from a file at a time
+CHUNK_SIZE = 64 * 1024
+
+class LazyFile:
+    '''
+    File object which opens the underlying file only while reading.
+    gzip and bzip2 are decompressed incrementally, so the decompression
+    state survives suspend() and the file descriptor is released.
+    '''
+    __slots__ = ['path', 'pos', 'f', 'kind', 'decomp', 'buf', 'off', 'eof']
+
+    def __init__(self, path):
+        self.path = path
+        self.pos = 0
+        self.f = None
+        self.buf = bytearray()
+        self.off = 0
+        self.eof = False
+        with open(path, 'rb') as f:
+            self.kind = file_compression(f)
+        self.decomp = self.new_decomp()
+
+    def new_decomp(self):
+        '''
+        Create a decompressor for the next compressed stream.
+        '''
+        if self.kind == 'bz2':
+            return bz2.BZ2Decompressor()
+        elif self.kind == 'gzip':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return None
+
+    def fill(self):
+        '''
+        Read and decompress the next chunk of the file.
+        '''
+        if self.f is None:
+            self.f = open(self.path, 'rb')
+            self.f.seek(self.pos)
+        chunk = self.f.read(CHUNK_SIZE)
+        self.pos += len(chunk)
+        if not chunk:
+            self.eof = True
+            return
+        if self.decomp is None:
+            self.buf += chunk
+            return
+        while chunk:
+            if self.decomp.eof:
+                # The next of concatenated streams (e.g. multi-member
+                # gzip), which may start at a chunk boundary
+                self.decomp = self.new_decomp()
+            self.buf += self.decomp.decompress(chunk)
+            chunk = self.decomp.unused_data
+
+    def read(self, n):
+        '''
+        Read n bytes of decompressed data.
+        '''
+        while len(self.buf) - self.off < n and not self.eof:
+            if self.off:
+                del self.buf[:self.off]
+                self.off = 0
+            self.fill()
+        val = bytes(self.buf[self.off:self.off+n])
+        self.off += len(val)
+        return val
+
+    def suspend(self):
+        '''
+        Release the file descriptor. It is reopened by the next read().
+        '''
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def close(self):
+        '''
+        Close file object.
+        '''
+        self.suspend()
+        self.eof = True
+
+class MergedRecord:
+    '''
+    Record returned by merge_readers().
+    '''
+    __slots__ = ['data', 'buf', 'err', 'err_msg', 'source']
+
+    def __init__(self, reader, source):
+        self.data = reader.data
+        self.buf = reader.buf
+        self.err = reader.err
+        self.err_msg = reader.err_msg
+        self.source = source
+
+class _Source:
+    '''
+    Input stream of merge_readers() with bounded read-ahead.
+    '''
+    __slots__ = ['source', 'reader', 'f', 'queue', 'key', 'done']
+
+    def __init__(self, source):
+        self.source = source
+        self.reader = None
+        self.f = None
+        self.queue = collections.deque()
+        self.key = (0, 0)
+        self.done = False
+
+    def refill(self, n, decode, opened):
+        '''
+        Read up to n records ahead.
+        '''
+        if self.reader is None:
+            if isinstance(self.source, Reader):
+                self.reader = self.source
+            elif isinstance(self.source, str):
+                self.f = LazyFile(self.source)
+                if self.f.kind == 'frame':
+                    # Frame files are read by Reader, which keeps their
+                    # file descriptors
+                    self.f = None
+                    self.reader = Reader(self.source, decode=decode)
+                else:
+                    self.reader = Reader(self.f, decode=decode)
+            else:
+                self.reader = Reader(self.source, decode=decode)
+        if self.f is not None:
+            opened.pop(id(self), None)
+            opened[id(self)] = self
+        for _ in range(n):
+            try:
+                rec = MergedRecord(next(self.reader), self.source)
+            except StopIteration:
+                self.done = True
+                opened.pop(id(self), None)
+                break
+            self.queue.append(rec)
+
+    def pop(self):
+        '''
+        Return the next record and its sort key.
+        '''
+        rec = self.queue.popleft()
+        if 'timestamp' in rec.data:
+            self.key = (list(rec.data['timestamp'])[0], microsecond(rec))
+        return self.key, rec
+
+def microsecond(rec):
+    '''
+    Return the microsecond timestamp of a BGP4MP_ET record or 0.
+    It is read from the raw record, so it works with decode=False.
+    '''
+    if list(rec.data['type'])[0] != MRT_T['BGP4MP_ET'] \
+        or len(rec.buf) < 16:
+        return 0
+    return struct.unpack('>L', rec.buf[12:16])[0]
+
+def merge_readers(sources, readahead=64, max_open=64, decode=True):
+    '''
+    Merge MRT streams in order of timestamp.
+    "microsecond_timestamp" of BGP4MP_ET is used as a tie-breaker and
+    records with the same timestamp are returned in order of sources.
+    sources is a list of filepath strings, file objects or Reader instances.
+    Filepaths are opened lazily and at most max_open of them hold a file
+    descriptor at a time.
+    Each returned record has "source" which is the element of sources.
+    '''
+    opened = collections.OrderedDict()
+    heap = []
+    srcs = [_Source(source) for source in sources]
+
+    def advance(i):
+        src = srcs[i]
+        if not src.queue and not src.done:
+            src.refill(readahead, decode, opened)
+            while len(opened) > max_open:
+                opened.popitem(last=False)[1].f.suspend()
+        if src.queue:
+            key, rec = src.pop()
+            heapq.heappush(heap, (key, i, rec))
+
+    for i in range(len(srcs)):
+        advance(i)
+
+    while heap:
+        _, i, rec = heapq.heappop(heap)
+        advance(i)
+        yield rec
+
+    for src in srcs:
+        if src.f is not None:
+            src.f.close()
@@ -136,6 +136,20 @@ BGP4MP_ST = reverse_defaultdict({
     11:'BGP4MP_MESSAGE_AS4_LOCAL_ADDPATH', # Defined in RFC8050
 })
 
+# BGP4MP,BGP4MP_ET Subtypes of UPDATE messages received from peers
+BGP4MP_UPDATE_ST = (
+    BGP4MP_ST['BGP4MP_MESSAGE'],
+    BGP4MP_ST['BGP4MP_MESSAGE_AS4'],
+    BGP4MP_ST['BGP4MP_MESSAGE_ADDPATH'],
+    BGP4MP_ST['BGP4MP_MESSAGE_AS4_ADDPATH'],
+)
+
+# BGP4MP,BGP4MP_ET Subtypes of state changes
+BGP4MP_STATE_ST = (
+    BGP4MP_ST['BGP4MP_STATE_CHANGE'],
+    BGP4MP_ST['BGP4MP_STATE_CHANGE_AS4'],
+)
+
 # MRT Message Subtypes
 # Defined in RFC6396
 MRT_ST = collections.defaultdict(lambda: dict(), {
@@ -413,3 +427,101 @@ AS_REPR = reverse_defaultdict({
 # MPLS Label
 LBL_BOTTOM = 0x01        # Defined in RFC3032
 LBL_WITHDRAWN = 0x800000 # Defined in RFC3107
+
+# BMP Version
+# Defined in RFC7854
+BMP_VERSION = 3
+
+# BMP Message Types
+# Defined in RFC7854
+BMP_MSG_T = reverse_defaultdict({
+    0:'Route Monitoring',
+    1:'Statistics Report',
+    2:'Peer Down Notification',
+    3:'Peer Up Notification',
+    4:'Initiation Message',
+    5:'Termination Message',
+    6:'Route Mirroring Message',
+})
+
+# BMP Peer Types
+# Defined in RFC7854
+BMP_PEER_T = reverse_defaultdict({
+    0:'Global Instance Peer',
+    1:'RD Instance Peer',
+    2:'Local Instance Peer',
+})
+
+# BMP Peer Flags
+# Defined in RFC7854
+BMP_PEER_FLAG_V = 0x80  # IPv6 peer address
+BMP_PEER_FLAG_L = 0x40  # Post-policy Adj-RIB-In
+BMP_PEER_FLAG_A = 0x20  # Legacy 2-byte AS_PATH format
+
+# BMP Statistics Types
+# Defined in RFC7854
+BMP_STAT_T = reverse_defaultdict({
+    0:'Rejected Prefixes',
+    1:'Duplicate Prefix Advertisements',
+    2:'Duplicate Withdraws',
+    3:'Updates Invalidated Due to CLUSTER_LIST Loop',
+    4:'Updates Invalidated Due to AS_PATH Loop',
+    5:'Updates Invalidated Due to ORIGINATOR_ID',
+    6:'Updates Invalidated Due to AS_CONFED Loop',
+    7:'Routes in Adj-RIBs-In',
+    8:'Routes in Loc-RIB',
+    9:'Routes in per-AFI/SAFI Adj-RIB-In',
+    10:'Routes in per-AFI/SAFI Loc-RIB',
+    11:'Updates Treated as Withdraw',
+    12:'Prefixes Treated as Withdraw',
+    13:'Duplicate Update Messages',
+})
+
+# BMP Peer Down Reason Codes
+# Defined in RFC7854
+BMP_PEER_DOWN_R = reverse_defaultdict({
+    1:'Local System Closed with NOTIFICATION',
+    2:'Local System Closed without NOTIFICATION',
+    3:'Remote System Closed with NOTIFICATION',
+    4:'Remote System Closed without Data',
+    5:'Peer De-configured',
+})
+
+# BMP Initiation and Peer Up Information TLV Types
+# Defined in RFC7854
+BMP_INFO_T = reverse_defaultdict({
+    0:'String',
+    1:'sysDescr',
+    2:'sysName',
+})
+
+# BMP Termination TLV Types
+# Defined in RFC7854
+BMP_TERM_T = reverse_defaultdict({
+    0:'String',
+    1:'Reason',
+})
+
+# BMP Termination Reason Codes
+# Defined in RFC7854
+BMP_TERM_R = reverse_defaultdict({
+    0:'Administratively Closed',
+    1:'Unspecified Reason',
+    2:'Out of Resources',
+    3:'Redundant Connection',
+    4:'Permanently Administratively Closed',
+})
+
+# BMP Route Mirroring TLV Types
+# Defined in RFC7854
+BMP_MIRROR_T = reverse_defaultdict({
+    0:'BGP Message',
+    1:'Information',
+})
+
+# BMP Route Mirroring Information Codes
+# Defined in RFC7854
+BMP_MIRROR_INFO = reverse_defaultdict({
+    0:'Errored PDU',
+    1:'Messages Lost',
+})
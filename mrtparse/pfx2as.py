@@ -0,0 +1,270 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import io
+import struct
+import multiprocessing
+from .params import *
+from .base import MrtFormatError
+from . import Reader
+from .aspath import origin_as
+from .trie import addr_to_int, int_to_addr
+from .writer import RIB_GENERIC_ST
+from .ribdiff import rib_family
+
+# Size of raw records sent to a worker process at a time
+PFX2AS_CHUNK = 1024 * 1024
+
+# Number of chunks queued for each worker process
+PFX2AS_AHEAD = 4
+
+# Ranges of the first 16 bits of prefixes which are split into shards,
+# i.e. the IPv4 unicast and the IPv6 global unicast address spaces.
+# Prefixes out of the range belong to the first or the last shard.
+PFX2AS_RANGES = {
+    AFI_T['IPv4']: (0x0100, 0xe000),
+    AFI_T['IPv6']: (0x2000, 0x4000),
+}
+
+def prefix_key(prefix, length):
+    '''
+    Convert a prefix to an integer key ordered by AFI, address and length.
+    '''
+    af, n = addr_to_int(prefix)
+    return (af << 136) | (n << 8) | length
+
+def key_prefix(key):
+    '''
+    Convert an integer key to (prefix, length).
+    '''
+    af = key >> 136
+    n = (key >> 8) & ((1 << 128) - 1)
+    return (int_to_addr(af, n), key & 0xff)
+
+def raw_shard(buf, nshards):
+    '''
+    Return the shard number of a raw RIB record, or None if it is not a
+    RIB record. Each shard is a contiguous range of the first 16 bits of
+    the prefixes of each address family.
+    '''
+    t, st = struct.unpack('>HH', buf[4:8])
+    if t == MRT_T['TABLE_DUMP_V2']:
+        family = rib_family(buf, st)
+        if family is None:
+            return None
+        afi = family[0]
+        p = 12 + 8 if st in RIB_GENERIC_ST else 12 + 5
+        n = (bytearray(buf[p-1:p])[0] + 7) // 8
+        head = bytearray(buf[p:p+min(n, 2)])
+    elif t == MRT_T['TABLE_DUMP']:
+        afi = st
+        head = bytearray(buf[16:18])
+    else:
+        return None
+    head += bytearray(2 - len(head))
+    start, end = PFX2AS_RANGES.get(afi, (0, 0x10000))
+    n = max(((head[0] << 8) | head[1]) - start, 0)
+    return min(n * nshards // (end - start), nshards - 1)
+
+class Pfx2As:
+    '''
+    Aggregator of prefix to origin AS from RIB dumps.
+    For each prefix, the number of peers which see each origin is counted.
+    An origin is an AS number or a tuple of AS numbers of AS_SET.
+    '''
+    __slots__ = ['counts']
+
+    def __init__(self):
+        # integer key of prefix -> {origin: number of peers}
+        self.counts = {}
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, rec):
+        '''
+        Add a TABLE_DUMP or TABLE_DUMP_V2 RIB record returned by Reader.
+        '''
+        if rec.err:
+            return
+        m = rec.data
+        t = list(m['type'])[0]
+        if t == MRT_T['TABLE_DUMP']:
+            self.count(
+                prefix_key(m['prefix'], m['length']),
+                [origin_as(m['path_attributes'])]
+            )
+        elif t == MRT_T['TABLE_DUMP_V2'] and 'rib_entries' in m:
+            if 'nlri' in m:
+                if not m['nlri']:
+                    return
+                nlri = m['nlri'][0]
+                key = prefix_key(nlri['prefix'], nlri['length'])
+            else:
+                key = prefix_key(m['prefix'], m['length'])
+            # A peer is counted once per origin even with ADD-PATH
+            seen = set()
+            for entry in m['rib_entries']:
+                origin = origin_as(entry['path_attributes'])
+                seen.add((entry['peer_index'], origin))
+            self.count(key, [origin for _, origin in seen])
+
+    def count(self, key, origins):
+        '''
+        Increment the counts of origins of the prefix.
+        '''
+        val = self.counts.get(key)
+        if val is None:
+            val = self.counts[key] = {}
+        for origin in origins:
+            if origin is not None:
+                val[origin] = val.get(origin, 0) + 1
+
+    def add_reader(self, reader):
+        '''
+        Add all records of reader.
+        '''
+        for rec in reader:
+            self.add(rec)
+
+    def add_file(self, path):
+        '''
+        Add all records of a file.
+        '''
+        self.add_reader(Reader(path))
+
+    def merge(self, other):
+        '''
+        Merge the counts of another Pfx2As.
+        '''
+        for key, origins in other.counts.items():
+            val = self.counts.get(key)
+            if val is None:
+                self.counts[key] = dict(origins)
+                continue
+            for origin, n in origins.items():
+                val[origin] = val.get(origin, 0) + n
+
+    def items(self):
+        '''
+        Yield (prefix, length, [(origin, count), ...]) in order of prefix.
+        Origins are sorted in descending order of count.
+        '''
+        for key in sorted(self.counts):
+            origins = self.counts[key]
+            if not origins:
+                continue
+            prefix, length = key_prefix(key)
+            yield (prefix, length, sorted(
+                origins.items(), key=lambda x: (-x[1], str(x[0]))
+            ))
+
+    def write(self, f, counts=False):
+        '''
+        Write in CAIDA pfx2as format.
+        Multiple origins are joined with '_' and AS_SET with ','.
+        If counts is True, the numbers of peers are added in the same order.
+        '''
+        for prefix, length, origins in self.items():
+            line = '%s\t%d\t%s' % (prefix, length, '_'.join(
+                ','.join(str(asn) for asn in origin)
+                if isinstance(origin, tuple) else str(origin)
+                for origin, _ in origins
+            ))
+            if counts:
+                line += '\t' + '_'.join(str(n) for _, n in origins)
+            f.write(line + '\n')
+
+def _pfx2as_worker(tasks, results):
+    '''
+    Decode and count the chunks of raw records of a shard in a worker
+    process.
+    '''
+    p = Pfx2As()
+    try:
+        while True:
+            chunk = tasks.get()
+            if chunk is None:
+                break
+            p.add_reader(Reader(io.BytesIO(chunk)))
+    except (MrtFormatError, ValueError, KeyError, IndexError, struct.error) \
+        as e:
+        # MrtFormatError has its message only in "msg"
+        msg = e.msg if isinstance(e, MrtFormatError) else e
+        results.put((None, '%s: %s' % (e.__class__.__name__, msg)))
+        return
+    results.put((p.counts, None))
+
+def pfx2as(paths, processes=1):
+    '''
+    Aggregate prefix to origin AS of files.
+    If processes is more than 1, each file is read once and its RIB
+    records are sent without decoding to the worker process of their
+    prefix range, which decodes and counts them.
+    '''
+    result = Pfx2As()
+    if processes <= 1:
+        for path in paths:
+            result.add_file(path)
+        return result
+
+    tasks = [multiprocessing.Queue(PFX2AS_AHEAD) for _ in range(processes)]
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(
+            target=_pfx2as_worker, args=(tasks[shard], results)
+        )
+        for shard in range(processes)
+    ]
+    for proc in procs:
+        proc.daemon = True
+        proc.start()
+    try:
+        chunks = [bytearray() for _ in range(processes)]
+        for path in paths:
+            for m in Reader(path, decode=False):
+                if m.err:
+                    continue
+                shard = raw_shard(m.buf, processes)
+                if shard is None:
+                    continue
+                chunks[shard] += m.buf
+                if len(chunks[shard]) >= PFX2AS_CHUNK:
+                    tasks[shard].put(bytes(chunks[shard]))
+                    del chunks[shard][:]
+        for shard, chunk in enumerate(chunks):
+            if chunk:
+                tasks[shard].put(bytes(chunk))
+            tasks[shard].put(None)
+        # The shards have no prefix in common
+        for _ in procs:
+            counts, err = results.get()
+            if err is not None:
+                raise MrtFormatError(err)
+            result.counts.update(counts)
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
+    return result
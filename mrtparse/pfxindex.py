@@ -0,0 +1,488 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+
+import io
+import os
+import bz2
+import zlib
+import socket
+import struct
+import bisect
+from .params import *
+from .base import MrtFormatError
+from . import Reader
+from .frames import GZIP_MAGIC, BZ2_MAGIC, file_compression
+from .raw import num, prefix_num
+from .writer import RIB_AFI_SPEC_ST
+from .ribfile import RIB_IPV4_ST
+
+# Magic Number of the prefix index file
+PFX_INDEX_MAGIC = b'MRTPIDX1'
+
+# Suffix of the prefix index file stored next to the dump
+PFX_INDEX_SUFFIX = '.pfxidx'
+
+# Every Nth AFI/SAFI-specific RIB record is indexed by default
+PFX_INDEX_INTERVAL = 64
+
+# Header of the prefix index file
+# (compression, size and mtime of the dump, interval, number of
+# checkpoints, number of entries)
+PFX_INDEX_HDR = struct.Struct('>BQdIII')
+
+# Checkpoint, (compressed offset, uncompressed offset)
+PFX_INDEX_CHECKPOINT = struct.Struct('>QQ')
+
+# Entry, (subtype, upper and lower 64 bits of the first prefix, length,
+# uncompressed offset of the record)
+PFX_INDEX_ENTRY = struct.Struct('>HQQBQ')
+
+# Compression of the dump
+PFX_COMP_NONE = 0
+PFX_COMP_GZIP = 1
+PFX_COMP_BZ2 = 2
+
+# Bytes read from the compressed file at once
+PFX_READ_SIZE = 64 * 1024
+
+def compression(path):
+    '''
+    Return the compression of a file.
+    '''
+    with open(path, 'rb') as f:
+        comp = file_compression(f)
+    if comp == 'bz2':
+        return PFX_COMP_BZ2
+    elif comp == 'gzip':
+        return PFX_COMP_GZIP
+    return PFX_COMP_NONE
+
+class CheckpointFile:
+    '''
+    File object which decompresses gzip or bzip2 data and records the
+    start of each gzip member or bzip2 stream as a checkpoint
+    (compressed offset, uncompressed offset), where decompression can
+    be restarted.
+    "pos" is the uncompressed offset of the next byte read.
+    '''
+    __slots__ = ['raw', 'comp', 'dec', 'buf', 'bpos', 'pos', 'checkpoints']
+
+    def __init__(self, raw, comp, checkpoints=None):
+        self.raw = raw
+        self.comp = comp
+        self.dec = self.decompressor()
+        self.buf = b''
+        self.bpos = 0
+        self.pos = 0
+        self.checkpoints = [(0, 0)] if checkpoints is None else checkpoints
+
+    def decompressor(self):
+        '''
+        Return a new decompressor, or None for uncompressed data.
+        '''
+        if self.comp == PFX_COMP_GZIP:
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.comp == PFX_COMP_BZ2:
+            return bz2.BZ2Decompressor()
+        return None
+
+    def fill(self):
+        '''
+        Decompress the next data into the buffer.
+        Return False at the end of file.
+        '''
+        while True:
+            if self.dec is None:
+                data = self.raw.read(PFX_READ_SIZE)
+            elif self.dec.eof:
+                data = self.dec.unused_data
+                start = self.raw.tell() - len(data)
+                if not data:
+                    data = self.raw.read(PFX_READ_SIZE)
+                magic = BZ2_MAGIC if self.comp == PFX_COMP_BZ2 \
+                    else GZIP_MAGIC
+                # Trailing bytes which are not the next member are ignored
+                if not data.startswith(magic):
+                    return False
+                if start > self.checkpoints[-1][0]:
+                    self.checkpoints.append((start, self.pos))
+                self.dec = self.decompressor()
+            else:
+                data = self.raw.read(PFX_READ_SIZE)
+            if not data:
+                return False
+            self.buf = data if self.dec is None \
+                else self.dec.decompress(data)
+            self.bpos = 0
+            if self.buf:
+                return True
+
+    def read(self, n):
+        '''
+        Read n bytes.
+        '''
+        val = []
+        while n > 0:
+            if self.bpos >= len(self.buf) and not self.fill():
+                break
+            chunk = self.buf[self.bpos:self.bpos+n]
+            self.bpos += len(chunk)
+            self.pos += len(chunk)
+            n -= len(chunk)
+            val.append(chunk)
+        return b''.join(val)
+
+    def seek(self, offset):
+        '''
+        Move to an uncompressed offset, restarting decompression from
+        the last checkpoint before it unless it is ahead of the current
+        position after that checkpoint.
+        '''
+        if self.dec is None:
+            self.raw.seek(offset)
+            self.buf = b''
+            self.bpos = 0
+            self.pos = offset
+            return
+        i = bisect.bisect_right(
+            [out for _, out in self.checkpoints], offset
+        ) - 1
+        start, out = self.checkpoints[i]
+        if not out <= self.pos <= offset:
+            self.raw.seek(start)
+            self.dec = self.decompressor()
+            self.buf = b''
+            self.bpos = 0
+            self.pos = out
+        while self.pos < offset:
+            if self.bpos >= len(self.buf) and not self.fill():
+                break
+            n = min(len(self.buf) - self.bpos, offset - self.pos)
+            self.bpos += n
+            self.pos += n
+
+    def tell(self):
+        '''
+        Return the uncompressed offset.
+        '''
+        return self.pos
+
+    def close(self):
+        '''
+        Close file object.
+        '''
+        self.raw.close()
+
+def parse_prefix(prefix):
+    '''
+    Convert "prefix/length" or (prefix, length) to
+    (AFI, prefix as integer, length).
+    '''
+    if isinstance(prefix, tuple):
+        addr, plen = prefix
+    else:
+        addr, _, plen = prefix.partition('/')
+    if ':' in addr:
+        af = AFI_T['IPv6']
+        val = socket.inet_pton(socket.AF_INET6, addr)
+    else:
+        af = AFI_T['IPv4']
+        val = socket.inet_pton(socket.AF_INET, addr)
+    return (af, num(val, 0, len(val)), int(plen))
+
+def rib_afi(st):
+    '''
+    Return AFI of an AFI/SAFI-specific RIB subtype.
+    '''
+    return AFI_T['IPv4'] if st in RIB_IPV4_ST else AFI_T['IPv6']
+
+class PrefixIndex:
+    '''
+    Sparse index of AFI/SAFI-specific RIB records of a TABLE_DUMP_V2
+    dump, which has the first prefix and the offset of every Nth record
+    and of the first record of each subtype.
+    For compressed dumps, the offsets are uncompressed ones and the
+    start of each gzip member or bzip2 stream is a checkpoint.
+    lookup() searches the entries and decodes only the records between
+    two entries.
+    '''
+    __slots__ = [
+        'path', 'comp', 'size', 'mtime', 'interval', 'checkpoints',
+        'entries', 'f', 'last'
+    ]
+
+    def __init__(self, path, interval=PFX_INDEX_INTERVAL):
+        self.path = path
+        self.comp = compression(path)
+        st = os.stat(path)
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.interval = interval
+        self.checkpoints = [(0, 0)]
+        # subtype -> ([(prefix as integer, length)], [offset])
+        self.entries = {}
+        # Opened dump and the last region read by lookup()
+        self.f = None
+        self.last = None
+
+    def __len__(self):
+        return sum(len(offsets) for _, offsets in self.entries.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @classmethod
+    def build(cls, path, interval=PFX_INDEX_INTERVAL):
+        '''
+        Build the index of a dump in one pass.
+        Only the indexed records are decoded.
+        '''
+        index = cls(path, interval)
+        f = CheckpointFile(open(path, 'rb'), index.comp)
+        reader = Reader(f, decode=False)
+        count = 0
+        last = None
+        while True:
+            offset = f.pos
+            try:
+                rec = next(reader)
+            except StopIteration:
+                break
+            if rec.err:
+                f.close()
+                raise MrtFormatError(
+                    'Invalid record at offset %d: %s' % (offset, rec.err_msg)
+                )
+            t, st = struct.unpack('>HH', rec.buf[4:8])
+            if t != MRT_T['TABLE_DUMP_V2'] or st not in RIB_AFI_SPEC_ST:
+                continue
+            if count % interval == 0 or st != last:
+                data = next(Reader(io.BytesIO(rec.buf))).data
+                index.add(st, data['prefix'], data['length'], offset)
+            count += 1
+            last = st
+        index.checkpoints = f.checkpoints
+        return index
+
+    def add(self, st, prefix, plen, offset):
+        '''
+        Add an entry of a record at offset whose first prefix is
+        prefix/plen.
+        '''
+        _, n, plen = parse_prefix((prefix, plen))
+        keys, offsets = self.entries.setdefault(st, ([], []))
+        if keys and keys[-1] >= (n, plen):
+            raise MrtFormatError(
+                'RIB records of subtype %d are not sorted by prefix' % st
+            )
+        keys.append((n, plen))
+        offsets.append(offset)
+
+    @classmethod
+    def open(cls, path, interval=PFX_INDEX_INTERVAL, rebuild=False):
+        '''
+        Load the index stored next to the dump, or build and store it if
+        it does not exist or the dump has been modified.
+        '''
+        idx_path = path + PFX_INDEX_SUFFIX
+        if not rebuild and os.path.exists(idx_path):
+            index = cls.load(path)
+            if (index.comp, index.size, index.mtime, index.interval) == (
+                compression(path), os.path.getsize(path),
+                os.path.getmtime(path), interval):
+                return index
+        index = cls.build(path, interval)
+        index.save()
+        return index
+
+    def save(self, idx_path=None):
+        '''
+        Write the index next to the dump or to idx_path.
+        '''
+        if idx_path is None:
+            idx_path = self.path + PFX_INDEX_SUFFIX
+        entries = []
+        for st in sorted(self.entries):
+            keys, offsets = self.entries[st]
+            for (n, plen), offset in zip(keys, offsets):
+                entries.append(PFX_INDEX_ENTRY.pack(
+                    st, n >> 64, n & 0xffffffffffffffff, plen, offset
+                ))
+        with open(idx_path, 'wb') as f:
+            f.write(PFX_INDEX_MAGIC)
+            f.write(PFX_INDEX_HDR.pack(
+                self.comp, self.size, self.mtime, self.interval,
+                len(self.checkpoints), len(entries)
+            ))
+            for checkpoint in self.checkpoints:
+                f.write(PFX_INDEX_CHECKPOINT.pack(*checkpoint))
+            f.write(b''.join(entries))
+
+    @classmethod
+    def load(cls, path, idx_path=None):
+        '''
+        Load the index of a dump written by save().
+        '''
+        if idx_path is None:
+            idx_path = path + PFX_INDEX_SUFFIX
+        with open(idx_path, 'rb') as f:
+            buf = f.read()
+        if buf[:8] != PFX_INDEX_MAGIC:
+            raise MrtFormatError('Invalid prefix index file %s' % idx_path)
+        p = 8
+        comp, size, mtime, interval, n_checkpoints, n_entries = \
+            PFX_INDEX_HDR.unpack(buf[p:p+PFX_INDEX_HDR.size])
+        p += PFX_INDEX_HDR.size
+        index = cls(path, interval)
+        # The compression, size and mtime of the dump when it was indexed
+        index.comp = comp
+        index.size = size
+        index.mtime = mtime
+        index.checkpoints = []
+        for _ in range(n_checkpoints):
+            index.checkpoints.append(PFX_INDEX_CHECKPOINT.unpack(
+                buf[p:p+PFX_INDEX_CHECKPOINT.size]
+            ))
+            p += PFX_INDEX_CHECKPOINT.size
+        for _ in range(n_entries):
+            st, hi, lo, plen, offset = PFX_INDEX_ENTRY.unpack(
+                buf[p:p+PFX_INDEX_ENTRY.size]
+            )
+            keys, offsets = index.entries.setdefault(st, ([], []))
+            keys.append(((hi << 64) | lo, plen))
+            offsets.append(offset)
+            p += PFX_INDEX_ENTRY.size
+        return index
+
+    def close(self):
+        '''
+        Close the dump opened by lookup().
+        '''
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+        self.last = None
+
+    def subtypes(self, af):
+        '''
+        Return the indexed subtypes of AFI in order of the subtype.
+        '''
+        return [st for st in sorted(self.entries) if rib_afi(st) == af]
+
+    def region(self, st, key):
+        '''
+        Return (start, end) offsets of the records from the indexed
+        record which may be followed by the record of key to the next
+        indexed record, or None.
+        end is None after the last indexed record of the subtype.
+        '''
+        keys, offsets = self.entries.get(st, ((), ()))
+        i = bisect.bisect_right(keys, key)
+        if i == 0:
+            return None
+        return (offsets[i-1], offsets[i] if i < len(offsets) else None)
+
+    def read_region(self, st, start, end):
+        '''
+        Return the list of (key, raw record) of subtype st from start to
+        end. The last region read is cached.
+        '''
+        if self.last is not None and self.last[0] == (st, start):
+            return self.last[1]
+        if self.f is None:
+            self.f = CheckpointFile(
+                open(self.path, 'rb'), self.comp, self.checkpoints
+            )
+        self.f.seek(start)
+        af = rib_afi(st)
+        records = []
+        while end is None or self.f.pos < end:
+            hdr = self.f.read(12)
+            if len(hdr) < 12:
+                break
+            t, rec_st, length = struct.unpack('>HHI', hdr[4:12])
+            if t != MRT_T['TABLE_DUMP_V2'] or rec_st != st:
+                break
+            buf = hdr + self.f.read(length)
+            plen = num(buf, 16, 1)
+            records.append(((prefix_num(buf, 17, plen, af), plen), buf))
+        self.last = ((st, start), records)
+        return records
+
+    def find(self, st, key):
+        '''
+        Decode and return the record of subtype st and key, or None.
+        '''
+        region = self.region(st, key)
+        if region is None:
+            return None
+        for rec_key, buf in self.read_region(st, *region):
+            if rec_key == key:
+                return next(Reader(io.BytesIO(buf))).data
+            elif rec_key > key:
+                break
+        return None
+
+    def lookup(self, prefix, subtype=None):
+        '''
+        Return the decoded record of a prefix given as "prefix/length" or
+        (prefix, length), or None.
+        If subtype is None, the subtypes of the address family are
+        searched in order.
+        '''
+        af, n, plen = parse_prefix(prefix)
+        sts = self.subtypes(af) if subtype is None else [subtype]
+        for st in sts:
+            data = self.find(st, (n, plen))
+            if data is not None:
+                return data
+        return None
+
+    def lookup_many(self, prefixes, subtype=None):
+        '''
+        Return the list of the results of lookup() of prefixes.
+        The subtypes are searched one by one in the same order as
+        lookup(), and the prefixes in order of the offsets in the dump,
+        so compressed data is decompressed forward as far as possible.
+        '''
+        keys = [parse_prefix(prefix) for prefix in prefixes]
+        val = [None] * len(keys)
+        left = list(range(len(keys)))
+        for st in sorted(self.entries) if subtype is None else [subtype]:
+            order = []
+            for i in left:
+                af, n, plen = keys[i]
+                if subtype is None and rib_afi(st) != af:
+                    continue
+                region = self.region(st, (n, plen))
+                if region is not None:
+                    order.append((region[0], i))
+            for _, i in sorted(order):
+                _, n, plen = keys[i]
+                val[i] = self.find(st, (n, plen))
+            left = [i for i in left if val[i] is None]
+        return val
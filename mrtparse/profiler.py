@@ -0,0 +1,157 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import time
+import threading
+from .base import _Base, Nlri
+try:
+    timer = time.perf_counter
+except AttributeError:
+    timer = time.time
+
+# Counters of the Reader being iterated in each thread as "stats"
+_active = threading.local()
+
+# ids of the counters of Readers with profile=True and the original
+# methods
+_installed = {'readers': set(), 'methods': []}
+_lock = threading.Lock()
+
+def count(stats, key, n, elapsed):
+    '''
+    Add a call to the counters.
+    '''
+    val = stats.get(key)
+    if val is None:
+        stats[key] = [1, n, elapsed]
+    else:
+        val[0] += 1
+        val[1] += n
+        val[2] += elapsed
+
+def wrap(func, key, add_path=False):
+    '''
+    Return func counting calls, bytes consumed and elapsed time.
+    If add_path is True, calls with path identifiers are counted
+    separately, which shows the fallback of val_nlri().
+    '''
+    add_path_key = key + '(add_path)'
+    def wrapper(self, *args, **kwargs):
+        stats = getattr(_active, 'stats', None)
+        if stats is None:
+            return func(self, *args, **kwargs)
+        p = self.p
+        start = timer()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            if add_path and (kwargs.get('add_path')
+                or (len(args) > 2 and args[2])):
+                k = add_path_key
+            else:
+                k = key
+            count(stats, k, (self.p or 0) - (p or 0), timer() - start)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+def wrap_reader(func):
+    '''
+    Return Reader.read_record counting records and their bytes.
+    '''
+    def wrapper(self):
+        stats = getattr(_active, 'stats', None)
+        if stats is None:
+            return func(self)
+        start = timer()
+        try:
+            return func(self)
+        finally:
+            count(stats, 'Reader.read_record', len(self.buf or b''),
+                timer() - start)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+def install(reader_cls, classes, stats):
+    '''
+    Replace the unpack methods of the decoder classes, val_nlri() and
+    Reader.read_record with the counting ones.
+    The methods are replaced only while a Reader with profile=True
+    is not exhausted or closed, so that there is no cost otherwise.
+    '''
+    with _lock:
+        readers = _installed['readers']
+        readers.add(id(stats))
+        if len(readers) > 1:
+            return
+        methods = []
+        for cls in classes:
+            for name, func in list(cls.__dict__.items()):
+                if name.startswith('unpack') and callable(func):
+                    methods.append((cls, name, func, wrap(
+                        func, cls.__name__ + '.' + name,
+                        cls is Nlri and name == 'unpack'
+                    )))
+        func = _Base.__dict__['val_nlri']
+        methods.append((_Base, 'val_nlri', func, wrap(func, 'val_nlri')))
+        func = reader_cls.__dict__['read_record']
+        methods.append((reader_cls, 'read_record', func, wrap_reader(func)))
+        for cls, name, _, wrapper in methods:
+            setattr(cls, name, wrapper)
+        _installed['methods'] = methods
+
+def uninstall(stats):
+    '''
+    Restore the original methods when no Reader with profile=True
+    remains.
+    '''
+    with _lock:
+        readers = _installed['readers']
+        if id(stats) not in readers:
+            return
+        readers.remove(id(stats))
+        if readers:
+            return
+        for cls, name, func, _ in _installed['methods']:
+            setattr(cls, name, func)
+        _installed['methods'] = []
+
+def activate(stats):
+    '''
+    Set the counters of the Reader being iterated in the current thread
+    and return the previous ones.
+    '''
+    prev = getattr(_active, 'stats', None)
+    _active.stats = stats
+    return prev
+
+def summary(stats):
+    '''
+    Convert the counters to {decoder: {'calls', 'bytes', 'time'}}.
+    Time is cumulative and includes the nested decoders.
+    '''
+    return dict(
+        (key, {'calls': val[0], 'bytes': val[1], 'time': val[2]})
+        for key, val in stats.items()
+    )
@@ -0,0 +1,116 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import os
+import time
+try:
+    timer = time.monotonic
+except AttributeError:
+    timer = time.time
+
+class Progress:
+    '''
+    Progress of reading a file.
+    "raw" is the file object of the compressed data, whose position is
+    the number of compressed bytes consumed.
+    '''
+    __slots__ = [
+        'raw', 'total', 'records', 'bytes', 'start', 'last', 'interval',
+        'callback', 'done'
+    ]
+
+    def __init__(self, raw, callback=None, interval=1.0):
+        '''
+        callback is called with the dictionary returned by snapshot()
+        every interval seconds and at the end of the file.
+        '''
+        self.raw = raw
+        try:
+            self.total = os.fstat(raw.fileno()).st_size
+        except (AttributeError, OSError, ValueError, IOError):
+            self.total = None
+        self.records = 0
+        self.bytes = 0
+        self.start = timer()
+        self.last = self.start
+        self.interval = interval
+        self.callback = callback
+        self.done = False
+
+    def update(self, n):
+        '''
+        Count a record of n bytes.
+        '''
+        self.records += 1
+        self.bytes += n
+        if self.callback is not None:
+            now = timer()
+            if now - self.last >= self.interval:
+                self.last = now
+                self.callback(self.snapshot())
+
+    def finish(self):
+        '''
+        Call the callback at the end of the file.
+        '''
+        if self.done:
+            return
+        self.done = True
+        if self.callback is not None:
+            self.callback(self.snapshot())
+
+    def position(self):
+        '''
+        Return the number of compressed bytes consumed, or None.
+        '''
+        try:
+            return self.raw.tell()
+        except (AttributeError, OSError, ValueError, IOError):
+            return None
+
+    def snapshot(self):
+        '''
+        Return the progress as a dictionary.
+        The compressed bytes are counted from the underlying file, so they
+        include the data buffered by the decompressor.
+        '''
+        elapsed = timer() - self.start
+        pos = self.total if self.done else self.position()
+        val = {
+            'records': self.records,
+            'bytes': self.bytes,
+            'compressed_bytes': pos,
+            'compressed_total': self.total,
+            'elapsed': elapsed,
+            'records_per_sec': self.records / elapsed if elapsed else 0.0,
+            'bytes_per_sec': self.bytes / elapsed if elapsed else 0.0,
+            'ratio': None,
+            'eta': None,
+        }
+        if pos is not None and self.total:
+            val['ratio'] = min(1.0, float(pos) / self.total)
+            if self.done:
+                val['eta'] = 0.0
+            elif pos:
+                val['eta'] = elapsed * (self.total - pos) / pos
+        return val
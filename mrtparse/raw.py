@@ -0,0 +1,332 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import struct
+import socket
+from .params import *
+from .base import MrtFormatError
+from .aspath import as_num
+from .writer import RIB_AFI_SPEC_ST, RIB_GENERIC_ST, RIB_ADDPATH_ST
+
+# BGP4MP subtypes with 4-octet AS numbers
+BGP4MP_AS4_ST = (
+    BGP4MP_ST['BGP4MP_MESSAGE_AS4'],
+    BGP4MP_ST['BGP4MP_MESSAGE_AS4_LOCAL'],
+    BGP4MP_ST['BGP4MP_MESSAGE_AS4_ADDPATH'],
+    BGP4MP_ST['BGP4MP_MESSAGE_AS4_LOCAL_ADDPATH'],
+)
+
+# BGP4MP subtypes with ADD-PATH
+BGP4MP_ADDPATH_ST = (
+    BGP4MP_ST['BGP4MP_MESSAGE_ADDPATH'],
+    BGP4MP_ST['BGP4MP_MESSAGE_AS4_ADDPATH'],
+    BGP4MP_ST['BGP4MP_MESSAGE_LOCAL_ADDPATH'],
+    BGP4MP_ST['BGP4MP_MESSAGE_AS4_LOCAL_ADDPATH'],
+)
+
+# BGP4MP subtypes of messages received from peers
+BGP4MP_RECV_ST = (
+    BGP4MP_ST['BGP4MP_MESSAGE'],
+    BGP4MP_ST['BGP4MP_MESSAGE_AS4'],
+    BGP4MP_ST['BGP4MP_MESSAGE_ADDPATH'],
+    BGP4MP_ST['BGP4MP_MESSAGE_AS4_ADDPATH'],
+)
+
+ADDR_LEN = {AFI_T['IPv4']: 4, AFI_T['IPv6']: 16}
+
+def num(buf, p, n):
+    '''
+    Convert n bytes of buffers at p to integer.
+    '''
+    val = 0
+    for i in bytearray(buf[p:p+n]):
+        val = (val << 8) + i
+    return val
+
+def prefix_num(buf, p, plen, af):
+    '''
+    Convert a prefix of plen bits at p to integer.
+    '''
+    n = (plen + 7) // 8
+    return num(buf, p, n) << (8 * (ADDR_LEN[af] - n))
+
+def iter_attrs(buf, p, end):
+    '''
+    Yield (type, start, end) of path attributes between p and end.
+    '''
+    while p < end:
+        flag = num(buf, p, 1)
+        t = num(buf, p + 1, 1)
+        if flag & 0x10:
+            n = num(buf, p + 2, 2)
+            p += 4
+        else:
+            n = num(buf, p + 2, 1)
+            p += 3
+        if p + n > end:
+            raise MrtFormatError(
+                'Invalid attribute length %d > %d byte' % (n, end - p)
+            )
+        yield (t, p, p + n)
+        p += n
+
+def as_path(buf, p, end, as_size):
+    '''
+    Convert AS_PATH/AS4_PATH to a list of (type, [AS numbers]).
+    '''
+    segs = []
+    while p < end:
+        t = num(buf, p, 1)
+        n = num(buf, p + 1, 1)
+        p += 2
+        segs.append((t, [num(buf, p + i, as_size)
+            for i in range(0, n * as_size, as_size)]))
+        p += n * as_size
+    return segs
+
+def nlri(buf, p, end, af, add_path=False):
+    '''
+    Convert NLRI to a list of (AFI, prefix as integer, length).
+    Like Base.val_nlri(), NLRI is decoded with path identifiers if it is
+    invalid or has duplicate routes without them.
+    '''
+    if not add_path:
+        try:
+            val = nlri_list(buf, p, end, af, False)
+            if len(val) == len(set(val)):
+                return val
+        except MrtFormatError:
+            pass
+    return nlri_list(buf, p, end, af, True)
+
+def nlri_list(buf, p, end, af, add_path):
+    '''
+    Decoder for NLRI with or without path identifiers.
+    '''
+    val = []
+    while p < end:
+        if add_path:
+            p += 4
+        plen = num(buf, p, 1)
+        n = (plen + 7) // 8
+        if plen > ADDR_LEN[af] * 8 or p + 1 + n > end:
+            raise MrtFormatError(
+                'Invalid prefix length %d (%s)' % (plen, AFI_T[af])
+            )
+        val.append((af, prefix_num(buf, p + 1, plen, af), plen))
+        p += 1 + n
+    return val
+
+def index_peers(data):
+    '''
+    Convert decoded PEER_INDEX_TABLE to the list of (peer_ip, peer_as)
+    where peer_ip is packed bytes and peer_as is integer.
+    '''
+    peers = []
+    for peer in data['peer_entries']:
+        af = socket.AF_INET6 if ':' in peer['peer_ip'] else socket.AF_INET
+        peers.append(
+            (socket.inet_pton(af, peer['peer_ip']), as_num(peer['peer_as']))
+        )
+    return peers
+
+class RawRoute:
+    '''
+    Routes of a RIB entry or an UPDATE message in a raw record.
+    "attrs" is (start, end) of path attributes in "buf".
+    "path_id" is the path identifier of a RIB entry with ADD-PATH.
+    '''
+    __slots__ = [
+        'action', 'peer', 'prefixes', 'buf', 'attrs', 'as_size', 'add_path',
+        'path_id'
+    ]
+
+    def __init__(self, action, peer, prefixes, buf, attrs, as_size,
+        add_path=False, path_id=None):
+        self.action = action
+        self.peer = peer
+        self.prefixes = prefixes
+        self.buf = buf
+        self.attrs = attrs
+        self.as_size = as_size
+        self.add_path = add_path
+        self.path_id = path_id
+
+    def iter_attrs(self):
+        '''
+        Yield (type, start, end) of path attributes.
+        '''
+        return iter_attrs(self.buf, self.attrs[0], self.attrs[1])
+
+def raw_routes(buf, peers):
+    '''
+    Yield RawRoute of a raw MRT record.
+    peers is the list returned by index_peers() for the last
+    PEER_INDEX_TABLE.
+    PEER_INDEX_TABLE itself and unsupported records yield nothing.
+    '''
+    _, t, st, length = struct.unpack('>IHHI', buf[:12])
+    if len(buf) < 12 + length:
+        raise MrtFormatError(
+            'Invalid MRT data length %d < %d byte' % (len(buf) - 12, length)
+        )
+    if t == MRT_T['TABLE_DUMP_V2']:
+        return td_v2_routes(buf, st, peers)
+    elif t == MRT_T['BGP4MP'] or t == MRT_T['BGP4MP_ET']:
+        return bgp4mp_routes(buf, st, 16 if t == MRT_T['BGP4MP_ET'] else 12)
+    elif t == MRT_T['TABLE_DUMP']:
+        return td_routes(buf, st)
+    return iter(())
+
+def state_change(buf):
+    '''
+    Return (peer, old state, new state) of a raw BGP4MP STATE_CHANGE
+    record, or None if it is not STATE_CHANGE.
+    '''
+    t, st = struct.unpack('>HH', buf[4:8])
+    if t == MRT_T['BGP4MP']:
+        p = 12
+    elif t == MRT_T['BGP4MP_ET']:
+        p = 16
+    else:
+        return None
+    if st == BGP4MP_ST['BGP4MP_STATE_CHANGE']:
+        as_size = 2
+    elif st == BGP4MP_ST['BGP4MP_STATE_CHANGE_AS4']:
+        as_size = 4
+    else:
+        return None
+    peer_as = num(buf, p, as_size)
+    p += as_size * 2 + 2
+    n = ADDR_LEN.get(num(buf, p, 2))
+    if n is None:
+        return None
+    peer = (buf[p+2:p+2+n], peer_as)
+    p += 2 + n * 2
+    return (peer, num(buf, p, 2), num(buf, p + 2, 2))
+
+def td_routes(buf, st):
+    '''
+    Yield RawRoute of TABLE_DUMP.
+    '''
+    n = ADDR_LEN[st]
+    p = 12 + 4
+    prefix = (st, prefix_num(buf, p, n * 8, st), num(buf, p + n, 1))
+    p += n + 6
+    peer_ip = buf[p:p+n]
+    p += n
+    peer = (peer_ip, num(buf, p, 2))
+    attr_len = num(buf, p + 2, 2)
+    yield RawRoute(
+        'A', peer, [prefix], buf, (p + 4, p + 4 + attr_len), 2
+    )
+
+def td_v2_routes(buf, st, peers):
+    '''
+    Yield RawRoute of each RIB entry of TABLE_DUMP_V2.
+    '''
+    p = 12 + 4
+    if st in RIB_AFI_SPEC_ST:
+        if st in (TD_V2_ST['RIB_IPV4_UNICAST'],
+            TD_V2_ST['RIB_IPV4_MULTICAST'],
+            TD_V2_ST['RIB_IPV4_UNICAST_ADDPATH'],
+            TD_V2_ST['RIB_IPV4_MULTICAST_ADDPATH']):
+            af = AFI_T['IPv4']
+        else:
+            af = AFI_T['IPv6']
+    elif st in RIB_GENERIC_ST:
+        af = num(buf, p, 2)
+        safi = num(buf, p + 2, 1)
+        p += 3
+        if af not in ADDR_LEN or (safi != SAFI_T['UNICAST']
+            and safi != SAFI_T['MULTICAST']):
+            return
+    else:
+        return
+    plen = num(buf, p, 1)
+    prefix = (af, prefix_num(buf, p + 1, plen, af), plen)
+    p += 1 + (plen + 7) // 8
+    count = num(buf, p, 2)
+    p += 2
+    add_path = st in RIB_ADDPATH_ST
+    for _ in range(count):
+        peer = peers[num(buf, p, 2)]
+        path_id = num(buf, p + 6, 4) if add_path else None
+        p += 6 + (4 if add_path else 0)
+        attr_len = num(buf, p, 2)
+        p += 2
+        yield RawRoute(
+            'A', peer, [prefix], buf, (p, p + attr_len), 4, path_id=path_id
+        )
+        p += attr_len
+
+def bgp4mp_routes(buf, st, p):
+    '''
+    Yield RawRoute of withdrawn routes and announced routes of UPDATE.
+    '''
+    if st not in BGP4MP_RECV_ST:
+        return
+    as_size = 4 if st in BGP4MP_AS4_ST else 2
+    add_path = st in BGP4MP_ADDPATH_ST
+    peer_as = num(buf, p, as_size)
+    p += as_size * 2 + 2
+    af = num(buf, p, 2)
+    n = ADDR_LEN.get(af)
+    if n is None:
+        return
+    peer = (buf[p+2:p+2+n], peer_as)
+    p += 2 + n * 2
+
+    # BGP message header
+    end = p + num(buf, p + 16, 2)
+    if num(buf, p + 18, 1) != BGP_MSG_T['UPDATE']:
+        return
+    p += 19
+    wd_len = num(buf, p, 2)
+    withdrawn = nlri(buf, p + 2, p + 2 + wd_len, AFI_T['IPv4'], add_path)
+    p += 2 + wd_len
+    attr_len = num(buf, p, 2)
+    attrs = (p + 2, p + 2 + attr_len)
+    announced = nlri(buf, attrs[1], end, AFI_T['IPv4'], add_path)
+
+    for t, start, stop in iter_attrs(buf, attrs[0], attrs[1]):
+        if t == BGP_ATTR_T['MP_REACH_NLRI']:
+            mp_af = num(buf, start, 2)
+            safi = num(buf, start + 2, 1)
+            if mp_af not in ADDR_LEN or (safi != SAFI_T['UNICAST']
+                and safi != SAFI_T['MULTICAST']):
+                continue
+            q = start + 4 + num(buf, start + 3, 1) + 1
+            announced += nlri(buf, q, stop, mp_af, add_path)
+        elif t == BGP_ATTR_T['MP_UNREACH_NLRI']:
+            mp_af = num(buf, start, 2)
+            safi = num(buf, start + 2, 1)
+            if mp_af not in ADDR_LEN or (safi != SAFI_T['UNICAST']
+                and safi != SAFI_T['MULTICAST']):
+                continue
+            withdrawn += nlri(buf, start + 3, stop, mp_af, add_path)
+
+    if withdrawn:
+        yield RawRoute('W', peer, withdrawn, buf, (0, 0), as_size, add_path)
+    if announced:
+        yield RawRoute('A', peer, announced, buf, attrs, as_size, add_path)
@@ -0,0 +1,123 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Bytes decompressed at a time by the background thread
+READAHEAD_BLOCK = 256 * 1024
+
+def put(q, stop, item):
+    '''
+    Put an item into the queue unless stop is set.
+    '''
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+def read_blocks(f, q, stop, block_size):
+    '''
+    Put decompressed blocks of f into the queue until the end of file.
+    An exception of f is passed to the reading thread, so that it never
+    waits for a thread which has died.
+    It does not refer to ReadaheadFile, so that an abandoned one is
+    collected and stops the thread.
+    '''
+    try:
+        while not stop.is_set():
+            data = f.read(block_size)
+            put(q, stop, data)
+            if not data:
+                break
+    # f may be any file object with its own errors, so every Exception is
+    # passed on purpose, but not KeyboardInterrupt or SystemExit
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        put(q, stop, e)
+
+class ReadaheadFile:
+    '''
+    File object which reads and decompresses a file in a background
+    thread and passes decompressed blocks through a bounded queue of
+    "blocks" entries, so that decompression, which releases the GIL,
+    runs in parallel with decoding.
+    '''
+    __slots__ = ['f', 'queue', 'thread', 'buf', 'pos', 'eof', 'stop']
+
+    def __init__(self, f, blocks, block_size=READAHEAD_BLOCK):
+        self.f = f
+        self.queue = queue.Queue(max(1, blocks))
+        self.buf = b''
+        self.pos = 0
+        self.eof = False
+        self.stop = threading.Event()
+        self.thread = threading.Thread(
+            target=read_blocks, args=(f, self.queue, self.stop, block_size)
+        )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __del__(self):
+        # The thread of a file which is not closed must not wait for
+        # the queue forever
+        stop = getattr(self, 'stop', None)
+        if stop is not None:
+            stop.set()
+
+    def read(self, n):
+        '''
+        Read n bytes.
+        '''
+        val = []
+        while n > 0:
+            if self.pos >= len(self.buf):
+                if self.eof:
+                    break
+                block = self.queue.get()
+                if isinstance(block, Exception):
+                    self.eof = True
+                    raise block
+                if not block:
+                    self.eof = True
+                    break
+                self.buf = block
+                self.pos = 0
+            chunk = self.buf[self.pos:self.pos+n]
+            self.pos += len(chunk)
+            n -= len(chunk)
+            val.append(chunk)
+        return b''.join(val)
+
+    def close(self):
+        '''
+        Stop the background thread and close file object.
+        '''
+        self.stop.set()
+        self.thread.join()
+        self.f.close()
@@ -0,0 +1,1229 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import sys
+import collections
+import struct
+import time
+from datetime import datetime
+from .params import *
+from .base import *
+from .cache import ParseCache, CACHE_SIZE
+from . import profiler
+from .progress import Progress
+from .resync import ResyncFile
+from .readahead import ReadaheadFile
+from .route import iter_routes
+from .frames import open_mrt_file
+
+__version__ = '2.2.0'
+
+class Reader(Base):
+    '''
+    Reader for MRT format data.
+    '''
+    __slots__ = [
+        'f', 'err', 'err_msg', 'decode', 'cache', 'profile', 'raw', 'prog',
+        'resync', 'peer_table', 'lazy_rib', 'lazy_nlri'
+    ]
+
+    def __init__(self, arg, decode=True, cache_dir=None,
+        cache_size=CACHE_SIZE, profile=False, progress=None,
+        progress_interval=1.0, resync=False, lazy_rib=False,
+        lazy_nlri=False, readahead=0, frames=None):
+        Base.__init__(self)
+        # If decode is False, only the MRT header is decoded and
+        # the raw record is kept in "buf"
+        self.decode = decode
+        # If cache_dir is given, decoded records of a file path are
+        # cached in it and replayed next time
+        self.cache = None
+        # If profile is True, calls, bytes and time of each decoder are
+        # counted and returned by stats()
+        self.profile = None
+        if profile:
+            self.profile = {}
+            profiler.install(Reader, PROFILED_CLASSES, self.profile)
+        # "raw" is the file object of compressed data opened by Reader
+        self.raw = None
+        self.prog = None
+        # If resync is True, the next plausible MRT header is searched
+        # for after a corrupt record
+        self.resync = None
+        # Peers of the last PEER_INDEX_TABLE cached by routes()
+        self.peer_table = None
+        # If lazy_rib is True, "rib_entries" of TABLE_DUMP_V2 is
+        # RibEntryStream which decodes RIB entries while iterating
+        self.lazy_rib = lazy_rib
+        # If lazy_nlri is True, NLRI and withdrawn routes of UPDATE
+        # messages are LazyNlri which decodes prefixes while iterating
+        self.lazy_nlri = lazy_nlri
+        # frames is an iterable of the frame indexes of a frame file
+        # written by FrameWriter to read, or None for all frames
+        if frames is not None:
+            if not isinstance(arg, str):
+                raise ValueError('Frames need a filepath')
+            frames = list(frames)
+
+        # file instance
+        if hasattr(arg, 'read'):
+            self.f = arg
+            self.prog = Progress(arg, progress, progress_interval)
+        # file path
+        elif isinstance(arg, str):
+            if cache_dir is not None:
+                # Timestamps are decoded in local time
+                self.cache = ParseCache(
+                    cache_dir, arg,
+                    (
+                        __version__, decode, as_repr(), time.tzname,
+                        lazy_rib, lazy_nlri, frames, resync
+                    ),
+                    cache_size
+                )
+                # A hit replays the records as they were read with the
+                # same options, so the cache file is neither read ahead
+                # nor resynchronized
+                if self.cache.hit:
+                    self.f = self.cache.f
+                    self.prog = Progress(
+                        self.f, progress, progress_interval
+                    )
+                    return
+            self.f, f = open_mrt_file(arg, frames)
+            if self.f is not f:
+                self.raw = f
+            # The position of the compressed file is used for progress
+            self.prog = Progress(f, progress, progress_interval)
+        else:
+            sys.stderr.write("Error: Unsupported instance type\n")
+            return
+
+        # If readahead is more than 0, the file is decompressed in a
+        # background thread up to readahead blocks ahead of decoding
+        if readahead > 0:
+            self.f = ReadaheadFile(self.f, readahead)
+        if resync:
+            self.f = self.resync = ResyncFile(self.f)
+
+    def close(self):
+        '''
+        Close file object and stop iteration.
+        '''
+        self.f.close()
+        if self.raw is not None:
+            self.raw.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.profile is not None:
+            profiler.uninstall(self.profile)
+        if self.prog is not None:
+            self.prog.finish()
+        raise StopIteration
+
+    def __del__(self):
+        # An abandoned Reader with profile=True must not leave the
+        # counting methods installed
+        profile = getattr(self, 'profile', None)
+        if profile is not None:
+            profiler.uninstall(profile)
+
+    @property
+    def progress(self):
+        '''
+        Progress as a dictionary of records, bytes, compressed_bytes,
+        compressed_total, elapsed, records_per_sec, bytes_per_sec, ratio
+        and eta (seconds).
+        '''
+        if self.prog is None:
+            return None
+        return self.prog.snapshot()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.profile is None:
+            return self.next_record()
+        prev = profiler.activate(self.profile)
+        try:
+            return self.next_record()
+        except StopIteration:
+            profiler.uninstall(self.profile)
+            raise
+        finally:
+            profiler.activate(prev)
+
+    # Python2 compatibility
+    next = __next__
+
+    def stats(self):
+        '''
+        Return {decoder: {'calls', 'bytes', 'time'}} counted with
+        profile=True. Time is cumulative and includes nested decoders.
+        '''
+        if self.profile is None:
+            return {}
+        return profiler.summary(self.profile)
+
+    def routes(self):
+        '''
+        Yield Route of each prefix announced or withdrawn in TABLE_DUMP,
+        TABLE_DUMP_V2 and BGP4MP UPDATE messages.
+        Path attributes are shared by the routes of the same record.
+        '''
+        return iter_routes(self)
+
+    def rib_entries(self):
+        '''
+        Yield (data, entry) of each RIB entry of TABLE_DUMP_V2 records,
+        where data is the decoded record shared by the entries of the
+        prefix. With lazy_rib=True, each entry is decoded when the next
+        one is requested.
+        '''
+        for rec in self:
+            if rec.err or 'rib_entries' not in rec.data:
+                continue
+            for entry in rec.data['rib_entries']:
+                yield (rec.data, entry)
+
+    def next_record(self):
+        '''
+        Return the next record from the cache or the file.
+        '''
+        if self.cache is None:
+            self.read_record()
+        elif self.cache.hit:
+            self.cache.replay(self)
+        else:
+            self.read_record()
+            self.cache.store(self)
+        if self.prog is not None:
+            self.prog.update(len(self.buf))
+        return self
+
+    def read_record(self):
+        '''
+        Read and decode the next record.
+        '''
+        as_len(4)
+        af_num(0, 0)
+        is_add_path(False)
+        lazy_nlri(self.lazy_nlri)
+        self.err = None
+        self.err_msg = None
+        mrt = Mrt(self.f.read(12))
+        try:
+            if self.resync is not None and len(mrt.buf) == 12 \
+                and not self.resync.plausible(mrt.buf):
+                raise MrtFormatError('Implausible MRT header')
+            self.unpack_hdr(mrt)
+        except MrtFormatError as e:
+            self.err = MRT_ERR_C['MRT Header Error']
+            self.err_msg = e.msg
+            self.buf = mrt.buf
+            self.resync_record()
+            return self
+
+        try:
+            self.unpack_msg(mrt)
+        except MrtFormatError as e:
+            self.err = MRT_ERR_C['MRT Data Error']
+            self.err_msg = e.msg
+            self.buf = mrt.buf
+            self.resync_record()
+            return self
+        except (ValueError, KeyError, IndexError, struct.error) as e:
+            # Corrupt data may break the decoders in other ways
+            if self.resync is None:
+                raise
+            self.err = MRT_ERR_C['MRT Data Error']
+            self.err_msg = 'Invalid MRT data: %s' % e
+            self.buf = mrt.buf
+            self.resync_record()
+            return self
+
+        self.buf = mrt.buf
+        if self.resync is not None:
+            # A corrupt length may swallow the following records even if
+            # the record is decoded without error
+            skipped = self.resync.check(mrt.buf)
+            if skipped is not None:
+                self.err = MRT_ERR_C['MRT Data Error']
+                self.err_msg = 'Implausible MRT data length %d (%d bytes ' \
+                    'skipped)' % (mrt.data['length'], skipped)
+                self.buf = mrt.buf[:skipped]
+                return self
+            self.resync.last_ts = list(self.data['timestamp'])[0]
+        return self
+
+    def resync_record(self):
+        '''
+        Skip to the next plausible MRT header after a corrupt record.
+        "buf" of the corrupt record is the bytes skipped.
+        '''
+        if self.resync is None:
+            return
+        skipped = self.resync.resync(self.buf)
+        if skipped:
+            self.buf = skipped
+            self.err_msg = '%s (%d bytes skipped)' % (
+                self.err_msg, len(skipped)
+            )
+
+    def unpack_hdr(self, mrt):
+        '''
+        Decoder for MRT header.
+        '''
+        if len(mrt.buf) == 0:
+            if self.cache is not None:
+                self.cache.commit()
+            self.close()
+        elif len(mrt.buf) < 12:
+            raise MrtFormatError(
+                'Invalid MRT header length %d < 12 byte' % len(mrt.buf)
+            )
+        mrt.unpack()
+        self.data = mrt.data
+
+    def unpack_msg(self, mrt):
+        '''
+        Decoder for MRT message.
+        '''
+        t = list(mrt.data['type'])[0]
+        st = list(mrt.data['subtype'])[0]
+        buf = self.f.read(mrt.data['length'])
+        mrt.buf += buf
+        if len(buf) < mrt.data['length']:
+            raise MrtFormatError(
+                'Invalid MRT data length %d < %d byte'
+                % (len(buf), mrt.data['length'])
+            )
+
+        if not self.decode:
+            return self.p
+
+        if MRT_ST[t][st] == 'Unknown':
+            raise MrtFormatError(
+                'Unsupported type: %d(%s), subtype: %d(%s)'
+                % (t, MRT_T[t], st, MRT_ST[t][st])
+            )
+
+        if t == MRT_T['TABLE_DUMP_V2']:
+            self.unpack_td_v2(buf, mrt)
+        elif t == MRT_T['BGP4MP'] or t == MRT_T['BGP4MP_ET']:
+            if st == BGP4MP_ST['BGP4MP_ENTRY'] \
+                or st == BGP4MP_ST['BGP4MP_SNAPSHOT']:
+                self.p += mrt.data['length']
+                raise MrtFormatError(
+                    'Unsupported type: %d(%s), subtype: %d(%s)'
+                    % (t, MRT_T[t], st, MRT_ST[t][st])
+                )
+            else:
+                if t == MRT_T['BGP4MP_ET']:
+                    mrt.data['microsecond_timestamp'] = mrt.val_num(4)
+                    buf = buf[4:]
+                bgp = Bgp4Mp(buf)
+                bgp.unpack(st)
+                self.data.update(bgp.data)
+        elif t == MRT_T['TABLE_DUMP']:
+            td = TableDump(buf)
+            td.unpack(st)
+            self.data.update(td.data)
+        else:
+            self.p += mrt.data['length']
+            raise MrtFormatError(
+                'Unsupported type: %d(%s), subtype: %d(%s)'
+                % (t, MRT_T[t], st, MRT_ST[t][st])
+            )
+
+        return self.p
+
+    def unpack_td_v2(self, data, mrt):
+        '''
+        Decoder for Table_Dump_V2 format.
+        '''
+        t = list(mrt.data['type'])[0]
+        st = list(mrt.data['subtype'])[0]
+        if st == TD_V2_ST['RIB_IPV4_UNICAST_ADDPATH'] \
+            or st == TD_V2_ST['RIB_IPV4_MULTICAST_ADDPATH'] \
+            or st == TD_V2_ST['RIB_IPV6_UNICAST_ADDPATH'] \
+            or st == TD_V2_ST['RIB_IPV6_MULTICAST_ADDPATH']:
+            is_add_path(True)
+
+        if st == TD_V2_ST['RIB_IPV4_UNICAST'] \
+            or st == TD_V2_ST['RIB_IPV4_MULTICAST'] \
+            or st == TD_V2_ST['RIB_IPV4_UNICAST_ADDPATH'] \
+            or st == TD_V2_ST['RIB_IPV4_MULTICAST_ADDPATH']:
+            af_num.afi = AFI_T['IPv4']
+            rib = AfiSpecRib(data)
+            rib.unpack(self.lazy_rib)
+            self.data.update(rib.data)
+        elif st == TD_V2_ST['RIB_IPV6_UNICAST'] \
+            or st == TD_V2_ST['RIB_IPV6_MULTICAST'] \
+            or st == TD_V2_ST['RIB_IPV6_UNICAST_ADDPATH'] \
+            or st == TD_V2_ST['RIB_IPV6_MULTICAST_ADDPATH']:
+            af_num.afi = AFI_T['IPv6']
+            rib = AfiSpecRib(data)
+            rib.unpack(self.lazy_rib)
+            self.data.update(rib.data)
+        elif st == TD_V2_ST['PEER_INDEX_TABLE']:
+            peer = PeerIndexTable(data)
+            peer.unpack()
+            self.data.update(peer.data)
+        elif st == TD_V2_ST['RIB_GENERIC'] \
+            or st == TD_V2_ST['RIB_GENERIC_ADDPATH']:
+            rib = RibGeneric(data)
+            rib.unpack(self.lazy_rib)
+            self.data.update(rib.data)
+        else:
+            self.p += mrt.data['length']
+
+class Mrt(Base):
+    '''
+    Class for MRT header.
+    '''
+    __slots__ = []
+
+    def __init__(self, buf):
+        Base.__init__(self)
+        self.buf = buf
+
+    def unpack(self):
+        '''
+        Decoder for MRT header.
+        '''
+        ts = self.val_num(4)
+        self.data['timestamp'] = {ts: str(datetime.fromtimestamp(ts))}
+        t = self.val_num(2)
+        self.data['type'] = {t: MRT_T[t]}
+        st = self.val_num(2)
+        self.data['subtype'] = {st: MRT_ST[t][st]}
+        self.data['length'] = self.val_num(4)
+
+        return self.p
+
+class TableDump(Base):
+    '''
+    Class for Table_Dump format.
+    '''
+    __slots__ = []
+
+    def __init__(self, buf):
+        Base.__init__(self)
+        self.buf = buf
+
+    def unpack(self, subtype):
+        '''
+        Decoder for Table_Dump format.
+        '''
+        self.data['view_number'] = self.val_num(2)
+        self.data['sequence_number'] = self.val_num(2)
+        self.data['prefix'] = self.val_addr(subtype)
+        self.data['length'] = self.val_num(1)
+        self.data['status'] = self.val_num(1)
+        ot = self.val_num(4)
+        self.data['originated_time'] = {ot: str(datetime.fromtimestamp(ot))}
+
+        # Considering the IPv4 peers advertising IPv6 Prefixes, first,
+        # the Peer IP Address field is decoded as an IPv4 address.
+        self.data['peer_ip'] = self.val_addr(AFI_T['IPv4'])
+        if subtype == AFI_T['IPv6'] and self.val_num(12):
+            self.p -= 16
+            self.data['peer_ip'] = self.val_addr(subtype)
+
+        self.data['peer_as'] = self.val_as(as_len(2))
+        self.data['path_attributes_length'] = attr_len = self.val_num(2)
+        self.data['path_attributes'] = []
+        while attr_len > 0:
+            attr = BgpAttr(self.buf[self.p:])
+            self.p += attr.unpack()
+            self.data['path_attributes'].append(attr.data)
+            attr_len -= attr.p
+
+        return self.p
+
+class PeerIndexTable(Base):
+    '''
+    Class for PEER_INDEX_TABLE format.
+    '''
+    __slots__ = []
+
+    def __init__(self, buf):
+        Base.__init__(self)
+        self.buf = buf
+
+    def unpack(self):
+        '''
+        Decoder for PEER_INDEX_TABLE format.
+        '''
+        self.data['collector_bgp_id'] = self.val_addr(AFI_T['IPv4'])
+        self.data['view_name_length'] = self.val_num(2)
+        self.data['view_name'] = self.val_str(self.data['view_name_length'])
+        self.data['peer_count'] = self.val_num(2)
+        self.data['peer_entries'] = []
+        for _ in range(self.data['peer_count']):
+            entry = PeerEntries(self.buf[self.p:])
+            self.p += entry.unpack()
+            self.data['peer_entries'].append(entry.data)
+        return self.p
+
+class PeerEntries(Base):
+    '''
+    Class for Peer Entries.
+    '''
+    __slots__ = []
+
+    def __init__(self, buf):
+        Base.__init__(self)
+        self.buf = buf
+
+    def unpack(self):
+        '''
+        Decoder for Peer Entries.
+        '''
+        self.data['peer_type'] = self.val_num(1)
+        self.data['peer_bgp_id'] = self.val_addr(AFI_T['IPv4'])
+        if self.data['peer_type'] & 0x01:
+            af_num.afi = AFI_T['IPv6']
+        else:
+            af_num.afi = AFI_T['IPv4']
+        self.data['peer_ip'] = self.val_addr(af_num.afi)
+        self.data['peer_as'] = self.val_as(
+            4 if self.data['peer_type'] & (0x01 << 1) else 2
+        )
+        return self.p
+
+class RibGeneric(Base):
+    '''
+    Class for RIB_GENERIC format.
+    '''
+    __slots__ = []
+
+    def __init__(self, buf):
+        Base.__init__(self)
+        self.buf = buf
+
+    def unpack(self, lazy=False):
+        '''
+        Decoder for RIB_GENERIC format.
+        If lazy is True, RIB entries are decoded while iterating.
+        '''
+        self.data['sequence_number'] = self.val_num(4)
+        af_num.afi = self.val_num(3)
+        self.data['afi'] = [af_num.afi, AFI_T[af_num.afi]]
+        af_num.safi = self.val_num(1)
+        self.data['safi'] = [af_num.safi, SAFI_T[af_num.safi]]
+        n = self.val_num(1)
+        self.p -= 1
+        self.data['nlri'] \
+            = self.val_nlri(self.p+(n+7)//8, af_num.afi, af_num.safi)
+        self.data['entry_count'] = self.val_num(2)
+        if lazy:
+            self.data['rib_entries'] = RibEntryStream(
+                self.buf, self.p, self.data['entry_count']
+            )
+            return self.p
+        self.data['rib_entries'] = []
+        for _ in range(self.data['entry_count']):
+            entry = RibEntries(self.buf[self.p:])
+            self.p += entry.unpack()
+            self.data['rib_entries'].append(entry.data)
+        return self.p
+
+class AfiSpecRib(Base):
+    '''
+    Class for AFI/SAFI-Specific RIB format.
+    '''
+    __slots__ = []
+
+    def __init__(self, buf):
+        Base.__init__(self)
+        self.buf = buf
+
+    def unpack(self, lazy=False):
+        '''
+        Decoder for AFI/SAFI-Specific RIB format.
+        If lazy is True, RIB entries are decoded while iterating.
+        '''
+        self.data['sequence_number'] = self.val_num(4)
+        self.data['length'] = self.val_num(1)
+        self.data['prefix'] \
+            = self.val_addr(af_num.afi, self.data['length'])
+        self.data['entry_count'] = self.val_num(2)
+        if lazy:
+            self.data['rib_entries'] = RibEntryStream(
+                self.buf, self.p, self.data['entry_count']
+            )
+            return self.p
+        self.data['rib_entries'] = []
+        for _ in range(self.data['entry_count']):
+            entry = RibEntries(self.buf[self.p:])
+            self.p += entry.unpack()
+            self.data['rib_entries'].append(entry.data)
+        return self.p
+
+class RibEntryStream:
+    '''
+    RIB entries of a record which are decoded one by one while iterating,
+    so that the entries of a prefix are not held at once.
+    Each iteration decodes the entries again from the raw record.
+    '''
+    __slots__ = ['buf', 'p', 'count', 'as_len', 'afi', 'safi', 'add_path']
+
+    def __init__(self, buf, p, count):
+        self.buf = buf
+        self.p = p
+        self.count = count
+        # Decoder states of the record
+        self.as_len = as_len()
+        self.afi, self.safi = af_num()
+        self.add_path = is_add_path()
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return 'RibEntryStream(%d entries)' % self.count
+
+    def __iter__(self):
+        p = self.p
+        for _ in range(self.count):
+            as_len(self.as_len)
+            af_num(self.afi, self.safi)
+            is_add_path(self.add_path)
+            # Peer Index, Originated Time and Path Identifier
+            q = p + 6 + (4 if self.add_path else 0)
+            end = q + 2 + struct.unpack('>H', self.buf[q:q+2])[0]
+            if end > len(self.buf):
+                raise MrtFormatError(
+                    'Insufficient buffer %d < %d byte' % (len(self.buf), end)
+                )
+            entry = RibEntries(self.buf[p:end])
+            entry.unpack()
+            p = end
+            yield entry.data
+
+class RibEntries(Base):
+    '''
+    Class for Rib Entries format.
+    '''
+    __slots__ = []
+
+    def __init__(self, buf):
+        Base.__init__(self)
+        self.buf = buf
+
+    def unpack(self):
+        '''
+        Decoder for Rib Entries format.
+        '''
+        self.data['peer_index'] = self.val_num(2)
+        ot = self.val_num(4)
+        self.data['originated_time'] = {ot: str(datetime.fromtimestamp(ot))}
+        if is_add_path():
+            self.data['path_id'] = self.val_num(4)
+        attr_len = self.data['path_attributes_length'] = self.val_num(2)
+        self.data['path_attributes'] = []
+        while attr_len > 0:
+            attr = BgpAttr(self.buf[self.p:])
+            self.p += attr.unpack()
+            self.data['path_attributes'].append(attr.data)
+            attr_len -= attr.p
+        return self.p
+
+class Bgp4Mp(Base):
+    '''
+    Class for BGP4MP format.
+    '''
+    __slots__ = []
+
+    def __init__(self, buf):
+        Base.__init__(self)
+        self.buf = buf
+
+    def unpack(self, st):
+        '''
+        Decoder for BGP4MP format.
+        '''
+        if st == BGP4MP_ST['BGP4MP_STATE_CHANGE'] \
+            or st == BGP4MP_ST['BGP4MP_MESSAGE'] \
+            or st == BGP4MP_ST['BGP4MP_MESSAGE_LOCAL'] \
+            or st == BGP4MP_ST['BGP4MP_MESSAGE_ADDPATH'] \
+            or st == BGP4MP_ST['BGP4MP_MESSAGE_LOCAL_ADDPATH']:
+            as_len(2)
+
+        if st == BGP4MP_ST['BGP4MP_MESSAGE_ADDPATH'] \
+            or st == BGP4MP_ST['BGP4MP_MESSAGE_AS4_ADDPATH'] \
+            or st == BGP4MP_ST['BGP4MP_MESSAGE_LOCAL_ADDPATH'] \
+            or st == BGP4MP_ST['BGP4MP_MESSAGE_AS4_LOCAL_ADDPATH']:
+            is_add_path(True)
+
+        self.data['peer_as'] = self.val_as(as_len())
+        self.data['local_as'] = self.val_as(as_len())
+        self.data['ifindex'] = self.val_num(2)
+        afi = self.val_num(2)
+        self.data['afi'] = {afi: AFI_T[afi]}
+        self.data['peer_ip'] = self.val_addr(afi)
+        self.data['local_ip'] = self.val_addr(afi)
+
+        if st == BGP4MP_ST['BGP4MP_STATE_CHANGE'] \
+            or st == BGP4MP_ST['BGP4MP_STATE_CHANGE_AS4']:
+            old = self.val_num(2)
+            self.data['old_state'] = {old: BGP_FSM[old]}
+            new = self.val_num(2)
+            self.data['new_state'] = {new: BGP_FSM[new]}
+        else:
+            bgp_msg = BgpMessage(self.buf[self.p:])
+            self.p += bgp_msg.unpack()
+            self.data['bgp_message'] = bgp_msg.data
+        return self.p
+
+class BgpMessage(Base):
+    '''
+    Class for BGP Message.
+    '''
+    __slots__ = []
+
+    def __init__(self, buf):
+        Base.__init__(self)
+        self.buf = buf
+
+    def unpack(self):
+        '''
+        Decoder for BGP Message.
+        '''
+        self.data['marker'] = self.val_bytes(16)
+        self.data['length'] = self.val_num(2)
+        t = self.val_num(1)
+        self.data['type'] = {t: BGP_MSG_T[t]}
+
+        if t == BGP_MSG_T['OPEN']:
+            self.unpack_open()
+        elif t == BGP_MSG_T['UPDATE']:
+            self.unpack_update()
+        elif t == BGP_MSG_T['NOTIFICATION']:
+            self.unpack_notification()
+        elif t == BGP_MSG_T['ROUTE-REFRESH']:
+            self.unpack_route_refresh()
+
+        self.p += self.data['length'] - self.p
+        return self.p
+
+    def unpack_open(self):
+        '''
+        Decoder for BGP OPEN Message.
+        '''
+        self.data['version'] = self.val_num(1)
+        self.data['local_as'] = self.val_num(2)
+        self.data['holdtime'] = self.val_num(2)
+        self.data['bgp_id'] = self.val_addr(AFI_T['IPv4'])
+        opt_len = self.data['length'] = self.val_num(1)
+        self.data['optional_parameters'] = []
+        while opt_len > 0:
+            opt_params = OptParams(self.buf[self.p:])
+            self.p += opt_params.unpack()
+            if opt_params.caps:
+                self.data['optional_parameters'].extend(opt_params.caps)
+            else:
+                self.data['optional_parameters'].append(opt_params.data)
+            opt_len -= opt_params.p
+
+    def unpack_update(self):
+        '''
+        Decoder for BGP UPDATE Message.
+        '''
+        self.data['withdrawn_routes_length'] = self.val_num(2)
+        self.data['withdrawn_routes'] = self.val_nlri_view(
+            self.p + self.data['withdrawn_routes_length'], AFI_T['IPv4']
+        )
+        self.data['path_attributes_length'] = self.val_num(2)
+        attr_len = self.p + self.data['path_attributes_length']
+        self.data['path_attributes'] = []
+        while self.p < attr_len:
+            attr = BgpAttr(self.buf[self.p:])
+            self.p += attr.unpack()
+            self.data['path_attributes'].append(attr.data)
+        self.data['nlri'] = self.val_nlri_view(
+            self.data['length'], AFI_T['IPv4']
+        )
+
+    def unpack_notification(self):
+        '''
+        Decoder for BGP NOTIFICATION Message.
+        '''
+        c = self.val_num(1)
+        self.data['error_code'] = {c: BGP_ERR_C[c]}
+        sc = self.val_num(1)
+        self.data['error_subcode'] = {sc: BGP_ERR_SC[c][sc]}
+        self.data['data'] = self.val_bytes(self.data['length'] - self.p)
+
+    def unpack_route_refresh(self):
+        '''
+        Decoder for BGP ROUTE-REFRESH Message.
+        '''
+        afi = self.val_num(2)
+        self.data['afi'] = {afi: AFI_T[afi]}
+        self.data['reserved'] = self.val_num(1)
+        safi = self.val_num(1)
+        self.data['safi'] = {safi: SAFI_T[safi]}
+
+class OptParams(Base):
+    '''
+    Class for BGP OPEN Optional Parameters.
+    '''
+    __slots__ = ['caps']
+
+    def __init__(self, buf):
+        Base.__init__(self)
+        self.buf = buf
+        # Capabilities of a Capabilities parameter
+        self.caps = []
+
+    def unpack(self):
+        '''
+        Decoder for BGP OPEN Optional Parameters.
+        '''
+        t = self.val_num(1)
+        self.data['type'] = {t: BGP_OPT_PARAMS_T[t]}
+        length = self.data['length'] = self.val_num(1)
+        if t == BGP_OPT_PARAMS_T['Capabilities']:
+            end = self.p + length
+            # A parameter may carry several capabilities, each of which is
+            # decoded into its own data
+            while self.p < end:
+                start = self.p
+                self.data = collections.OrderedDict()
+                self.unpack_capabilities()
+                self.p = start + 2 + self.data['length']
+                self.caps.append(self.data)
+            self.p = end
+        else:
+            self.p += length
+        return self.p
+
+    def unpack_capabilities(self):
+        '''
+        Decoder for BGP Capabilities.
+        '''
+        t = self.val_num(1)
+        self.data['type'] = {t: BGP_CAP_C[t]}
+        self.data['length'] = self.val_num(1)
+
+        if t == BGP_CAP_C['Multiprotocol Extensions for BGP-4']:
+            self.unpack_multi_ext()
+        elif t == BGP_CAP_C['Route Refresh Capability for BGP-4']:
+            self.p += self.data['length']
+        elif t == BGP_CAP_C['Outbound Route Filtering Capability']:
+            self.unpack_orf()
+        elif t == BGP_CAP_C['Graceful Restart Capability']:
+            self.unpack_graceful_restart()
+        elif t == BGP_CAP_C['Support for 4-octet AS number capability']:
+            self.unpack_support_as4()
+        elif t == BGP_CAP_C['ADD-PATH Capability']:
+            self.unpack_add_path()
+        else:
+            self.p += self.data['length']
+
+    def unpack_multi_ext(self):
+        '''
+        Decoder for Multiprotocol Extensions for BGP-4.
+        '''
+        self.data['value'] = collections.OrderedDict()
+        afi = self.val_num(2)
+        self.data['value']['afi'] = {afi: AFI_T[afi]}
+        self.data['value']['reserved'] = self.val_num(1)
+        safi = self.val_num(1)
+        self.data['value']['safi'] = {safi: SAFI_T[safi]}
+
+    def unpack_orf(self):
+        '''
+        Decoder for Outbound Route Filtering Capability.
+        '''
+        self.data['value'] = collections.OrderedDict()
+        afi = self.val_num(2)
+        self.data['value']['afi'] = {afi: AFI_T[afi]}
+        self.data['value']['reserved'] = self.val_num(1)
+        safi = self.val_num(1)
+        self.data['value']['safi'] = {safi: SAFI_T[safi]}
+        self.data['value']['number'] = self.val_num(1)
+        self.data['value']['entries'] = []
+        for _ in range(self.data['value']['number']):
+            entry = collections.OrderedDict()
+            t = self.val_num(1)
+            entry['type'] = {t: ORF_T[t]}
+            sr = self.val_num(1)
+            entry['send_receive'] = {sr: ORF_T[sr]}
+            self.data['value']['entries'].append(entry)
+
+    def unpack_graceful_restart(self):
+        '''
+        Decoder for Graceful Restart Capability.
+        '''
+        self.data['value'] = collections.OrderedDict()
+        n = self.val_num(2)
+        self.data['value']['flags'] = n & 0xf000
+        self.data['value']['seconds'] = n & 0x0fff
+        self.data['value']['entries'] = []
+        cap_len = self.data['length']
+        while cap_len > 2:
+            entry = collections.OrderedDict()
+            afi = self.val_num(2)
+            entry['afi'] = {afi: AFI_T[afi]}
+            safi = self.val_num(1)
+            entry['safi'] = {safi: SAFI_T[safi]}
+            entry['flags'] = self.val_num(1)
+            self.data['value']['entries'].append(entry)
+            cap_len -= 4
+
+    def unpack_support_as4(self):
+        '''
+        Decoder for Support for 4-octet AS number capability.
+        '''
+        self.data['value'] = self.val_as(4)
+
+    def unpack_add_path(self):
+        '''
+        Decoder for ADD-PATH Capability
+        '''
+        self.data['value'] = []
+        cap_len = self.data['length']
+        while cap_len > 2:
+            entry = collections.OrderedDict()
+            afi = self.val_num(2)
+            entry['afi'] = {afi: AFI_T[afi]}
+            safi = self.val_num(1)
+            entry['safi'] = {safi: SAFI_T[safi]}
+            sr = self.val_num(1)
+            entry['send_receive'] = {sr: ADD_PATH_SEND_RECV[sr]}
+            self.data['value'].append(entry)
+            cap_len -= 4
+
+class BgpAttr(Base):
+    '''
+    Class for BGP path attributes
+    '''
+    __slots__ = []
+
+    def __init__(self, buf):
+        Base.__init__(self)
+        self.buf = buf
+
+    def unpack(self):
+        '''
+        Decoder for BGP path attributes
+        '''
+        self.data['flag'] = self.val_num(1)
+        t = self.val_num(1)
+        self.data['type'] = {t: BGP_ATTR_T[t]}
+
+        if self.data['flag'] & 0x01 << 4:
+            self.data['length'] = self.val_num(2)
+        else:
+            self.data['length'] = self.val_num(1)
+
+        if t == BGP_ATTR_T['ORIGIN']:
+            self.unpack_origin()
+        elif t == BGP_ATTR_T['AS_PATH']:
+            self.unpack_as_path()
+        elif t == BGP_ATTR_T['NEXT_HOP']:
+            self.unpack_next_hop()
+        elif t == BGP_ATTR_T['MULTI_EXIT_DISC']:
+            self.unpack_multi_exit_disc()
+        elif t == BGP_ATTR_T['LOCAL_PREF']:
+            self.unpack_local_pref()
+        elif t == BGP_ATTR_T['AGGREGATOR']:
+            self.unpack_aggregator()
+        elif t == BGP_ATTR_T['COMMUNITY']:
+            self.unpack_community()
+        elif t == BGP_ATTR_T['ORIGINATOR_ID']:
+            self.unpack_originator_id()
+        elif t == BGP_ATTR_T['CLUSTER_LIST']:
+            self.unpack_cluster_list()
+        elif t == BGP_ATTR_T['MP_REACH_NLRI']:
+            self.unpack_mp_reach_nlri()
+        elif t == BGP_ATTR_T['MP_UNREACH_NLRI']:
+            self.unpack_mp_unreach_nlri()
+        elif t == BGP_ATTR_T['EXTENDED COMMUNITIES']:
+            self.unpack_extended_communities()
+        elif t == BGP_ATTR_T['AS4_PATH']:
+            self.unpack_as4_path()
+        elif t == BGP_ATTR_T['AS4_AGGREGATOR']:
+            self.unpack_as4_aggregator()
+        elif t == BGP_ATTR_T['AIGP']:
+            self.unpack_aigp()
+        elif t == BGP_ATTR_T['ATTR_SET']:
+            self.unpack_attr_set()
+        elif t == BGP_ATTR_T['LARGE_COMMUNITY']:
+            self.unpack_large_community()
+        else:
+            if self.data['length']:
+                self.data['value'] = self.val_bytes(self.data['length'])
+            else:
+                self.data['value'] = ''
+        return self.p
+
+    def unpack_origin(self):
+        '''
+        Decoder for ORIGIN attribute
+        '''
+        v = self.val_num(1)
+        self.data['value'] = {v: ORIGIN_T[v]}
+
+    def unpack_as_path(self):
+        '''
+        Decoder for AS_PATH attribute
+        '''
+        attr_len = self.p + self.data['length']
+        self.data['value'] = []
+        while self.p < attr_len:
+            path_seg = collections.OrderedDict()
+            t = self.val_num(1)
+            path_seg['type'] = {t: AS_PATH_SEG_T[t]}
+            path_seg['length'] = self.val_num(1)
+            path_seg['value'] = []
+            for _ in range(path_seg['length']):
+                path_seg['value'].append(self.val_as(as_len()))
+            self.data['value'].append(path_seg)
+
+    def unpack_next_hop(self):
+        '''
+        Decoder for NEXT_HOP attribute
+        '''
+        if self.data['length'] == 4:
+            self.data['value'] = self.val_addr(AFI_T['IPv4'])
+        elif self.data['length'] == 16:
+            self.data['value'] = self.val_addr(AFI_T['IPv6'])
+        else:
+            self.p += self.data['length']
+            self.data['value'] = None
+
+    def unpack_multi_exit_disc(self):
+        '''
+        Decoder for MULTI_EXIT_DISC attribute
+        '''
+        self.data['value'] = self.val_num(4)
+
+    def unpack_local_pref(self):
+        '''
+        Decoder for LOCAL_PREF attribute
+        '''
+        self.data['value'] = self.val_num(4)
+
+    def unpack_aggregator(self):
+        '''
+        Decoder for AGGREGATOR attribute
+        '''
+        self.data['value'] = collections.OrderedDict()
+        n = 2 if self.data['length'] < 8 else 4
+        self.data['value']['as'] = self.val_as(n)
+        self.data['value']['id'] = self.val_addr(AFI_T['IPv4'])
+
+    def unpack_community(self):
+        '''
+        Decoder for COMMUNITY attribute
+        '''
+        attr_len = self.p + self.data['length']
+        self.data['value'] = []
+        while self.p < attr_len:
+            v = self.val_num(4)
+            self.data['value'].append(
+                '%d:%d' % ((v & 0xffff0000) >> 16, v & 0x0000ffff)
+            )
+
+    def unpack_originator_id(self):
+        '''
+        Decoder for ORIGINATOR_ID attribute
+        '''
+        self.data['value'] = self.val_addr(AFI_T['IPv4'])
+
+    def unpack_cluster_list(self):
+        '''
+        Decoder for CLUSTER_LIST attribute
+        '''
+        attr_len = self.p + self.data['length']
+        self.data['value'] = []
+        while self.p < attr_len:
+            self.data['value'].append(self.val_addr(AFI_T['IPv4']))
+
+    def unpack_mp_reach_nlri(self):
+        '''
+        Decoder for MP_REACH_NLRI attribute
+        '''
+        attr_len = self.p + self.data['length']
+        self.data['value'] = collections.OrderedDict()
+        afi = self.val_num(2)
+        self.data['value']['afi'] = {afi: AFI_T[afi]}
+
+        if AFI_T[afi] != 'Unknown':
+            af_num.afi = afi
+            af_num.safi = self.val_num(1)
+            self.data['value']['safi'] = {af_num.safi: SAFI_T[af_num.safi]}
+            self.data['value']['next_hop_length'] = self.val_num(1)
+
+            if af_num.afi != AFI_T['IPv4'] and af_num.afi != AFI_T['IPv6']:
+                self.p = attr_len
+                return
+
+            if af_num.safi != SAFI_T['UNICAST'] \
+                and af_num.safi != SAFI_T['MULTICAST'] \
+                and af_num.safi != SAFI_T['L3VPN_UNICAST'] \
+                and af_num.safi != SAFI_T['L3VPN_MULTICAST']:
+                self.p = attr_len
+                return
+
+            if af_num.safi == SAFI_T['L3VPN_UNICAST'] \
+                or af_num.safi == SAFI_T['L3VPN_MULTICAST']:
+                self.data['value']['route_distinguisher'] = self.val_rd()
+
+        #
+        # RFC6396
+        # 4.3.4. RIB Entries:
+        # There is one exception to the encoding of BGP attributes for the BGP
+        # MP_REACH_NLRI attribute (BGP Type Code 14) [RFC4760].  Since the AFI,
+        # SAFI, and NLRI information is already encoded in the RIB Entry Header
+        # or RIB_GENERIC Entry Header, only the Next Hop Address Length and
+        # Next Hop Address fields are included.  The Reserved field is omitted.
+        # The attribute length is also adjusted to reflect only the length of
+        # the Next Hop Address Length and Next Hop Address fields.
+        #
+        else:
+            self.p -= 2
+            self.data['value'] = collections.OrderedDict()
+            self.data['value']['next_hop_length'] = self.val_num(1)
+
+        self.data['value']['next_hop'] = [self.val_addr(af_num.afi)]
+
+        # RFC2545
+        if self.data['value']['next_hop_length'] == 32 \
+            and af_num.afi == AFI_T['IPv6']:
+            self.data['value']['next_hop'].append(self.val_addr(af_num.afi))
+
+        if 'afi' in self.data['value']:
+            self.data['value']['reserved'] = self.val_num(1)
+            self.data['value']['nlri'] \
+                = self.val_nlri_view(attr_len, af_num.afi, af_num.safi)
+
+    def unpack_mp_unreach_nlri(self):
+        '''
+        Decoder for MP_UNREACH_NLRI attribute
+        '''
+        attr_len = self.p + self.data['length']
+        self.data['value'] = collections.OrderedDict()
+        afi = self.val_num(2)
+        self.data['value']['afi'] = {afi: AFI_T[afi]}
+        safi = self.val_num(1)
+        self.data['value']['safi'] = {safi: SAFI_T[safi]}
+
+        if afi != AFI_T['IPv4'] and afi != AFI_T['IPv6']:
+            self.p = attr_len
+            return
+
+        if safi != SAFI_T['UNICAST'] \
+            and safi != SAFI_T['MULTICAST'] \
+            and safi != SAFI_T['L3VPN_UNICAST'] \
+            and safi != SAFI_T['L3VPN_MULTICAST']:
+            self.p = attr_len
+            return
+
+        self.data['value']['withdrawn_routes'] = self.val_nlri_view(
+            attr_len, afi, safi
+        )
+
+    def unpack_extended_communities(self):
+        '''
+        Decoder for EXT_COMMUNITIES attribute
+        '''
+        attr_len = self.p + self.data['length']
+        self.data['value'] = []
+        while self.p < attr_len:
+            ext_comm = self.val_num(8)
+            self.data['value'].append(ext_comm)
+
+    def unpack_as4_path(self):
+        '''
+        Decoder for AS4_PATH attribute
+        '''
+        attr_len = self.p + self.data['length']
+        self.data['value'] = []
+        while self.p < attr_len:
+            path_seg = collections.OrderedDict()
+            t = self.val_num(1)
+            path_seg['type'] = {t: AS_PATH_SEG_T[t]}
+            path_seg['length'] = self.val_num(1)
+            path_seg['value'] = []
+            for _ in range(path_seg['length']):
+                path_seg['value'].append(self.val_as(4))
+            self.data['value'].append(path_seg)
+
+    def unpack_as4_aggregator(self):
+        '''
+        Decoder for AS4_AGGREGATOR attribute
+        '''
+        self.data['value'] = collections.OrderedDict()
+        self.data['value']['as'] = self.val_as(4)
+        self.data['value']['id'] = self.val_addr(AFI_T['IPv4'])
+
+    def unpack_aigp(self):
+        '''
+        Decoder for AIGP attribute
+        '''
+        attr_len = self.p + self.data['length']
+        self.data['value'] = []
+        while self.p < attr_len:
+            aigp = collections.OrderedDict()
+            aigp['type'] = self.val_num(1)
+            aigp['length'] = self.val_num(2)
+            aigp['value'] = self.val_num(aigp['length'] - 3)
+            self.data['value'].append(aigp)
+
+    def unpack_attr_set(self):
+        '''
+        Decoder for ATTR_SET attribute
+        '''
+        attr_len = self.p + self.data['length']
+        self.data['value'] = collections.OrderedDict()
+        self.data['value']['origin_as'] = self.val_as(4)
+        attr_len -= 4
+        self.data['value']['path_attributes'] = []
+        while self.p < attr_len:
+            attr = BgpAttr(self.buf[self.p:])
+            self.p += attr.unpack()
+            self.data['value']['path_attributes'].append(attr.data)
+
+    def unpack_large_community(self):
+        '''
+        Decoder for LARGE_COMMUNITY attribute
+        '''
+        attr_len = self.p + self.data['length']
+        self.data['value'] = []
+        while self.p < attr_len:
+            self.data['value'].append(
+                '%d:%d:%d' % (self.val_num(4), self.val_num(4), self.val_num(4))
+            )
+
+# Decoder classes whose unpack methods are counted with profile=True
+PROFILED_CLASSES = [
+    Mrt, TableDump, PeerIndexTable, PeerEntries, RibGeneric, AfiSpecRib,
+    RibEntries, Bgp4Mp, BgpMessage, OptParams, BgpAttr, Nlri
+]
@@ -0,0 +1,243 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import re
+import time
+import struct
+from .params import *
+
+# Bytes read at once while scanning
+RESYNC_WINDOW = 64 * 1024
+
+# Maximum length of a plausible record
+RESYNC_MAX_LEN = 16 * 1024 * 1024
+
+# Maximum difference of timestamps from the last valid record
+RESYNC_TS_WINDOW = 86400
+
+# Timestamps before this are implausible (1990-01-01)
+RESYNC_MIN_TS = 631152000
+
+# Subtypes of plausible types
+RESYNC_TYPES = {
+    MRT_T['OSPFv2']: (0,),
+    MRT_T['TABLE_DUMP']: tuple(k for k in TD_ST if isinstance(k, int)),
+    MRT_T['TABLE_DUMP_V2']:
+        tuple(k for k in TD_V2_ST if isinstance(k, int)),
+    MRT_T['BGP4MP']: tuple(k for k in BGP4MP_ST if isinstance(k, int)),
+    MRT_T['BGP4MP_ET']: tuple(k for k in BGP4MP_ST if isinstance(k, int)),
+    MRT_T['ISIS']: (0,),
+    MRT_T['ISIS_ET']: (0,),
+    MRT_T['OSPFv3']: (0,),
+    MRT_T['OSPFv3_ET']: (0,),
+}
+
+# Candidates of headers whose type and subtype are less than 256
+RESYNC_RE = re.compile(
+    b'(?s)(?=.{4}\\x00[' + b''.join(
+        struct.pack('>B', t) for t in sorted(RESYNC_TYPES)
+    ).replace(b'\\', b'\\\\').replace(b']', b'\\]') + b']\\x00)'
+)
+
+class ResyncFile:
+    '''
+    File object which scans forward for the next plausible MRT header
+    after a corrupt record.
+    Bytes read ahead while scanning are returned by the following reads.
+    '''
+    __slots__ = [
+        'f', 'pending', 'pos', 'last_ts', 'skipped', 'resyncs', 'window',
+        'ts_window'
+    ]
+
+    def __init__(self, f, window=RESYNC_WINDOW, ts_window=RESYNC_TS_WINDOW):
+        self.f = f
+        self.pending = b''
+        self.pos = 0
+        # Timestamp of the last valid record
+        self.last_ts = None
+        # Total bytes skipped and number of resynchronizations
+        self.skipped = 0
+        self.resyncs = 0
+        self.window = window
+        self.ts_window = ts_window
+
+    def read(self, n):
+        '''
+        Read n bytes.
+        '''
+        if self.pos >= len(self.pending):
+            return self.f.read(n)
+        val = self.pending[self.pos:self.pos+n]
+        self.pos += len(val)
+        if self.pos >= len(self.pending):
+            self.pending = b''
+            self.pos = 0
+        if len(val) < n:
+            val += self.f.read(n - len(val))
+        return val
+
+    def peek(self, n):
+        '''
+        Return up to n bytes without consuming them.
+        '''
+        avail = len(self.pending) - self.pos
+        if avail < n:
+            self.pending = self.pending[self.pos:] + self.f.read(n - avail)
+            self.pos = 0
+        return self.pending[self.pos:self.pos+n]
+
+    def unread(self, buf):
+        '''
+        Push back bytes to be read again.
+        '''
+        self.pending = buf + self.pending[self.pos:]
+        self.pos = 0
+
+    def close(self):
+        '''
+        Close file object.
+        '''
+        self.f.close()
+
+    def plausible(self, buf, p=0, candidate=False):
+        '''
+        Check whether there is a plausible MRT header at p.
+        The timestamp is only checked if candidate is True, i.e. for
+        headers found while scanning after the framing was lost, since
+        valid records may follow each other with any gap.
+        '''
+        ts, t, st, length = struct.unpack('>IHHI', buf[p:p+12])
+        if st not in RESYNC_TYPES.get(t, ()) or length > RESYNC_MAX_LEN:
+            return False
+        if not candidate:
+            return True
+        if self.last_ts is not None:
+            return abs(ts - self.last_ts) <= self.ts_window
+        return RESYNC_MIN_TS <= ts <= time.time() + self.ts_window
+
+    def check(self, buf):
+        '''
+        Check the framing after a record which was decoded without error,
+        whose bytes are buf.
+        If the next header is implausible and a plausible header followed
+        by another one is found inside the record, its length must have
+        been corrupted. The bytes from the header are pushed back and the
+        number of bytes of the record before it is returned.
+        Otherwise None is returned.
+        '''
+        hdr = self.peek(12)
+        if len(hdr) == 0 or (len(hdr) == 12 and self.plausible(hdr)):
+            return None
+        for m in RESYNC_RE.finditer(buf, 1):
+            i = m.start()
+            if i + 12 > len(buf):
+                break
+            if not self.plausible(buf, i, True):
+                continue
+            j = i + 12 + struct.unpack('>I', buf[i+8:i+12])[0]
+            if j + 12 <= len(buf):
+                if not self.plausible(buf, j, True):
+                    continue
+            else:
+                # The next header is in the following bytes
+                ahead = self.peek(j + 12 - len(buf))
+                nxt = buf[j:] + ahead[max(0, j - len(buf)):]
+                if len(nxt) == 12:
+                    if not self.plausible(nxt, 0, True):
+                        continue
+                elif j != len(buf) + len(ahead):
+                    continue
+            self.unread(buf[i:])
+            self.skipped += i
+            self.resyncs += 1
+            return i
+        return None
+
+    def resync(self, failed):
+        '''
+        Find the next plausible MRT header after the failed record, whose
+        bytes already read are failed.
+        The header must be followed by another plausible header or the
+        end of file. Return the bytes skipped from the start of the failed
+        record, which are empty if the framing is intact.
+        '''
+        hdr = self.read(12)
+        self.unread(hdr)
+        if len(hdr) == 12 and self.plausible(hdr):
+            return b''
+        # The last record is complete at the end of file
+        if len(hdr) == 0 and len(failed) >= 12 \
+            and len(failed) == 12 + struct.unpack('>I', failed[8:12])[0]:
+            return b''
+
+        # The failed record itself may have swallowed valid records
+        scanned = [failed]
+        base = 1
+        window = failed[1:]
+        pos = 0
+        eof = False
+        while True:
+            m = RESYNC_RE.search(window, pos)
+            if m is None or m.start() + 12 > len(window):
+                if eof:
+                    if self.last_ts is not None:
+                        # Valid records may follow a gap longer than
+                        # ts_window, so scan again without the last
+                        # timestamp
+                        self.unread(b''.join(scanned)[len(failed):])
+                        self.last_ts = None
+                        return self.resync(failed)
+                    skipped = base + len(window)
+                    break
+                # Scanned bytes are dropped except a partial header
+                cut = max(0, len(window) - 11) if m is None else m.start()
+                base += cut
+                window = window[cut:]
+                pos = 0
+                data = self.read(self.window)
+                eof = len(data) == 0
+                scanned.append(data)
+                window += data
+                continue
+            i = m.start()
+            pos = i + 1
+            if not self.plausible(window, i, True):
+                continue
+            j = i + 12 + struct.unpack('>I', window[i+8:i+12])[0]
+            while j + 12 > len(window) and not eof:
+                data = self.read(max(self.window, j + 12 - len(window)))
+                eof = len(data) == 0
+                scanned.append(data)
+                window += data
+            if j + 12 <= len(window):
+                if not self.plausible(window, j, True):
+                    continue
+            elif j != len(window):
+                continue
+            self.unread(window[i:])
+            skipped = base + i
+            break
+        self.skipped += skipped
+        self.resyncs += 1
+        return b''.join(scanned)[:skipped]
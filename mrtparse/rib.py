@@ -0,0 +1,380 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import socket
+import struct
+import collections
+import itertools
+from .params import *
+from .merge import MergedRecord
+
+RibChange = collections.namedtuple(
+    'RibChange',
+    ['ts', 'action', 'peer_ip', 'peer_as', 'prefix', 'length', 'path_id',
+     'attrs']
+)
+
+def pack_prefix(prefix, length, path_id=0):
+    '''
+    Pack a prefix into a compact key of the prefix tables.
+    '''
+    if ':' in prefix:
+        addr = socket.inet_pton(socket.AF_INET6, prefix)
+    else:
+        addr = socket.inet_pton(socket.AF_INET, prefix)
+    return addr + struct.pack('>BI', length, path_id or 0)
+
+def unpack_prefix(key):
+    '''
+    Unpack a key of the prefix tables to (prefix, length, path_id).
+    '''
+    if len(key) == 21:
+        prefix = socket.inet_ntop(socket.AF_INET6, key[:16])
+    else:
+        prefix = socket.inet_ntop(socket.AF_INET, key[:4])
+    length, path_id = struct.unpack('>BI', key[-5:])
+    return (prefix, length, path_id)
+
+def route_attrs(attrs):
+    '''
+    Strip NLRI from path attributes to make the attribute set shared by
+    the routes of a RIB entry or an UPDATE message.
+    '''
+    val = []
+    for attr in attrs:
+        t = list(attr['type'])[0]
+        if t == BGP_ATTR_T['MP_UNREACH_NLRI']:
+            continue
+        elif t == BGP_ATTR_T['MP_REACH_NLRI']:
+            # flag and length depend on the NLRI and on the abbreviated
+            # encoding of TABLE_DUMP_V2, so only the next hop is kept
+            attr = collections.OrderedDict([
+                ('type', attr['type']),
+                ('value', collections.OrderedDict(
+                    [('next_hop', attr['value'].get('next_hop', []))]
+                )),
+            ])
+        val.append(attr)
+    return val
+
+def freeze(val):
+    '''
+    Convert decoded values to nested tuples which can be hashed.
+    '''
+    if isinstance(val, dict):
+        return tuple((k, freeze(v)) for k, v in val.items())
+    elif isinstance(val, (list, tuple)):
+        return tuple(freeze(v) for v in val)
+    return val
+
+def attrs_key(attrs):
+    '''
+    Return the key of an attribute set returned by route_attrs().
+    The length and Extended Length bit of the flag are not part of the key
+    since they only depend on the encoding.
+    '''
+    return tuple(
+        (
+            list(attr['type'])[0],
+            attr.get('flag', 0) & ~(0x01 << 4),
+            freeze(attr['value'])
+        )
+        for attr in attrs
+    )
+
+class AttrTable:
+    '''
+    Table of interned path attribute sets with reference counts.
+    '''
+    __slots__ = ['ids', 'attrs', 'refs', 'free']
+
+    def __init__(self):
+        self.ids = {}
+        self.attrs = []
+        self.refs = []
+        self.free = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def intern(self, attrs):
+        '''
+        Return the id of the attribute set and increment its reference.
+        '''
+        key = attrs_key(attrs)
+        i = self.ids.get(key)
+        if i is None:
+            if self.free:
+                i = self.free.pop()
+                self.attrs[i] = (key, attrs)
+                self.refs[i] = 0
+            else:
+                i = len(self.attrs)
+                self.attrs.append((key, attrs))
+                self.refs.append(0)
+            self.ids[key] = i
+        self.refs[i] += 1
+        return i
+
+    def release(self, i):
+        '''
+        Decrement the reference of the attribute set.
+        '''
+        self.refs[i] -= 1
+        if self.refs[i] == 0:
+            del self.ids[self.attrs[i][0]]
+            self.attrs[i] = None
+            self.free.append(i)
+
+    def get(self, i):
+        '''
+        Return the attribute set of the id.
+        '''
+        return self.attrs[i][1]
+
+class RibState:
+    '''
+    Routing table reconstructed from RIB dumps and BGP4MP updates.
+    Routes are kept in per-peer prefix tables which map a packed prefix to
+    the id of an interned attribute set.
+    '''
+    __slots__ = [
+        'peers', 'peer_ids', 'tables', 'attr_table', 'index_peers', 'ts',
+        'pending'
+    ]
+
+    def __init__(self):
+        self.peers = []
+        self.peer_ids = {}
+        self.tables = []
+        self.attr_table = AttrTable()
+        self.index_peers = []
+        self.ts = 0
+        self.pending = None
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables)
+
+    def peer_id(self, peer_ip, peer_as):
+        '''
+        Return the id of the peer, registering it if necessary.
+        '''
+        key = (peer_ip, peer_as)
+        i = self.peer_ids.get(key)
+        if i is None:
+            i = self.peer_ids[key] = len(self.peers)
+            self.peers.append(key)
+            self.tables.append({})
+        return i
+
+    def announce(self, peer, key, attr_id, changes):
+        '''
+        Install a route to the prefix table of the peer.
+        '''
+        table = self.tables[peer]
+        old = table.get(key)
+        table[key] = attr_id
+        if old is None:
+            action = 'A'
+        else:
+            self.attr_table.release(old)
+            if old == attr_id:
+                return
+            action = 'C'
+        if changes is not None:
+            changes.append(self.change(action, peer, key, attr_id))
+
+    def withdraw(self, peer, key, changes):
+        '''
+        Remove a route from the prefix table of the peer.
+        '''
+        old = self.tables[peer].pop(key, None)
+        if old is None:
+            return
+        if changes is not None:
+            changes.append(self.change('W', peer, key, old))
+        self.attr_table.release(old)
+
+    def reset(self, peer, changes):
+        '''
+        Remove all routes of the peer.
+        '''
+        table = self.tables[peer]
+        self.tables[peer] = {}
+        for key, attr_id in table.items():
+            if changes is not None:
+                changes.append(self.change('W', peer, key, attr_id))
+            self.attr_table.release(attr_id)
+
+    def change(self, action, peer, key, attr_id):
+        '''
+        Create a RibChange.
+        '''
+        prefix, length, path_id = unpack_prefix(key)
+        peer_ip, peer_as = self.peers[peer]
+        return RibChange(
+            self.ts, action, peer_ip, peer_as, prefix, length, path_id,
+            self.attr_table.get(attr_id)
+        )
+
+    def apply(self, rec, changes=None):
+        '''
+        Apply a record returned by Reader.
+        If changes is a list, RibChange of each modified route is appended.
+        '''
+        if rec.err:
+            return
+        m = rec.data
+        t = list(m['type'])[0]
+        st = list(m['subtype'])[0]
+        self.ts = list(m['timestamp'])[0]
+        if t == MRT_T['TABLE_DUMP_V2']:
+            self.apply_td_v2(m, st, changes)
+        elif t == MRT_T['BGP4MP'] or t == MRT_T['BGP4MP_ET']:
+            if st in BGP4MP_UPDATE_ST:
+                self.apply_update(m, changes)
+            elif st in BGP4MP_STATE_ST:
+                if list(m['old_state'])[0] == BGP_FSM['Established'] \
+                    and list(m['new_state'])[0] != BGP_FSM['Established']:
+                    self.reset(
+                        self.peer_id(m['peer_ip'], m['peer_as']), changes
+                    )
+        elif t == MRT_T['TABLE_DUMP']:
+            peer = self.peer_id(m['peer_ip'], m['peer_as'])
+            attr_id = self.attr_table.intern(
+                route_attrs(m['path_attributes'])
+            )
+            self.announce(
+                peer, pack_prefix(m['prefix'], m['length']), attr_id, changes
+            )
+
+    def apply_td_v2(self, m, st, changes):
+        '''
+        Apply PEER_INDEX_TABLE and RIB records of TABLE_DUMP_V2.
+        '''
+        if st == TD_V2_ST['PEER_INDEX_TABLE']:
+            self.index_peers = [
+                self.peer_id(peer['peer_ip'], peer['peer_as'])
+                for peer in m['peer_entries']
+            ]
+            return
+        if 'rib_entries' not in m:
+            return
+        if 'nlri' in m:
+            if not m['nlri']:
+                return
+            prefix = m['nlri'][0]['prefix']
+            length = m['nlri'][0]['length']
+        else:
+            prefix = m['prefix']
+            length = m['length']
+        for entry in m['rib_entries']:
+            key = pack_prefix(prefix, length, entry.get('path_id', 0))
+            attr_id = self.attr_table.intern(
+                route_attrs(entry['path_attributes'])
+            )
+            self.announce(
+                self.index_peers[entry['peer_index']], key, attr_id, changes
+            )
+
+    def apply_update(self, m, changes):
+        '''
+        Apply BGP UPDATE message of BGP4MP.
+        '''
+        msg = m['bgp_message']
+        if list(msg['type'])[0] != BGP_MSG_T['UPDATE']:
+            return
+        peer = self.peer_id(m['peer_ip'], m['peer_as'])
+        withdrawn = list(msg['withdrawn_routes'])
+        nlri = list(msg['nlri'])
+        for attr in msg['path_attributes']:
+            t = list(attr['type'])[0]
+            if t == BGP_ATTR_T['MP_REACH_NLRI']:
+                nlri += attr['value'].get('nlri', [])
+            elif t == BGP_ATTR_T['MP_UNREACH_NLRI']:
+                withdrawn += attr['value'].get('withdrawn_routes', [])
+        for route in withdrawn:
+            self.withdraw(
+                peer, pack_prefix(
+                    route['prefix'], route['length'], route.get('path_id', 0)
+                ), changes
+            )
+        if not nlri:
+            return
+        attrs = route_attrs(msg['path_attributes'])
+        for route in nlri:
+            attr_id = self.attr_table.intern(attrs)
+            self.announce(
+                peer, pack_prefix(
+                    route['prefix'], route['length'], route.get('path_id', 0)
+                ), attr_id, changes
+            )
+
+    def load(self, reader, until=None):
+        '''
+        Apply records of reader whose timestamp is not later than until.
+        The first record after until is held and applied by the next call.
+        '''
+        for _ in self.diff(reader, until=until):
+            pass
+
+    def diff(self, reader, since=None, until=None):
+        '''
+        Apply records of reader like load() and yield RibChange of each
+        modified route whose timestamp is not earlier than since.
+        '''
+        changes = []
+        if self.pending is not None:
+            recs = itertools.chain([self.pending], reader)
+            self.pending = None
+        else:
+            recs = reader
+        for rec in recs:
+            if until is not None and not rec.err \
+                and list(rec.data['timestamp'])[0] > until:
+                self.pending = MergedRecord(
+                    rec, getattr(rec, 'source', None)
+                )
+                return
+            for change in self.apply_record(rec, since, changes):
+                yield change
+
+    def apply_record(self, rec, since, changes):
+        '''
+        Apply a record and return the changes to be reported.
+        '''
+        del changes[:]
+        if since is not None and not rec.err \
+            and list(rec.data['timestamp'])[0] < since:
+            self.apply(rec)
+        else:
+            self.apply(rec, changes)
+        return changes
+
+    def snapshot(self):
+        '''
+        Yield all routes as RibChange with action 'A'.
+        '''
+        for peer, table in enumerate(self.tables):
+            for key, attr_id in table.items():
+                yield self.change('A', peer, key, attr_id)
@@ -0,0 +1,248 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+
+import io
+import zlib
+import socket
+import struct
+import collections
+import multiprocessing
+from .params import *
+from .base import MrtFormatError
+from . import Reader
+from .raw import td_v2_routes, index_peers, num, ADDR_LEN
+from .writer import RIB_GENERIC_ST
+
+RibDiff = collections.namedtuple(
+    'RibDiff',
+    ['action', 'peer_ip', 'peer_as', 'prefix', 'length', 'path_id',
+     'old_attrs', 'new_attrs']
+)
+
+# AFI and SAFI of AFI/SAFI-Specific RIB subtypes
+RIB_FAMILY = {
+    TD_V2_ST['RIB_IPV4_UNICAST']: (AFI_T['IPv4'], SAFI_T['UNICAST']),
+    TD_V2_ST['RIB_IPV4_MULTICAST']: (AFI_T['IPv4'], SAFI_T['MULTICAST']),
+    TD_V2_ST['RIB_IPV6_UNICAST']: (AFI_T['IPv6'], SAFI_T['UNICAST']),
+    TD_V2_ST['RIB_IPV6_MULTICAST']: (AFI_T['IPv6'], SAFI_T['MULTICAST']),
+    TD_V2_ST['RIB_IPV4_UNICAST_ADDPATH']:
+        (AFI_T['IPv4'], SAFI_T['UNICAST']),
+    TD_V2_ST['RIB_IPV4_MULTICAST_ADDPATH']:
+        (AFI_T['IPv4'], SAFI_T['MULTICAST']),
+    TD_V2_ST['RIB_IPV6_UNICAST_ADDPATH']:
+        (AFI_T['IPv6'], SAFI_T['UNICAST']),
+    TD_V2_ST['RIB_IPV6_MULTICAST_ADDPATH']:
+        (AFI_T['IPv6'], SAFI_T['MULTICAST']),
+}
+
+# Number of events sent from a worker process at a time
+RIB_DIFF_CHUNK = 1000
+
+def rib_family(buf, st):
+    '''
+    Return (AFI, SAFI) of a raw RIB record, or None.
+    '''
+    if st in RIB_FAMILY:
+        return RIB_FAMILY[st]
+    elif st in RIB_GENERIC_ST:
+        return (num(buf, 16, 2), num(buf, 18, 1))
+    return None
+
+def rib_prefixes(reader, afis=None):
+    '''
+    Yield ((AFI, SAFI, prefix as integer, length), routes) of each prefix
+    of TABLE_DUMP_V2 records of reader in order of the records, where
+    routes maps (peer, path_id) to the raw path attributes and peer is
+    (peer_ip as packed bytes, peer_as).
+    Records must be sorted by prefix within each address family.
+    afis restricts the address families.
+    '''
+    peers = []
+    key = None
+    routes = {}
+    for rec in reader:
+        if rec.err:
+            continue
+        buf = rec.buf
+        t, st = struct.unpack('>HH', buf[4:8])
+        if t != MRT_T['TABLE_DUMP_V2']:
+            continue
+        if st == TD_V2_ST['PEER_INDEX_TABLE']:
+            if 'peer_entries' not in rec.data:
+                try:
+                    rec = next(Reader(io.BytesIO(buf)))
+                except StopIteration:
+                    return
+            peers = index_peers(rec.data)
+            continue
+        family = rib_family(buf, st)
+        if family is None or (afis is not None and family[0] not in afis):
+            continue
+        for route in td_v2_routes(buf, st, peers):
+            _, n, plen = route.prefixes[0]
+            k = (family[0], family[1], n, plen)
+            if k != key:
+                if key is not None:
+                    if k < key:
+                        raise MrtFormatError(
+                            'RIB records are not sorted by prefix'
+                        )
+                    yield (key, routes)
+                key = k
+                routes = {}
+            start, end = route.attrs
+            routes[(route.peer, route.path_id)] = buf[start:end]
+    if key is not None:
+        yield (key, routes)
+
+def ntop(addr):
+    '''
+    Convert a packed IPv4 or IPv6 address to string.
+    '''
+    af = socket.AF_INET6 if len(addr) == 16 else socket.AF_INET
+    return socket.inet_ntop(af, addr)
+
+def diff_event(action, key, route, old, new):
+    '''
+    Create RibDiff of a route.
+    '''
+    af, _, n, plen = key
+    (peer_ip, peer_as), path_id = route
+    size = ADDR_LEN[af]
+    addr = struct.pack('>QQ', n >> 64, n & 0xffffffffffffffff)[-size:]
+    return RibDiff(
+        action, ntop(peer_ip), peer_as, ntop(addr), plen, path_id, old, new
+    )
+
+def route_key(route):
+    '''
+    Sort key of a route, where no path identifier sorts first, so that
+    routes with and without ADD-PATH (RFC8050) can be compared.
+    '''
+    peer, path_id = route
+    return (peer, -1 if path_id is None else path_id)
+
+def diff_prefixes(a, b):
+    '''
+    Merge two streams of rib_prefixes() and yield RibDiff of each route
+    which is added, removed or changed.
+    Path attributes are compared by their raw bytes.
+    '''
+    ka, ra = next(a, (None, None))
+    kb, rb = next(b, (None, None))
+    while ka is not None or kb is not None:
+        if kb is None or (ka is not None and ka < kb):
+            for route in sorted(ra, key=route_key):
+                yield diff_event('removed', ka, route, ra[route], None)
+            ka, ra = next(a, (None, None))
+        elif ka is None or kb < ka:
+            for route in sorted(rb, key=route_key):
+                yield diff_event('added', kb, route, None, rb[route])
+            kb, rb = next(b, (None, None))
+        else:
+            for route in sorted(set(ra) | set(rb), key=route_key):
+                old = ra.get(route)
+                new = rb.get(route)
+                if new is None:
+                    yield diff_event('removed', ka, route, old, None)
+                elif old is None:
+                    yield diff_event('added', ka, route, None, new)
+                elif old != new:
+                    yield diff_event('changed', ka, route, old, new)
+            ka, ra = next(a, (None, None))
+            kb, rb = next(b, (None, None))
+
+def _rib_diff_worker(path_a, path_b, afi, queue):
+    '''
+    Diff an address family of two files in a worker process.
+    '''
+    try:
+        chunk = []
+        for ev in diff_prefixes(
+            rib_prefixes(Reader(path_a, decode=False), (afi,)),
+            rib_prefixes(Reader(path_b, decode=False), (afi,))):
+            chunk.append(ev)
+            if len(chunk) >= RIB_DIFF_CHUNK:
+                queue.put((chunk, None))
+                chunk = []
+        if chunk:
+            queue.put((chunk, None))
+    except (MrtFormatError, EnvironmentError, EOFError, zlib.error,
+        struct.error, ValueError, KeyError, IndexError) as e:
+        # MrtFormatError has its message only in "msg"
+        msg = e.msg if isinstance(e, MrtFormatError) else e
+        queue.put((None, '%s: %s' % (e.__class__.__name__, msg)))
+        return
+    queue.put((None, None))
+
+def rib_diff(a, b, processes=1):
+    '''
+    Compare two TABLE_DUMP_V2 dumps sorted by prefix and yield RibDiff
+    with action 'added', 'removed' or 'changed' for each route, where a
+    route is a prefix, a peer (peer_ip, peer_as) and a path identifier.
+    a and b are Reader instances, filepath strings or file objects.
+    Only the routes of a prefix are held at a time, so dumps which are not
+    sorted by prefix within each address family (e.g. BIRD) are rejected
+    with MrtFormatError.
+    If processes is more than 1, a and b must be filepaths and IPv4 and
+    IPv6 are compared in separate processes, whose events are yielded in
+    order of arrival.
+    '''
+    if processes <= 1:
+        if not isinstance(a, Reader):
+            a = Reader(a, decode=False)
+        if not isinstance(b, Reader):
+            b = Reader(b, decode=False)
+        for ev in diff_prefixes(rib_prefixes(a), rib_prefixes(b)):
+            yield ev
+        return
+
+    if not isinstance(a, str) or not isinstance(b, str):
+        raise ValueError('Multi-process rib_diff() needs filepaths')
+    queue = multiprocessing.Queue(processes * 4)
+    procs = [
+        multiprocessing.Process(
+            target=_rib_diff_worker, args=(a, b, afi, queue)
+        )
+        for afi in (AFI_T['IPv4'], AFI_T['IPv6'])
+    ]
+    for proc in procs:
+        proc.daemon = True
+        proc.start()
+    try:
+        left = len(procs)
+        while left:
+            chunk, err = queue.get()
+            if err is not None:
+                raise MrtFormatError(err)
+            if chunk is None:
+                left -= 1
+                continue
+            for ev in chunk:
+                yield ev
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
@@ -0,0 +1,333 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import io
+import json
+import mmap
+import socket
+import struct
+from .params import *
+from .base import MrtFormatError, as_len, af_num, is_add_path
+from . import Reader, BgpAttr
+from .raw import num, ADDR_LEN
+from .writer import (
+    unpack_hdr, RIB_AFI_SPEC_ST, RIB_GENERIC_ST,
+    RIB_ADDPATH_ST
+)
+
+RIB_FILE_MAGIC = b'MRTRIB01'
+
+# peers length, number of rows, number of attribute sets, attribute length
+RIB_FILE_HDR = struct.Struct('>IQQQ')
+
+# AFI, prefix length, prefix, peer index, attribute set id,
+# originated time, path identifier
+RIB_FILE_ROW = struct.Struct('>BB16sIIII')
+
+RIB_FILE_OFFSET = struct.Struct('>Q')
+
+# Offset of the rows
+RIB_FILE_DATA = 40
+
+# AFI of AFI/SAFI-specific RIB subtypes
+RIB_IPV4_ST = (
+    TD_V2_ST['RIB_IPV4_UNICAST'],
+    TD_V2_ST['RIB_IPV4_MULTICAST'],
+    TD_V2_ST['RIB_IPV4_UNICAST_ADDPATH'],
+    TD_V2_ST['RIB_IPV4_MULTICAST_ADDPATH'],
+)
+
+class RibFile:
+    '''
+    Parsed RIB snapshot which is read through mmap.
+    The file has fixed width rows of RIB entries, de-duplicated path
+    attribute sets and the peer table of PEER_INDEX_TABLE.
+    Each row is (AFI, prefix length, packed prefix, peer index,
+    attribute set id, originated time, path identifier).
+    If the dump has multiple PEER_INDEX_TABLE, their peer entries are
+    concatenated and the peer indexes are offset accordingly.
+    '''
+    __slots__ = [
+        'mm', 'buf', 'peer_table', 'n_rows', 'n_attrs', 'rows_off',
+        'offsets_off', 'attrs_off', 'attr_cache'
+    ]
+
+    def __init__(self):
+        self.mm = None
+        self.buf = None
+        self.peer_table = None
+        self.n_rows = 0
+        self.n_attrs = 0
+        self.rows_off = 0
+        self.offsets_off = 0
+        self.attrs_off = 0
+        self.attr_cache = {}
+
+    @classmethod
+    def write(cls, path, reader):
+        '''
+        Write TABLE_DUMP_V2 records of reader to path.
+        The records can be decoded or not, only the raw record in "buf" is
+        used except for PEER_INDEX_TABLE. Return the number of rows.
+        '''
+        peer_table = None
+        # Peer indexes of RIB entries are offset by peer_base if there
+        # are multiple PEER_INDEX_TABLE
+        peer_base = 0
+        bases = {}
+        ids = {}
+        attrs = []
+        n_rows = 0
+        with open(path, 'wb') as f:
+            # The header and the peer table are written at last
+            f.write(b'\x00' * RIB_FILE_DATA)
+            rows = io.BytesIO()
+            for rec in reader:
+                if rec.err:
+                    continue
+                buf = rec.buf
+                _, t, st, _ = unpack_hdr(buf)
+                if t != MRT_T['TABLE_DUMP_V2']:
+                    continue
+                if st == TD_V2_ST['PEER_INDEX_TABLE']:
+                    if 'peer_entries' not in rec.data:
+                        rec = next(Reader(io.BytesIO(buf)))
+                    entries = rec.data['peer_entries']
+                    if peer_table is None:
+                        peer_table = {
+                            'collector_bgp_id': rec.data['collector_bgp_id'],
+                            'view_name': rec.data['view_name'],
+                            'peer_entries': [],
+                        }
+                    key = json.dumps(entries)
+                    peer_base = bases.get(key)
+                    if peer_base is None:
+                        peer_base = bases[key] \
+                            = len(peer_table['peer_entries'])
+                        peer_table['peer_entries'] += entries
+                elif st in RIB_AFI_SPEC_ST or st in RIB_GENERIC_ST:
+                    for row in cls.rib_rows(
+                        buf, st, ids, attrs, peer_base):
+                        rows.write(row)
+                        n_rows += 1
+                    # Rows are flushed to keep memory bounded
+                    if rows.tell() > 1024 * 1024:
+                        f.write(rows.getvalue())
+                        rows = io.BytesIO()
+            f.write(rows.getvalue())
+
+            offset = 0
+            for attr in attrs:
+                f.write(RIB_FILE_OFFSET.pack(offset))
+                offset += len(attr)
+            f.write(RIB_FILE_OFFSET.pack(offset))
+            for attr in attrs:
+                f.write(attr)
+
+            if peer_table is None:
+                peer_table = {
+                    'collector_bgp_id': None, 'view_name': None,
+                    'peer_entries': []
+                }
+            peers = json.dumps(peer_table).encode('utf-8')
+            f.write(peers)
+            f.seek(0)
+            f.write(RIB_FILE_MAGIC)
+            f.write(RIB_FILE_HDR.pack(len(peers), n_rows, len(attrs), offset))
+        return n_rows
+
+    @staticmethod
+    def rib_rows(buf, st, ids, attrs, peer_base=0):
+        '''
+        Yield packed rows of a raw RIB record.
+        Attribute sets are keyed by AFI and raw bytes in ids.
+        '''
+        p = 12 + 4
+        if st in RIB_GENERIC_ST:
+            af = num(buf, p, 2)
+            safi = num(buf, p + 2, 1)
+            if af not in ADDR_LEN or (safi != SAFI_T['UNICAST']
+                and safi != SAFI_T['MULTICAST']):
+                return
+            p += 3
+        elif st in RIB_IPV4_ST:
+            af = AFI_T['IPv4']
+        else:
+            af = AFI_T['IPv6']
+        plen = num(buf, p, 1)
+        n = (plen + 7) // 8
+        if plen > ADDR_LEN[af] * 8:
+            raise MrtFormatError(
+                'Invalid prefix length %d (%s)' % (plen, AFI_T[af])
+            )
+        prefix = buf[p+1:p+1+n] + b'\x00' * (16 - n)
+        p += 1 + n
+        count = num(buf, p, 2)
+        p += 2
+        add_path = st in RIB_ADDPATH_ST
+        for _ in range(count):
+            peer_index = peer_base + num(buf, p, 2)
+            originated_time = num(buf, p + 2, 4)
+            p += 6
+            path_id = 0
+            if add_path:
+                path_id = num(buf, p, 4)
+                p += 4
+            end = p + 2 + num(buf, p, 2)
+            if end > len(buf):
+                raise MrtFormatError(
+                    'Insufficient buffer %d < %d byte' % (len(buf), end)
+                )
+            attr = struct.pack('>B', af) + buf[p+2:end]
+            i = ids.get(attr)
+            if i is None:
+                i = ids[attr] = len(attrs)
+                attrs.append(attr)
+            yield RIB_FILE_ROW.pack(
+                af, plen, prefix, peer_index, i, originated_time, path_id
+            )
+            p = end
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Open the file written by write() with mmap.
+        Rows and attribute sets are read directly from the mapped file.
+        '''
+        rib = cls()
+        with open(path, 'rb') as f:
+            rib.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        rib.buf = memoryview(rib.mm)
+        if rib.buf[:8].tobytes() != RIB_FILE_MAGIC:
+            raise MrtFormatError('Invalid RIB file %s' % path)
+        peers_len, rib.n_rows, rib.n_attrs, attrs_len \
+            = RIB_FILE_HDR.unpack_from(rib.mm, 8)
+        rib.rows_off = RIB_FILE_DATA
+        rib.offsets_off = rib.rows_off + rib.n_rows * RIB_FILE_ROW.size
+        rib.attrs_off = rib.offsets_off \
+            + (rib.n_attrs + 1) * RIB_FILE_OFFSET.size
+        p = rib.attrs_off + attrs_len
+        if p + peers_len != len(rib.mm):
+            raise MrtFormatError('Invalid RIB file length %s' % path)
+        rib.peer_table = json.loads(
+            rib.buf[p:p+peers_len].tobytes().decode('utf-8')
+        )
+        return rib
+
+    def close(self):
+        '''
+        Release the mapped file.
+        '''
+        if self.mm is not None:
+            self.buf.release()
+            self.mm.close()
+            self.mm = None
+            self.buf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.n_rows
+
+    def __iter__(self):
+        '''
+        Yield raw rows in order of the file.
+        '''
+        end = self.rows_off + self.n_rows * RIB_FILE_ROW.size
+        return RIB_FILE_ROW.iter_unpack(self.buf[self.rows_off:end])
+
+    def row(self, i):
+        '''
+        Return the raw row i.
+        '''
+        if i < 0:
+            i += self.n_rows
+        if not 0 <= i < self.n_rows:
+            raise IndexError('Row index out of range')
+        return RIB_FILE_ROW.unpack_from(
+            self.mm, self.rows_off + i * RIB_FILE_ROW.size
+        )
+
+    def __getitem__(self, i):
+        return self.row(i)
+
+    def peer(self, peer_index):
+        '''
+        Return the decoded peer entry of PEER_INDEX_TABLE.
+        '''
+        return self.peer_table['peer_entries'][peer_index]
+
+    def raw_attrs(self, attr_id):
+        '''
+        Return (AFI, raw path attributes) of the attribute set.
+        The path attributes are a memoryview of the mapped file.
+        '''
+        if not 0 <= attr_id < self.n_attrs:
+            raise IndexError('Attribute set id out of range')
+        start, end = struct.unpack_from(
+            '>QQ', self.mm, self.offsets_off + attr_id * RIB_FILE_OFFSET.size
+        )
+        p = self.attrs_off + start
+        return (self.mm[p], self.buf[p+1:self.attrs_off+end])
+
+    def path_attributes(self, attr_id):
+        '''
+        Return the decoded path attributes of the attribute set.
+        Decoded sets are cached since they are shared by many rows.
+        '''
+        val = self.attr_cache.get(attr_id)
+        if val is not None:
+            return val
+        af, buf = self.raw_attrs(attr_id)
+        buf = buf.tobytes()
+        as_len(4)
+        af_num(af, 0)
+        is_add_path(False)
+        val = []
+        p = 0
+        while p < len(buf):
+            attr = BgpAttr(buf[p:])
+            p += attr.unpack()
+            val.append(attr.data)
+        self.attr_cache[attr_id] = val
+        return val
+
+    def route(self, i):
+        '''
+        Return the row i as (prefix, length, peer_ip, peer_as,
+        originated_time, path_id, path attributes).
+        '''
+        af, plen, prefix, peer_index, attr_id, ot, path_id = self.row(i)
+        n = ADDR_LEN[af]
+        prefix = socket.inet_ntop(
+            socket.AF_INET6 if n == 16 else socket.AF_INET, prefix[:n]
+        )
+        peer = self.peer(peer_index)
+        return (
+            prefix, plen, peer['peer_ip'], peer['peer_as'], ot, path_id,
+            self.path_attributes(attr_id)
+        )
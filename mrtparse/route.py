@@ -0,0 +1,143 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+from .params import *
+
+class Route:
+    '''
+    A prefix announced or withdrawn by a peer.
+    "action" is 'A' or 'W', and "attrs_ref" is the list of path
+    attributes of the record, which is shared by all routes of the same
+    RIB entry or UPDATE message and must not be modified. It is None for
+    withdrawn routes.
+    '''
+    __slots__ = [
+        'ts', 'peer_ip', 'peer_as', 'prefix', 'plen', 'path_id', 'action',
+        'attrs_ref'
+    ]
+
+    def __init__(self, ts, peer_ip, peer_as, prefix, plen, path_id, action,
+        attrs_ref):
+        self.ts = ts
+        self.peer_ip = peer_ip
+        self.peer_as = peer_as
+        self.prefix = prefix
+        self.plen = plen
+        self.path_id = path_id
+        self.action = action
+        self.attrs_ref = attrs_ref
+
+    def __repr__(self):
+        return 'Route(%d, %s, %s, %s/%d, %s, %s)' % (
+            self.ts, self.peer_ip, self.peer_as, self.prefix, self.plen,
+            self.path_id, self.action
+        )
+
+def iter_routes(reader, records=None):
+    '''
+    Yield Route of each prefix in the records of reader.
+    The peers of TABLE_DUMP_V2 are resolved from the last
+    PEER_INDEX_TABLE, which is cached in "peer_table" of reader.
+    records is an iterable of decoded records of reader, e.g. filtered
+    ones, or reader itself if None.
+    '''
+    if records is None:
+        records = reader
+    for rec in records:
+        if rec.err:
+            continue
+        m = rec.data
+        t = list(m['type'])[0]
+        st = list(m['subtype'])[0]
+        ts = list(m['timestamp'])[0]
+        if t == MRT_T['TABLE_DUMP_V2']:
+            if st == TD_V2_ST['PEER_INDEX_TABLE']:
+                reader.peer_table = [
+                    (peer['peer_ip'], peer['peer_as'])
+                    for peer in m['peer_entries']
+                ]
+                continue
+            for route in td_v2_routes(ts, m, reader.peer_table):
+                yield route
+        elif t == MRT_T['BGP4MP'] or t == MRT_T['BGP4MP_ET']:
+            if st in BGP4MP_UPDATE_ST:
+                for route in update_routes(ts, m):
+                    yield route
+        elif t == MRT_T['TABLE_DUMP']:
+            yield Route(
+                ts, m['peer_ip'], m['peer_as'], m['prefix'], m['length'],
+                None, 'A', m['path_attributes']
+            )
+
+def td_v2_routes(ts, m, peer_table):
+    '''
+    Yield Route of each RIB entry of a TABLE_DUMP_V2 record.
+    '''
+    if 'rib_entries' not in m or peer_table is None:
+        return
+    if 'nlri' in m:
+        if not m['nlri']:
+            return
+        prefix = m['nlri'][0]['prefix']
+        plen = m['nlri'][0]['length']
+    else:
+        prefix = m['prefix']
+        plen = m['length']
+    for entry in m['rib_entries']:
+        peer_ip, peer_as = peer_table[entry['peer_index']]
+        yield Route(
+            ts, peer_ip, peer_as, prefix, plen, entry.get('path_id'), 'A',
+            entry['path_attributes']
+        )
+
+def update_routes(ts, m):
+    '''
+    Yield Route of each withdrawn and announced prefix of a BGP UPDATE
+    message, including MP_UNREACH_NLRI and MP_REACH_NLRI.
+    '''
+    msg = m['bgp_message']
+    if list(msg['type'])[0] != BGP_MSG_T['UPDATE']:
+        return
+    peer_ip = m['peer_ip']
+    peer_as = m['peer_as']
+    attrs = msg['path_attributes']
+    withdrawn = [msg['withdrawn_routes']]
+    nlri = [msg['nlri']]
+    for attr in attrs:
+        t = list(attr['type'])[0]
+        if t == BGP_ATTR_T['MP_REACH_NLRI']:
+            nlri.append(attr['value'].get('nlri', []))
+        elif t == BGP_ATTR_T['MP_UNREACH_NLRI']:
+            withdrawn.append(attr['value'].get('withdrawn_routes', []))
+    for routes in withdrawn:
+        for route in routes:
+            yield Route(
+                ts, peer_ip, peer_as, route['prefix'], route['length'],
+                route.get('path_id'), 'W', None
+            )
+    for routes in nlri:
+        for route in routes:
+            yield Route(
+                ts, peer_ip, peer_as, route['prefix'], route['length'],
+                route.get('path_id'), 'A', attrs
+            )
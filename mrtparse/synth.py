@@ -0,0 +1,383 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import random
+import socket
+import struct
+from .params import *
+from .writer import MrtWriter, pack_hdr
+
+# Distributions of prefix length as {length: weight}
+IPV4_PLEN = {24: 60, 23: 8, 22: 10, 21: 5, 20: 7, 19: 5, 16: 5}
+IPV6_PLEN = {48: 50, 44: 10, 40: 10, 36: 10, 32: 20}
+
+# Distribution of AS path length as {length: weight}
+PATH_LEN = {1: 2, 2: 10, 3: 25, 4: 28, 5: 18, 6: 9, 7: 5, 8: 2, 9: 1}
+
+# Maximum number of attribute sets kept per peer for reuse
+ATTR_POOL_SIZE = 4096
+
+# Maximum number of prefixes in an UPDATE message
+UPDATE_PREFIXES = 16
+
+BGP_MARKER = b'\xff' * 16
+
+def weighted(rand, dist):
+    '''
+    Return a random key of {key: weight}.
+    '''
+    keys = sorted(dist)
+    r = rand.random() * sum(dist[k] for k in keys)
+    for k in keys:
+        r -= dist[k]
+        if r < 0:
+            return k
+    return keys[-1]
+
+def pack_attr(flag, t, val):
+    '''
+    Encoder for a path attribute.
+    '''
+    if len(val) > 255:
+        return struct.pack('>BBH', flag | 0x10, t, len(val)) + val
+    return struct.pack('>BBB', flag, t, len(val)) + val
+
+def pack_prefix(af, n, plen, path_id=None):
+    '''
+    Encoder for a prefix of NLRI.
+    '''
+    size = 4 if af == AFI_T['IPv4'] else 16
+    nbytes = (plen + 7) // 8
+    val = struct.pack('>B', plen) + int_bytes(n, size)[:nbytes]
+    if path_id is not None:
+        val = struct.pack('>I', path_id) + val
+    return val
+
+def int_bytes(n, size):
+    '''
+    Convert an integer to size bytes in network byte order.
+    '''
+    if size == 4:
+        return struct.pack('>I', n)
+    return struct.pack('>QQ', n >> 64, n & (2**64 - 1))
+
+class Synth:
+    '''
+    Generator of synthetic TABLE_DUMP_V2 dumps and BGP4MP update streams.
+    The output is deterministic for the same parameters and seed.
+    '''
+    __slots__ = [
+        'rand', 'peers', 'prefixes', 'origins', 'path_len', 'attr_reuse',
+        'communities', 'add_path', 'coverage', 'pools', 'collector'
+    ]
+
+    def __init__(self, seed=0, peers=4, prefixes=1000, ipv6_ratio=0.2,
+        path_len=None, attr_reuse=0.5, communities=2, add_path=False,
+        coverage=1.0):
+        '''
+        path_len is a distribution of AS path length as {length: weight},
+        PATH_LEN if None.
+        attr_reuse is the probability that a route shares the attribute
+        set with another route of the same peer.
+        communities is the maximum number of COMMUNITY values of a route.
+        coverage is the probability that a peer has a route to a prefix.
+        '''
+        self.rand = random.Random(seed)
+        self.path_len = PATH_LEN if path_len is None else path_len
+        self.attr_reuse = attr_reuse
+        self.communities = communities
+        self.add_path = add_path
+        self.coverage = coverage
+        self.collector = '10.0.0.1'
+        self.peers = []
+        for i in range(peers):
+            # Every fourth peer is connected over IPv6
+            if i % 4 == 3:
+                ip = '2001:db8::%x' % (i + 1)
+            else:
+                ip = '10.%d.%d.%d' % ((i + 1) >> 16, ((i + 1) >> 8) & 0xff,
+                    (i + 1) & 0xff)
+            self.peers.append(
+                (ip, '10.255.%d.%d' % (i >> 8, i & 0xff), 64512 + i)
+            )
+        self.pools = [[] for _ in range(peers)]
+        n6 = int(prefixes * ipv6_ratio)
+        self.prefixes = self.gen_prefixes(AFI_T['IPv4'], prefixes - n6) \
+            + self.gen_prefixes(AFI_T['IPv6'], n6)
+        self.origins = [
+            self.rand.randint(1, 399999) for _ in self.prefixes
+        ]
+
+    def gen_prefixes(self, af, count):
+        '''
+        Return a sorted list of count unique (AFI, prefix, length).
+        '''
+        if af == AFI_T['IPv4']:
+            dist, size, base = IPV4_PLEN, 32, 0
+        else:
+            # Global unicast 2000::/3
+            dist, size, base = IPV6_PLEN, 128, 1 << 125
+        prefixes = set()
+        while len(prefixes) < count:
+            plen = weighted(self.rand, dist)
+            n = self.rand.getrandbits(plen) << (size - plen)
+            if base:
+                n = base | (n & ((1 << 125) - 1))
+            else:
+                n |= 1 << 24
+            prefixes.add((af, n, plen))
+        return sorted(prefixes)
+
+    def next_hop(self, peer, af):
+        '''
+        Return the packed next hop of the peer for the AFI.
+        '''
+        ip = self.peers[peer][0]
+        if af == AFI_T['IPv4']:
+            if ':' in ip:
+                return socket.inet_pton(socket.AF_INET, self.peers[peer][1])
+            return socket.inet_pton(socket.AF_INET, ip)
+        if ':' in ip:
+            return socket.inet_pton(socket.AF_INET6, ip)
+        return socket.inet_pton(socket.AF_INET6, '2001:db8::ffff:' + ip)
+
+    def attrs(self, peer, i):
+        '''
+        Return the attributes except NEXT_HOP and MP_REACH_NLRI of the
+        route of the peer to the prefix i.
+        An attribute set of the peer is reused with attr_reuse.
+        '''
+        pool = self.pools[peer]
+        if pool and self.rand.random() < self.attr_reuse:
+            return self.rand.choice(pool)
+        rand = self.rand
+        # The path starts with the peer and ends with the origin of the
+        # prefix
+        path = [self.peers[peer][2]]
+        n = weighted(rand, self.path_len)
+        if n > 1:
+            path += [rand.randint(1, 399999) for _ in range(n - 2)]
+            path.append(self.origins[i])
+        segs = b''
+        for j in range(0, len(path), 255):
+            seg = path[j:j+255]
+            segs += struct.pack('>BB', AS_PATH_SEG_T['AS_SEQUENCE'],
+                len(seg)) + struct.pack('>%dI' % len(seg), *seg)
+        attrs = pack_attr(0x40, BGP_ATTR_T['ORIGIN'],
+            struct.pack('>B', rand.choice((0, 0, 0, 2))))
+        attrs += pack_attr(0x40, BGP_ATTR_T['AS_PATH'], segs)
+        if rand.random() < 0.3:
+            attrs += pack_attr(0x80, BGP_ATTR_T['MULTI_EXIT_DISC'],
+                struct.pack('>I', rand.randint(0, 1000)))
+        n = rand.randint(0, self.communities)
+        if n:
+            comms = sorted(set(
+                (path[0] & 0xffff) << 16
+                | rand.randint(0, 0xffff) for _ in range(n)
+            ))
+            attrs += pack_attr(0xc0, BGP_ATTR_T['COMMUNITY'],
+                struct.pack('>%dI' % len(comms), *comms))
+        if len(pool) < ATTR_POOL_SIZE:
+            pool.append(attrs)
+        else:
+            pool[rand.randrange(ATTR_POOL_SIZE)] = attrs
+        return attrs
+
+    def peer_index_table(self, ts):
+        '''
+        Return PEER_INDEX_TABLE in the form of Reader.data.
+        '''
+        entries = []
+        for ip, bgp_id, asn in self.peers:
+            entries.append({
+                'peer_type': 0x02 | (0x01 if ':' in ip else 0),
+                'peer_bgp_id': bgp_id,
+                'peer_ip': ip,
+                'peer_as': str(asn),
+            })
+        return {
+            'timestamp': {ts: ''},
+            'collector_bgp_id': self.collector,
+            'view_name': '',
+            'peer_entries': entries,
+        }
+
+    def write_rib(self, w, ts):
+        '''
+        Write a TABLE_DUMP_V2 dump with MrtWriter w.
+        Return the number of RIB entries.
+        '''
+        w.write_peer_index_table(self.peer_index_table(ts))
+        count = 0
+        for seq, (af, n, plen) in enumerate(self.prefixes):
+            if af == AFI_T['IPv4']:
+                st = 'RIB_IPV4_UNICAST'
+            else:
+                st = 'RIB_IPV6_UNICAST'
+            if self.add_path:
+                st += '_ADDPATH'
+            entries = []
+            for peer in range(len(self.peers)):
+                if self.rand.random() >= self.coverage:
+                    continue
+                paths = 1
+                if self.add_path and self.rand.random() < 0.2:
+                    paths = 2
+                for path_id in range(1, paths + 1):
+                    attrs = self.attrs(peer, seq)
+                    if af == AFI_T['IPv4']:
+                        attrs += pack_attr(0x40, BGP_ATTR_T['NEXT_HOP'],
+                            self.next_hop(peer, af))
+                    else:
+                        # Abbreviated MP_REACH_NLRI of RFC6396
+                        nh = self.next_hop(peer, af)
+                        attrs += pack_attr(0x80, BGP_ATTR_T['MP_REACH_NLRI'],
+                            struct.pack('>B', len(nh)) + nh)
+                    ot = ts - self.rand.randint(0, 86400 * 30)
+                    entry = struct.pack('>HI', peer, ot)
+                    if self.add_path:
+                        entry += struct.pack('>I', path_id)
+                    entries.append(entry + struct.pack('>H', len(attrs)))
+                    entries.append(attrs)
+            count += len(entries) // 2
+            body = struct.pack('>I', seq) + pack_prefix(af, n, plen) \
+                + struct.pack('>H', len(entries) // 2) + b''.join(entries)
+            w.write(pack_hdr(
+                ts, MRT_T['TABLE_DUMP_V2'], TD_V2_ST[st], len(body)
+            ) + body)
+        return count
+
+    def bgp4mp_header(self, peer, as4=True):
+        '''
+        Encoder for the peer part of BGP4MP.
+        '''
+        ip = self.peers[peer][0]
+        if ':' in ip:
+            af = AFI_T['IPv6']
+            addrs = socket.inet_pton(socket.AF_INET6, ip) \
+                + socket.inet_pton(socket.AF_INET6, '2001:db8::1')
+        else:
+            af = AFI_T['IPv4']
+            addrs = socket.inet_pton(socket.AF_INET, ip) \
+                + socket.inet_pton(socket.AF_INET, self.collector)
+        fmt = '>IIHH' if as4 else '>HHHH'
+        return struct.pack(fmt, self.peers[peer][2], 65000, 0, af) + addrs
+
+    def write_record(self, w, ts, usec, st, body, et):
+        '''
+        Write a BGP4MP or BGP4MP_ET record.
+        '''
+        if et:
+            body = struct.pack('>I', usec) + body
+        w.write(pack_hdr(
+            ts, MRT_T['BGP4MP_ET' if et else 'BGP4MP'], st, len(body)
+        ) + body)
+
+    def update(self, peer, withdraw, prefixes, path_ids):
+        '''
+        Encoder for an UPDATE message of prefixes of the same AFI.
+        '''
+        af = prefixes[0][0]
+        nlri = b''.join(
+            pack_prefix(af, n, plen,
+                self.rand.randint(1, 2) if path_ids else None)
+            for af, n, plen in prefixes
+        )
+        withdrawn = b''
+        attrs = b''
+        if withdraw:
+            if af == AFI_T['IPv4']:
+                withdrawn = nlri
+            else:
+                attrs = pack_attr(0x80, BGP_ATTR_T['MP_UNREACH_NLRI'],
+                    struct.pack('>HB', af, SAFI_T['UNICAST']) + nlri)
+            nlri = b''
+        else:
+            attrs = self.attrs(peer, self.rand.randrange(len(self.prefixes)))
+            nh = self.next_hop(peer, af)
+            if af == AFI_T['IPv4']:
+                attrs += pack_attr(0x40, BGP_ATTR_T['NEXT_HOP'], nh)
+            else:
+                attrs += pack_attr(0x80, BGP_ATTR_T['MP_REACH_NLRI'],
+                    struct.pack('>HBB', af, SAFI_T['UNICAST'], len(nh))
+                    + nh + b'\x00' + nlri)
+                nlri = b''
+        body = struct.pack('>H', len(withdrawn)) + withdrawn \
+            + struct.pack('>H', len(attrs)) + attrs + nlri
+        return BGP_MARKER + struct.pack(
+            '>HB', 19 + len(body), BGP_MSG_T['UPDATE']
+        ) + body
+
+    def write_updates(self, w, ts, count, duration=900, et=False,
+        withdraw_ratio=0.2):
+        '''
+        Write count UPDATE messages spread over duration seconds from ts
+        with MrtWriter w, preceded by the STATE_CHANGE to Established of
+        each peer. If et is True, BGP4MP_ET is used.
+        '''
+        for peer in range(len(self.peers)):
+            body = self.bgp4mp_header(peer) + struct.pack(
+                '>HH', BGP_FSM['OpenConfirm'], BGP_FSM['Established']
+            )
+            self.write_record(
+                w, ts, 0, BGP4MP_ST['BGP4MP_STATE_CHANGE_AS4'], body, et
+            )
+        if self.add_path:
+            st = BGP4MP_ST['BGP4MP_MESSAGE_AS4_ADDPATH']
+        else:
+            st = BGP4MP_ST['BGP4MP_MESSAGE_AS4']
+        step = duration * 1000000 // max(count, 1)
+        for i in range(count):
+            t = ts * 1000000 + i * step
+            peer = self.rand.randrange(len(self.peers))
+            j = self.rand.randrange(len(self.prefixes))
+            af = self.prefixes[j][0]
+            # Prefixes of an UPDATE are adjacent ones of the same AFI
+            prefixes = [
+                p for p in self.prefixes[j:j+self.rand.randint(
+                    1, UPDATE_PREFIXES)] if p[0] == af
+            ]
+            msg = self.update(
+                peer, self.rand.random() < withdraw_ratio, prefixes,
+                self.add_path
+            )
+            self.write_record(
+                w, t // 1000000, t % 1000000, st,
+                self.bgp4mp_header(peer) + msg, et
+            )
+
+def synth_rib(path, ts, **kwargs):
+    '''
+    Write a synthetic TABLE_DUMP_V2 dump to path.
+    kwargs are passed to Synth().
+    '''
+    with MrtWriter(path) as w:
+        return Synth(**kwargs).write_rib(w, ts)
+
+def synth_updates(path, ts, count, duration=900, et=False, **kwargs):
+    '''
+    Write a synthetic BGP4MP update stream to path.
+    kwargs are passed to Synth().
+    '''
+    with MrtWriter(path) as w:
+        Synth(**kwargs).write_updates(w, ts, count, duration, et)
@@ -0,0 +1,385 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import sys
+import mmap
+import json
+import array
+import socket
+import struct
+from .params import *
+from .base import MrtFormatError
+from .aspath import origin_as
+
+# Magic Number of the trie file
+TRIE_MAGIC = b'MRTTRIE1'
+
+# Number of 32-bit words of an address
+ADDR_WORDS = {AFI_T['IPv4']: 1, AFI_T['IPv6']: 4}
+
+# Bit flag of a node which has routes
+HAS_VALUE = 0x100
+
+def addr_to_int(addr):
+    '''
+    Convert IP address string to (AFI, integer).
+    '''
+    if ':' in addr:
+        buf = socket.inet_pton(socket.AF_INET6, addr)
+        hi, lo = struct.unpack('>QQ', buf)
+        return (AFI_T['IPv6'], (hi << 64) | lo)
+    return (AFI_T['IPv4'], struct.unpack('>I', socket.inet_pton(
+        socket.AF_INET, addr))[0])
+
+def int_to_addr(af, n):
+    '''
+    Convert (AFI, integer) to IP address string.
+    '''
+    if af == AFI_T['IPv6']:
+        return socket.inet_ntop(
+            socket.AF_INET6, struct.pack('>QQ', n >> 64, n & (2**64 - 1))
+        )
+    return socket.inet_ntop(socket.AF_INET, struct.pack('>I', n))
+
+def parse_prefix(prefix):
+    '''
+    Convert "prefix/length" or IP address string to (AFI, integer, length).
+    '''
+    if '/' in prefix:
+        addr, plen = prefix.split('/', 1)
+        plen = int(plen)
+    else:
+        addr, plen = prefix, -1
+    af, n = addr_to_int(addr)
+    bits = 32 * ADDR_WORDS[af]
+    if plen < 0:
+        plen = bits
+    elif plen > bits:
+        raise MrtFormatError(
+            'Invalid prefix length %d (%s)' % (plen, AFI_T[af])
+        )
+    return (af, n & ~((1 << (bits - plen)) - 1), plen)
+
+class _Trie:
+    '''
+    Array-backed path-compressed binary trie of an address family.
+    '''
+    __slots__ = ['af', 'bits', 'words', 'addr', 'meta', 'child', 'vref']
+
+    def __init__(self, af):
+        self.af = af
+        self.words = ADDR_WORDS[af]
+        self.bits = 32 * self.words
+        # Per node: address words, length and flags, left and right child,
+        # start and count of values. The root (0/0) is always node 0.
+        self.addr = array.array('I', [0] * self.words)
+        self.meta = array.array('I', [0])
+        self.child = array.array('I', [0, 0])
+        self.vref = array.array('I', [0, 0])
+
+    def __len__(self):
+        return len(self.meta)
+
+    def node_addr(self, i):
+        '''
+        Return the address of the node as integer.
+        '''
+        n = 0
+        for w in self.addr[i*self.words:(i+1)*self.words]:
+            n = (n << 32) | w
+        return n
+
+    def new_node(self, n, plen):
+        '''
+        Append a node and return its index.
+        '''
+        for j in range(self.words - 1, -1, -1):
+            self.addr.append((n >> (32 * j)) & 0xffffffff)
+        self.meta.append(plen)
+        self.child.extend([0, 0])
+        self.vref.extend([0, 0])
+        return len(self.meta) - 1
+
+    def common(self, a, b, plen):
+        '''
+        Return the length of the common prefix of a and b up to plen.
+        '''
+        diff = (a ^ b) >> (self.bits - plen) if plen else 0
+        return plen - diff.bit_length()
+
+    def bit(self, n, pos):
+        '''
+        Return the bit at pos of n.
+        '''
+        return (n >> (self.bits - 1 - pos)) & 1
+
+    def insert(self, n, plen):
+        '''
+        Insert a prefix and return the index of its node.
+        '''
+        parent, side, i = -1, 0, 0
+        while True:
+            if parent >= 0 and i == 0:
+                i = self.new_node(n, plen)
+                self.child[parent*2+side] = i
+                return i
+            node_n = self.node_addr(i)
+            node_plen = self.meta[i] & 0xff
+            c = self.common(n, node_n, min(plen, node_plen))
+            if c == node_plen == plen:
+                return i
+            elif c == node_plen:
+                parent, side = i, self.bit(n, node_plen)
+                i = self.child[parent*2+side]
+                continue
+            elif c == plen:
+                j = self.new_node(n, plen)
+                self.child[j*2+self.bit(node_n, plen)] = i
+            else:
+                mask = ~((1 << (self.bits - c)) - 1)
+                j = self.new_node(n & mask, c)
+                k = self.new_node(n, plen)
+                self.child[j*2+self.bit(n, c)] = k
+                self.child[j*2+self.bit(node_n, c)] = i
+            self.child[parent*2+side] = j
+            return j if c == plen else k
+
+    def match(self, i, n):
+        '''
+        Check whether n is covered by the node.
+        '''
+        plen = self.meta[i] & 0xff
+        return self.common(n, self.node_addr(i), plen) == plen
+
+    def path(self, n, plen):
+        '''
+        Yield nodes covering n/plen from the least specific one.
+        '''
+        i = 0
+        while True:
+            node_plen = self.meta[i] & 0xff
+            if node_plen > plen or not self.match(i, n):
+                return
+            yield i
+            if node_plen == self.bits:
+                return
+            i = self.child[i*2+self.bit(n, node_plen)]
+            if i == 0:
+                return
+
+    def subtree(self, n, plen):
+        '''
+        Yield nodes covered by n/plen in order of address.
+        '''
+        i = 0
+        while True:
+            node_plen = self.meta[i] & 0xff
+            if node_plen >= plen:
+                if self.common(n, self.node_addr(i), plen) != plen:
+                    return
+                break
+            if not self.match(i, n):
+                return
+            i = self.child[i*2+self.bit(n, node_plen)]
+            if i == 0:
+                return
+        stack = [i]
+        while stack:
+            i = stack.pop()
+            yield i
+            for j in (self.child[i*2+1], self.child[i*2]):
+                if j:
+                    stack.append(j)
+
+class PrefixTrie:
+    '''
+    Longest prefix match index of IPv4/IPv6 prefixes and their routes.
+    Each route is a tuple of (peer_ip, peer_as, origin_as).
+    origin_as is 0 if the origin is AS_SET or not determined.
+    '''
+    __slots__ = ['peers', 'tries', 'values', 'mm']
+
+    def __init__(self):
+        self.peers = []
+        self.tries = {
+            AFI_T['IPv4']: _Trie(AFI_T['IPv4']),
+            AFI_T['IPv6']: _Trie(AFI_T['IPv6']),
+        }
+        self.values = array.array('I')
+        self.mm = None
+
+    @classmethod
+    def build(cls, reader):
+        '''
+        Build the trie from TABLE_DUMP_V2 RIB records of reader.
+        '''
+        trie = cls()
+        peer_ids = {}
+        index_peers = []
+        routes = {}
+        for m in reader:
+            if m.err:
+                continue
+            if list(m.data['type'])[0] != MRT_T['TABLE_DUMP_V2']:
+                continue
+            st = list(m.data['subtype'])[0]
+            if st == TD_V2_ST['PEER_INDEX_TABLE']:
+                index_peers = []
+                for peer in m.data['peer_entries']:
+                    key = (peer['peer_ip'], peer['peer_as'])
+                    if key not in peer_ids:
+                        peer_ids[key] = len(trie.peers)
+                        trie.peers.append(key)
+                    index_peers.append(peer_ids[key])
+            elif 'prefix' in m.data and 'rib_entries' in m.data:
+                af, n = addr_to_int(m.data['prefix'])
+                val = routes.setdefault((af, n, m.data['length']), [])
+                for entry in m.data['rib_entries']:
+                    val.append(index_peers[entry['peer_index']])
+                    # AS_SET origin is stored as 0
+                    origin = origin_as(entry['path_attributes'])
+                    val.append(origin if isinstance(origin, int) else 0)
+        for (af, n, plen) in sorted(routes):
+            t = trie.tries[af]
+            i = t.insert(n, plen)
+            val = routes[(af, n, plen)]
+            t.meta[i] |= HAS_VALUE
+            t.vref[i*2] = len(trie.values) // 2
+            t.vref[i*2+1] = len(val) // 2
+            trie.values.extend(val)
+        return trie
+
+    def __len__(self):
+        return sum(
+            1 for t in self.tries.values() for flag in t.meta
+            if flag & HAS_VALUE
+        )
+
+    def entry(self, t, i):
+        '''
+        Return (prefix, length, routes) of the node.
+        '''
+        start = t.vref[i*2] * 2
+        routes = []
+        for j in range(start, start + t.vref[i*2+1] * 2, 2):
+            peer_ip, peer_as = self.peers[self.values[j]]
+            routes.append((peer_ip, peer_as, self.values[j+1]))
+        return (int_to_addr(t.af, t.node_addr(i)), t.meta[i] & 0xff, routes)
+
+    def lookup(self, addr):
+        '''
+        Return the longest matching (prefix, length, routes) or None.
+        addr is IP address or "prefix/length" string.
+        '''
+        af, n, plen = parse_prefix(addr)
+        t = self.tries[af]
+        best = None
+        for i in t.path(n, plen):
+            if t.meta[i] & HAS_VALUE:
+                best = i
+        return None if best is None else self.entry(t, best)
+
+    def covering(self, prefix):
+        '''
+        Return the list of (prefix, length, routes) covering the prefix
+        from the least specific one.
+        '''
+        af, n, plen = parse_prefix(prefix)
+        t = self.tries[af]
+        return [
+            self.entry(t, i) for i in t.path(n, plen)
+            if t.meta[i] & HAS_VALUE
+        ]
+
+    def more_specifics(self, prefix):
+        '''
+        Return the list of (prefix, length, routes) covered by the prefix
+        including itself in order of address.
+        '''
+        af, n, plen = parse_prefix(prefix)
+        t = self.tries[af]
+        return [
+            self.entry(t, i) for i in t.subtree(n, plen)
+            if t.meta[i] & HAS_VALUE
+        ]
+
+    def save(self, path):
+        '''
+        Write the trie to a file which can be loaded by load().
+        '''
+        peers = json.dumps(self.peers).encode('utf-8')
+        peers += b' ' * (-len(peers) % 4)
+        arrays = [self.values]
+        for af in (AFI_T['IPv4'], AFI_T['IPv6']):
+            t = self.tries[af]
+            arrays += [t.addr, t.meta, t.child, t.vref]
+        with open(path, 'wb') as f:
+            f.write(TRIE_MAGIC)
+            f.write(struct.pack(
+                '>BI9I', sys.byteorder == 'little', len(peers),
+                *[len(a) for a in arrays]
+            ))
+            f.write(b'\x00' * 3)
+            f.write(peers)
+            for a in arrays:
+                f.write(a.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Load the trie written by save() with mmap.
+        The arrays are used directly from the mapped file.
+        '''
+        trie = cls()
+        with open(path, 'rb') as f:
+            trie.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(trie.mm)
+        if buf[:8].tobytes() != TRIE_MAGIC:
+            raise MrtFormatError('Invalid trie file %s' % path)
+        hdr = struct.unpack('>BI9I', buf[8:49].tobytes())
+        if hdr[0] != (sys.byteorder == 'little'):
+            raise MrtFormatError('Unsupported byte order of %s' % path)
+        p = 52
+        trie.peers = [tuple(peer) for peer in json.loads(
+            buf[p:p+hdr[1]].tobytes().decode('utf-8'))]
+        p += hdr[1]
+        arrays = []
+        for n in hdr[2:]:
+            arrays.append(buf[p:p+n*4].cast('I'))
+            p += n * 4
+        trie.values = arrays[0]
+        for j, af in enumerate((AFI_T['IPv4'], AFI_T['IPv6'])):
+            t = trie.tries[af]
+            t.addr, t.meta, t.child, t.vref = arrays[1+j*4:5+j*4]
+        return trie
+
+    def close(self):
+        '''
+        Release the mapped file.
+        '''
+        if self.mm is not None:
+            for t in self.tries.values():
+                t.addr = t.meta = t.child = t.vref = None
+            self.values = None
+            self.mm.close()
+            self.mm = None
@@ -0,0 +1,281 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+
+import os
+import sys
+import json
+import time
+import socket
+import select
+import argparse
+import subprocess
+from .params import *
+from . import Reader, MrtWriter, MrtFormatError
+from .filter import HeaderFilter, filter_records
+from .route import iter_routes
+
+# Output formats of jobs
+WORKER_FORMATS = ('json', 'routes', 'mrt', 'count')
+
+def write_json(records, f):
+    '''
+    Write decoded records as a JSON array like mrt2json.py.
+    '''
+    n = 0
+    f.write('[\n')
+    for rec in records:
+        if n != 0:
+            f.write(',\n')
+        f.write(json.dumps([rec.data], indent=2)[2:-2])
+        n += 1
+    f.write('\n]\n')
+    return n
+
+def write_routes(reader, records, f):
+    '''
+    Write a line of "timestamp|action|peer_ip|peer_as|prefix/length|
+    path_id" for each route.
+    '''
+    n = 0
+    for r in iter_routes(reader, records):
+        f.write('%d|%s|%s|%s|%s/%d|%s\n' % (
+            r.ts, r.action, r.peer_ip, r.peer_as, r.prefix, r.plen,
+            '' if r.path_id is None else r.path_id
+        ))
+        n += 1
+    return n
+
+def run_job(job):
+    '''
+    Process a job descriptor and return its completion record.
+    A job descriptor is a dictionary of "id", "input", "output",
+    "format" (json, routes, mrt or count) and "filters" (see
+    HeaderFilter.from_dict()).
+    '''
+    start = time.time()
+    done = {
+        'id': job.get('id'), 'input': job.get('input'),
+        'output': job.get('output'), 'status': 'ok', 'records': 0,
+        'errors': 0
+    }
+    try:
+        fmt = job.get('format', 'json')
+        if fmt not in WORKER_FORMATS:
+            raise ValueError('Unsupported format %s' % fmt)
+        if fmt != 'count' and not job.get('output'):
+            raise ValueError('No output for format %s' % fmt)
+        header_filter = HeaderFilter.from_dict(job.get('filters'))
+        decode = fmt in ('json', 'routes')
+        errors = [0]
+        reader = Reader(job['input'], decode=decode and not header_filter)
+
+        def records():
+            if header_filter:
+                recs = filter_records(reader, header_filter, decode)
+            else:
+                recs = reader
+            for rec in recs:
+                if rec.err:
+                    errors[0] += 1
+                    continue
+                yield rec
+
+        try:
+            if fmt == 'mrt':
+                with MrtWriter(job['output']) as w:
+                    for rec in records():
+                        w.write(rec)
+                        done['records'] += 1
+            elif fmt == 'count':
+                done['records'] = sum(1 for _ in records())
+            else:
+                with open(job['output'], 'w') as f:
+                    if fmt == 'json':
+                        done['records'] = write_json(records(), f)
+                    else:
+                        done['records'] = write_routes(
+                            reader, records(), f
+                        )
+        finally:
+            # The worker is persistent, so the file must not be left
+            # open when a job fails
+            try:
+                reader.close()
+            except StopIteration:
+                pass
+        done['errors'] = errors[0]
+    # A failed job is reported in its completion record and must not stop
+    # the persistent worker, so every Exception is caught on purpose
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        done['status'] = 'error'
+        # MrtFormatError has its message only in "msg"
+        msg = e.msg if isinstance(e, MrtFormatError) else e
+        done['error'] = '%s: %s' % (e.__class__.__name__, msg)
+    done['elapsed'] = time.time() - start
+    return done
+
+def serve(fin, fout):
+    '''
+    Read job descriptors as JSON lines from fin and write a completion
+    record as a JSON line to fout for each job.
+    '''
+    while True:
+        line = fin.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            done = {'id': None, 'status': 'error', 'error': str(e)}
+        else:
+            done = run_job(job)
+        fout.write(json.dumps(done, sort_keys=True) + '\n')
+        fout.flush()
+
+def serve_socket(path):
+    '''
+    Accept connections on a Unix domain socket and serve the jobs of each
+    connection one after another.
+    '''
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(path)
+        sock.listen(1)
+        while True:
+            conn, _ = sock.accept()
+            try:
+                fin = conn.makefile('r')
+                fout = conn.makefile('w')
+                serve(fin, fout)
+                fin.close()
+                fout.close()
+            finally:
+                conn.close()
+    finally:
+        sock.close()
+        os.unlink(path)
+
+class Supervisor:
+    '''
+    Pool of worker processes, each of which processes jobs one after
+    another with the modules already imported.
+    '''
+    __slots__ = ['procs']
+
+    def __init__(self, n):
+        self.procs = [
+            subprocess.Popen(
+                [sys.executable, '-m', 'mrtparse.worker'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                universal_newlines=True
+            )
+            for _ in range(n)
+        ]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def run(self, jobs):
+        '''
+        Dispatch jobs to idle workers and yield completion records in
+        order of completion.
+        A job is a job descriptor or its JSON string.
+        '''
+        jobs = iter(jobs)
+        idle = list(self.procs)
+        busy = {}
+        end = object()
+        while True:
+            while idle:
+                job = next(jobs, end)
+                if job is end:
+                    break
+                if not isinstance(job, str):
+                    job = json.dumps(job)
+                proc = idle.pop()
+                proc.stdin.write(job.strip() + '\n')
+                proc.stdin.flush()
+                busy[proc.stdout] = proc
+            if not busy:
+                break
+            ready, _, _ = select.select(list(busy), [], [])
+            for fout in ready:
+                proc = busy.pop(fout)
+                line = fout.readline()
+                if not line:
+                    raise RuntimeError('Worker %d exited' % proc.pid)
+                idle.append(proc)
+                yield json.loads(line)
+
+    def close(self):
+        '''
+        Stop all workers.
+        '''
+        for proc in self.procs:
+            proc.stdin.close()
+        for proc in self.procs:
+            proc.wait()
+            proc.stdout.close()
+        self.procs = []
+
+def parse_args():
+    '''
+    Parse the command line arguments.
+    '''
+    p = argparse.ArgumentParser(
+        description='Process jobs of mrtparse in a persistent worker.')
+    p.add_argument(
+        '-s', dest='socket', default=None, metavar='path',
+        help='read jobs from a Unix domain socket instead of stdin')
+    p.add_argument(
+        '-n', dest='workers', default=1, type=int, metavar='N',
+        help='run N worker processes for jobs from stdin (default: 1)')
+    return p.parse_args()
+
+def main():
+    '''
+    Serve jobs from a socket or stdin as given by the arguments.
+    '''
+    args = parse_args()
+    if args.socket is not None:
+        serve_socket(args.socket)
+    elif args.workers > 1:
+        jobs = (line for line in sys.stdin if line.strip())
+        with Supervisor(args.workers) as sup:
+            for done in sup.run(jobs):
+                sys.stdout.write(json.dumps(done, sort_keys=True) + '\n')
+                sys.stdout.flush()
+    else:
+        serve(sys.stdin, sys.stdout)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+'''
+mrtparse - MRT format data parser
+
+Copyright (C) 2022 Tetsumune KISO
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Authors:
+    Tetsumune KISO <t2mune@gmail.com>
+    Yoshiyuki YAMAUCHI <info@greenhippo.co.jp>
+    Nobuhiro ITOU <js333123@gmail.com>
+'''
+
+import struct
+import socket
+import gzip
+import bz2
+from .params import *
+from .base import MrtFormatError
+from .aspath import as_num
+
+# Subtypes of TABLE_DUMP_V2 which carry RIB entries
+RIB_AFI_SPEC_ST = (
+    TD_V2_ST['RIB_IPV4_UNICAST'],
+    TD_V2_ST['RIB_IPV4_MULTICAST'],
+    TD_V2_ST['RIB_IPV6_UNICAST'],
+    TD_V2_ST['RIB_IPV6_MULTICAST'],
+    TD_V2_ST['RIB_IPV4_UNICAST_ADDPATH'],
+    TD_V2_ST['RIB_IPV4_MULTICAST_ADDPATH'],
+    TD_V2_ST['RIB_IPV6_UNICAST_ADDPATH'],
+    TD_V2_ST['RIB_IPV6_MULTICAST_ADDPATH'],
+)
+RIB_GENERIC_ST = (
+    TD_V2_ST['RIB_GENERIC'],
+    TD_V2_ST['RIB_GENERIC_ADDPATH'],
+)
+RIB_ADDPATH_ST = (
+    TD_V2_ST['RIB_IPV4_UNICAST_ADDPATH'],
+    TD_V2_ST['RIB_IPV4_MULTICAST_ADDPATH'],
+    TD_V2_ST['RIB_IPV6_UNICAST_ADDPATH'],
+    TD_V2_ST['RIB_IPV6_MULTICAST_ADDPATH'],
+    TD_V2_ST['RIB_GENERIC_ADDPATH'],
+)
+
+def pack_hdr(ts, t, st, length):
+    '''
+    Encoder for MRT header.
+    '''
+    return struct.pack('>IHHI', ts, t, st, length)
+
+def unpack_hdr(buf):
+    '''
+    Decode a raw MRT header to (timestamp, type, subtype, length).
+    '''
+    if len(buf) < 12:
+        raise MrtFormatError(
+            'Invalid MRT header length %d < 12 byte' % len(buf)
+        )
+    return struct.unpack('>IHHI', buf[:12])
+
+def pack_addr(addr):
+    '''
+    Encoder for IP address.
+    '''
+    if ':' in addr:
+        return socket.inet_pton(socket.AF_INET6, addr)
+    return socket.inet_pton(socket.AF_INET, addr)
+
+def rib_entries_offset(buf):
+    '''
+    Return the offset of the Entry Count field in a raw RIB record.
+    '''
+    st = struct.unpack('>H', buf[6:8])[0]
+    p = 12 + 4
+    if st in RIB_GENERIC_ST:
+        # AFI(2) + SAFI(1) + NLRI
+        p += 3
+    plen = bytearray(buf[p:p+1])
+    if len(plen) == 0:
+        raise MrtFormatError('Insufficient buffer for RIB prefix')
+    return p + 1 + (plen[0] + 7) // 8
+
+def remap_rib(buf, peer_map):
+    '''
+    Rewrite "peer_index" of a raw RIB record in accordance with peer_map.
+    RIB entries whose peer is not in peer_map are removed.
+    Return None if no RIB entries remain.
+    '''
+    ts, t, st, _ = unpack_hdr(buf)
+    add_path = st in RIB_ADDPATH_ST
+    p = rib_entries_offset(buf)
+    count = struct.unpack('>H', buf[p:p+2])[0]
+    head = buf[12:p]
+    p += 2
+    entries = []
+    for _ in range(count):
+        peer_index = struct.unpack('>H', buf[p:p+2])[0]
+        q = p + 6 + (4 if add_path else 0)
+        end = q + 2 + struct.unpack('>H', buf[q:q+2])[0]
+        if end > len(buf):
+            raise MrtFormatError(
+                'Insufficient buffer %d < %d byte' % (len(buf), end)
+            )
+        if peer_index in peer_map:
+            entries.append(struct.pack('>H', peer_map[peer_index]))
+            entries.append(buf[p+2:end])
+        p = end
+    if not entries:
+        return None
+    body = head + struct.pack('>H', len(entries) // 2) + b''.join(entries)
+    return pack_hdr(ts, t, st, len(body)) + body
+
+class MrtWriter:
+    '''
+    Writer for MRT format data.
+    '''
+    __slots__ = ['f', 'peer_map']
+
+    def __init__(self, arg, compress=None):
+        '''
+        arg is a filepath string or file object.
+        compress is None, 'gzip' or 'bz2'. If arg is a filepath ending with
+        '.gz' or '.bz2' and compress is None, it is chosen automatically.
+        '''
+        self.peer_map = None
+        if compress is None and isinstance(arg, str):
+            if arg.endswith('.gz'):
+                compress = 'gzip'
+            elif arg.endswith('.bz2'):
+                compress = 'bz2'
+
+        if compress == 'gzip':
+            if hasattr(arg, 'write'):
+                self.f = gzip.GzipFile(fileobj=arg, mode='wb')
+            else:
+                self.f = gzip.GzipFile(arg, 'wb')
+        elif compress == 'bz2':
+            self.f = bz2.BZ2File(arg, 'wb')
+        elif compress is None:
+            if hasattr(arg, 'write'):
+                self.f = arg
+            else:
+                self.f = open(arg, 'wb')
+        else:
+            raise ValueError('Unsupported compression %s' % compress)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        '''
+        Flush and close file object.
+        '''
+        self.f.close()
+
+    def write(self, rec):
+        '''
+        Write a record as it is.
+        rec is raw bytes or a Reader instance (its "buf" is written).
+        '''
+        buf = rec.buf if hasattr(rec, 'buf') else rec
+        self.f.write(buf)
+
+    def write_peer_index_table(self, data, peer_indexes=None):
+        '''
+        Encode and write PEER_INDEX_TABLE restricted to peer_indexes.
+        data is the decoded PEER_INDEX_TABLE ("Reader.data").
+        Subsequent RIB records passed to write_rib() are remapped to
+        the new peer indexes.
+        '''
+        peers = data['peer_entries']
+        if peer_indexes is None:
+            peer_indexes = range(len(peers))
+        self.peer_map = {}
+        entries = []
+        for i in sorted(set(peer_indexes)):
+            if i >= len(peers):
+                raise MrtFormatError('Invalid peer index %d' % i)
+            self.peer_map[i] = len(entries)
+            entries.append(self.pack_peer_entry(peers[i]))
+
+        view_name = data['view_name'].encode('utf-8')
+        body = pack_addr(data['collector_bgp_id']) \
+            + struct.pack('>H', len(view_name)) + view_name \
+            + struct.pack('>H', len(entries)) + b''.join(entries)
+        self.f.write(pack_hdr(
+            list(data['timestamp'])[0], MRT_T['TABLE_DUMP_V2'],
+            TD_V2_ST['PEER_INDEX_TABLE'], len(body)
+        ))
+        self.f.write(body)
+        return self.peer_map
+
+    def pack_peer_entry(self, peer):
+        '''
+        Encoder for Peer Entries.
+        '''
+        peer_ip = pack_addr(peer['peer_ip'])
+        asn = as_num(peer['peer_as'])
+        peer_type = peer['peer_type'] & ~0x03
+        if len(peer_ip) == 16:
+            peer_type |= 0x01
+        if asn > 0xffff or peer['peer_type'] & 0x02:
+            peer_type |= 0x02
+            peer_as = struct.pack('>I', asn)
+        else:
+            peer_as = struct.pack('>H', asn)
+        return struct.pack('>B', peer_type) \
+            + pack_addr(peer['peer_bgp_id']) + peer_ip + peer_as
+
+    def write_rib(self, rec):
+        '''
+        Write a RIB record with "peer_index" remapped by the last
+        PEER_INDEX_TABLE written. Other records are written as they are.
+        Return False if the record is dropped because no RIB entries remain.
+        '''
+        buf = rec.buf if hasattr(rec, 'buf') else rec
+        _, t, st, _ = unpack_hdr(buf)
+        if self.peer_map is not None and t == MRT_T['TABLE_DUMP_V2'] \
+            and (st in RIB_AFI_SPEC_ST or st in RIB_GENERIC_ST):
+            buf = remap_rib(buf, self.peer_map)
+            if buf is None:
+                return False
+        self.f.write(buf)
+        return True